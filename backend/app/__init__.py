@@ -38,6 +38,7 @@ def create_app():
     register_socket_handlers(app)
 
     # IMPORTANT: bind socketio to app before returning
+    from .cluster import cluster, message_queue_options
     socketio.init_app(
         app, 
         cors_allowed_origins="*", 
@@ -46,7 +47,10 @@ def create_app():
         engineio_logger=False,
         ping_timeout=60,
         ping_interval=25,
-        manage_session=False
+        manage_session=False,
+        # worker processes (JOB_QUEUE) and other cluster nodes emit through it
+        **message_queue_options(),
     )
+    cluster.start()
 
     return app
\ No newline at end of file
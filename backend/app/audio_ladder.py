@@ -0,0 +1,69 @@
+# app/audio_ladder.py
+import os
+import logging
+
+from .config import AUDIO_QUALITY_MAP, DEFAULT_AUDIO_BITRATE
+from .output_cache import audio_cache
+from .utils import get_download_path, sanitize_filename, transcode_stream
+
+logger = logging.getLogger(__name__)
+
+# codec -> (ffmpeg encoder, muxer, file extension)
+AUDIO_CODECS = {
+    "mp3": ("libmp3lame", "mp3", "mp3"),
+    "aac": ("aac", "ipod", "m4a"),
+    "opus": ("libopus", "ogg", "opus"),
+}
+
+
+def normalize_bitrates(bitrates=None):
+    """Validate requested bitrates against AUDIO_QUALITY_MAP, keeping order and dropping repeats."""
+    if isinstance(bitrates, str):
+        bitrates = [bitrates]
+    out = []
+    for bitrate in bitrates or [DEFAULT_AUDIO_BITRATE]:
+        bitrate = str(bitrate).lower()
+        if bitrate not in AUDIO_QUALITY_MAP:
+            raise Exception(f"Unsupported audio bitrate: {bitrate} (use one of {', '.join(AUDIO_QUALITY_MAP)})")
+        if bitrate not in out:
+            out.append(bitrate)
+    return out
+
+
+def cached_variants(platform, media_id, bitrates, codec="mp3"):
+    """``{bitrate: filename}`` if every requested variant is already encoded, else None."""
+    found = {b: audio_cache.lookup(platform, media_id, codec, b) for b in bitrates}
+    return found if all(found.values()) else None
+
+
+def build_ladder(source, platform, media_id, base_name, bitrates, codec="mp3", download_id=None, duration=None, start_progress=None, end_progress=None):
+    """Return ``{bitrate: filename}`` for ``bitrates``, encoding only the missing variants.
+
+    All missing variants come out of a single ffmpeg run, so the source is
+    fetched and decoded once however many bitrates are requested. ``source`` is
+    anything ``transcode_stream`` accepts; ``duration`` enables encode progress.
+    """
+    encoder, muxer, ext = AUDIO_CODECS[codec]
+    folder = get_download_path(platform)
+    results, outputs, args = {}, {}, []
+    for bitrate in bitrates:
+        hit = audio_cache.lookup(platform, media_id, codec, bitrate)
+        if hit:
+            results[bitrate] = hit
+            continue
+        filename = sanitize_filename(f"{base_name}_{bitrate}") + f".{ext}"
+        path = os.path.join(folder, filename)
+        outputs[bitrate] = (filename, path, path + ".part")
+        args += ["-map", "0:a:0", "-vn", "-c:a", encoder, "-b:a", AUDIO_QUALITY_MAP[bitrate], "-f", muxer, path + ".part"]
+
+    if outputs:
+        logger.info(f"Encoding {codec} {', '.join(outputs)} for {platform}:{media_id}")
+        transcode_stream(
+            source, args, download_id, cleanup=[tmp for _, _, tmp in outputs.values()],
+            duration=duration, start_progress=start_progress, end_progress=end_progress,
+        )
+        for bitrate, (filename, path, tmp) in outputs.items():
+            os.replace(tmp, path)
+            audio_cache.record(platform, media_id, codec, bitrate, filename)
+            results[bitrate] = filename
+    return {b: results[b] for b in bitrates}
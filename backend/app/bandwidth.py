@@ -0,0 +1,210 @@
+# app/bandwidth.py
+import time
+import heapq
+import logging
+import threading
+import itertools
+from collections import OrderedDict
+
+from .config import (
+    download_sessions,
+    BANDWIDTH_GLOBAL_LIMIT,
+    BANDWIDTH_PLATFORM_LIMITS,
+    BANDWIDTH_CLIENT_LIMIT,
+)
+from .cancellation import DownloadCancelled
+
+logger = logging.getLogger(__name__)
+
+# tokens a bucket may bank while idle, in seconds of its rate
+BURST_SECONDS = 0.5
+# waiters re-check cancellation and rate changes at least this often
+POLL_INTERVAL = 0.05
+MAX_CLIENT_BUCKETS = 1024
+
+
+class FairBucket:
+    """Token bucket whose waiters are served in weighted-fair (virtual finish time) order.
+
+    Start-time fair queuing: a request starts at ``max(vtime, flow's last finish)``
+    and finishes ``bytes / weight`` later; the earliest start is served first, so
+    active flows share the rate in proportion to their weights while idle flows
+    bank nothing. Chunks larger than the burst are
+    allowed to put the bucket in debt; the next waiter pays it off.
+    A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.tokens = rate * BURST_SECONDS
+        self.updated = time.time()
+        self.vtime = 0.0
+        self.granted = 0
+        self._tags = {}
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.rate * BURST_SECONDS)
+        self.updated = now
+
+    def set_rate(self, rate):
+        with self._cond:
+            self._refill(time.time())
+            self.rate = rate
+            self.tokens = min(self.tokens, rate * BURST_SECONDS) if rate else 0
+            self._cond.notify_all()
+
+    def acquire(self, flow, n, weight=1.0, token=None):
+        if not self.rate:
+            self.granted += n
+            return
+        with self._cond:
+            start = max(self.vtime, self._tags.get(flow, 0.0))
+            self._tags[flow] = start + n / max(weight, 0.01)
+            entry = (start, next(self._seq))
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    if not self.rate:
+                        break
+                    self._refill(time.time())
+                    first = self._queue[0] is entry
+                    if first and self.tokens >= 0:
+                        self.tokens -= n
+                        break
+                    if token is not None and token.cancelled:
+                        raise DownloadCancelled()
+                    wait = -self.tokens / self.rate if first else POLL_INTERVAL
+                    self._cond.wait(min(max(wait, 0.001), POLL_INTERVAL))
+                self.vtime = start
+                self.granted += n
+            finally:
+                if self._queue and self._queue[0] is entry:
+                    heapq.heappop(self._queue)
+                elif entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def forget(self, flow):
+        with self._cond:
+            self._tags.pop(flow, None)
+
+    def stats(self):
+        with self._cond:
+            return {"rate": self.rate, "waiting": len(self._queue), "flows": len(self._tags), "granted_bytes": self.granted}
+
+
+class BandwidthManager:
+    """Global, per-platform and per-client (socket sid or IP) limits applied to every byte we move.
+
+    A chunk passes the client bucket, then its platform's, then the global one.
+    Limits are bytes per second and can be changed at runtime.
+    """
+
+    def __init__(self, global_rate=0, platform_rates=None, client_rate=0):
+        self._lock = threading.Lock()
+        self._global = FairBucket(global_rate)
+        self._platforms = {p: FairBucket(r) for p, r in (platform_rates or {}).items()}
+        self._client_rate = client_rate
+        self._client_overrides = {}
+        self._clients = OrderedDict()
+
+    def _client_bucket(self, client):
+        with self._lock:
+            bucket = self._clients.get(client)
+            if bucket is None:
+                bucket = self._clients[client] = FairBucket(self._client_overrides.get(client, self._client_rate))
+                while len(self._clients) > MAX_CLIENT_BUCKETS:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client)
+            return bucket
+
+    def _buckets(self, platform, client):
+        buckets = []
+        if client and (self._client_rate or client in self._client_overrides):
+            buckets.append(self._client_bucket(client))
+        bucket = self._platforms.get(platform)
+        if bucket and bucket.rate:
+            buckets.append(bucket)
+        if self._global.rate:
+            buckets.append(self._global)
+        return buckets
+
+    def throttle(self, flow, n, platform=None, client=None, weight=1.0, token=None):
+        """Block until ``n`` bytes of ``flow`` fit every applicable limit."""
+        for bucket in self._buckets(platform, client):
+            bucket.acquire(flow, n, weight, token)
+
+    def consume(self, download_id, n, token=None):
+        """``throttle`` for a download job, using the platform/client/weight recorded on its session."""
+        session = download_sessions.get(download_id) or {}
+        self.throttle(download_id, n, session.get("platform"), session.get("client"), session.get("weight", 1.0), token)
+
+    def release(self, flow):
+        for bucket in [self._global, *self._platforms.values(), *list(self._clients.values())]:
+            bucket.forget(flow)
+
+    def set_limits(self, global_rate=None, platforms=None, client_default=None, clients=None):
+        if global_rate is not None:
+            self._global.set_rate(int(global_rate))
+        for platform, rate in (platforms or {}).items():
+            with self._lock:
+                bucket = self._platforms.setdefault(platform, FairBucket(0))
+            bucket.set_rate(int(rate))
+        with self._lock:
+            if client_default is not None:
+                self._client_rate = int(client_default)
+            for client, rate in (clients or {}).items():
+                if rate is None:
+                    self._client_overrides.pop(client, None)
+                else:
+                    self._client_overrides[client] = int(rate)
+            updates = [(b, self._client_overrides.get(c, self._client_rate)) for c, b in self._clients.items()]
+        for bucket, rate in updates:
+            bucket.set_rate(rate)
+        logger.info(f"Bandwidth limits updated: {self.limits()}")
+
+    def apply_share(self, limits, shares):
+        """Adopt a 1/``shares`` part of another process's ``limits()``.
+
+        Worker processes use this so that together they keep the web process's
+        global and per-platform limits; client limits apply per process as-is.
+        """
+        def part(rate):
+            return max(int(rate) // shares, 1) if rate else 0
+
+        with self._lock:
+            dropped = {c: None for c in self._client_overrides if c not in limits["clients"]}
+        self.set_limits(
+            global_rate=part(limits["global"]),
+            platforms={p: part(r) for p, r in limits["platforms"].items()},
+            client_default=limits["client_default"],
+            clients={**dropped, **limits["clients"]},
+        )
+
+    def limits(self):
+        with self._lock:
+            return {
+                "global": self._global.rate,
+                "platforms": {p: b.rate for p, b in self._platforms.items()},
+                "client_default": self._client_rate,
+                "clients": dict(self._client_overrides),
+            }
+
+    def stats(self):
+        with self._lock:
+            clients = {c: b.stats() for c, b in self._clients.items()}
+        return {
+            "limits": self.limits(),
+            "global": self._global.stats(),
+            "platforms": {p: b.stats() for p, b in self._platforms.items()},
+            "clients": clients,
+        }
+
+
+bandwidth = BandwidthManager(BANDWIDTH_GLOBAL_LIMIT, BANDWIDTH_PLATFORM_LIMITS, BANDWIDTH_CLIENT_LIMIT)
@@ -0,0 +1,359 @@
+# app/batch_jobs.py
+import io
+import os
+import time
+import uuid
+import logging
+import zipfile
+import threading
+from concurrent.futures import wait, FIRST_COMPLETED
+from datetime import datetime
+
+from .config import download_sessions, download_cancel_flags
+from .metadata_cache import preview_cache
+from .output_cache import session_files
+from .utils import canonicalize_url, detect_platform, get_download_path, submit_download
+from app import socketio
+
+logger = logging.getLogger(__name__)
+
+# rough sizes used to order a batch when no preview is cached for a URL
+PLATFORM_SIZE_GUESS = {"pinterest": 2 * 1024 * 1024, "instagram": 8 * 1024 * 1024, "youtube": 200 * 1024 * 1024}
+REFRESH_INTERVAL = 0.25
+TERMINAL = ("completed", "error", "cancelled")
+
+_last_refresh = {}
+_refresh_lock = threading.Lock()
+
+
+def _estimated_size(job):
+    """Smallest-first ordering key: cached preview sizes when known, platform guess otherwise."""
+    cached = preview_cache.get(job["canonical_url"])
+    if cached and cached[1] == 200:
+        data = cached[0]
+        media = data.get("media") or []
+        if media and all(m.get("type") == "image" for m in media):
+            return 0
+        sizes = data.get("sizes") or {}
+        size = sizes.get(job["quality"]) or max([s for s in sizes.values() if s], default=None)
+        if size:
+            return size
+    return PLATFORM_SIZE_GUESS.get(job["platform"], PLATFORM_SIZE_GUESS["youtube"])
+
+
+def plan_batch(items, default_quality):
+    """Dedupe identical media and order the batch for throughput.
+
+    Returns ``(jobs, positions)`` where ``positions[i]`` is the index into
+    ``jobs`` that serves input item ``i``.
+    """
+    jobs, positions, seen = [], [], {}
+    for item in items:
+        url = item["url"]
+        platform = item.get("platform") or detect_platform(url)
+        quality = (item.get("quality") or default_quality).lower()
+        key = (canonicalize_url(url), quality)
+        if key not in seen:
+            seen[key] = len(jobs)
+            jobs.append({"url": url, "platform": platform, "quality": quality, "canonical_url": key[0]})
+        positions.append(seen[key])
+
+    order = sorted(range(len(jobs)), key=lambda i: _estimated_size(jobs[i]))
+    remap = {old: new for new, old in enumerate(order)}
+    return [jobs[i] for i in order], [remap[p] for p in positions]
+
+
+def _new_parent(batch_id, make_zip, **extra):
+    download_sessions[batch_id] = dict({
+        "type": "batch",
+        "status": "queued",
+        "progress": 0,
+        "message": "Queued",
+        "children": [],
+        "total": 0,
+        "completed": 0,
+        "failed": 0,
+        "downloaded_bytes": 0,
+        "total_bytes": 0,
+        "zip": bool(make_zip),
+        "created_at": datetime.now().isoformat(),
+    }, **extra)
+    download_cancel_flags.pop(batch_id, None)
+
+
+def _attach_child(batch_id, job):
+    """Create the child session for ``job``; media already on disk is attached as completed."""
+    job["download_id"] = job.get("download_id") or str(uuid.uuid4())
+    session = {
+        "status": "queued",
+        "progress": 0,
+        "message": "Waiting in batch...",
+        "platform": job["platform"],
+        "quality": job["quality"],
+        "client": download_sessions[batch_id].get("client"),
+        "parent_id": batch_id,
+        "created_at": datetime.now().isoformat(),
+    }
+    cached = job.get("cached")
+    if cached:
+        session.update({
+            "status": "completed",
+            "progress": 100,
+            "message": "Already downloaded",
+            "filename": cached["files"][0],
+            "downloaded_files": cached["files"],
+            "skipped": True,
+        })
+    download_sessions[job["download_id"]] = session
+    download_sessions[batch_id]["children"].append(job["download_id"])
+    return session
+
+
+def start_batch(items, worker, quality="1080p", fan_out=3, make_zip=False, client=None):
+    """Create the parent and child sessions and schedule the batch; returns the batch id."""
+    jobs, positions = plan_batch(items, quality)
+    batch_id = str(uuid.uuid4())
+    _new_parent(batch_id, make_zip, total=len(jobs), message=f"Queued {len(jobs)} download(s)", client=client)
+    for job in jobs:
+        _attach_child(batch_id, job)
+    download_sessions[batch_id]["items"] = [
+        {"url": items[i]["url"], "download_id": jobs[p]["download_id"]} for i, p in enumerate(positions)
+    ]
+    socketio.start_background_task(run_batch, batch_id, iter(jobs), worker, fan_out)
+    return batch_id
+
+
+def start_stream_batch(source, worker, fan_out=3, make_zip=False, on_done=None, **extra):
+    """Schedule a batch whose jobs are discovered while it runs (playlists, channels, profiles).
+
+    ``source`` is an iterator of job dicts (url, platform, quality, canonical_url
+    and optionally ``cached``); it is only advanced when a worker slot frees up,
+    so the first download starts as soon as the first item is known.
+    ``on_done(parent)`` runs once the batch finishes without being cancelled.
+    """
+    batch_id = str(uuid.uuid4())
+    _new_parent(batch_id, make_zip, enumerating=True, message="Listing items...", **extra)
+    socketio.start_background_task(run_batch, batch_id, source, worker, fan_out, on_done)
+    return batch_id
+
+
+def run_batch(batch_id, source, worker, fan_out, on_done=None):
+    """Feed children to the shared executor, at most ``fan_out`` at a time.
+
+    If feeding or finishing the batch raises, the running children are
+    cancelled and the parent ends as ``error``; the cancel handle, the flag
+    and the source are released either way.
+    """
+    running = {}
+    parent = download_sessions[batch_id]
+
+    def cancel_running():
+        # fired by the batch's cancel token, so children stop without waiting for this loop
+        for job in list(running.values()):
+            download_cancel_flags[job["download_id"]] = True
+
+    token = download_cancel_flags.token(batch_id)
+    cancel_handle = token.register(cancel_running)
+    try:
+        try:
+            _feed_children(batch_id, parent, source, worker, fan_out, running)
+        finally:
+            token.unregister(cancel_handle)
+            download_cancel_flags.release(batch_id)
+            # release whatever the source holds (open pages, leased Instaloader contexts)
+            close = getattr(source, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception:
+                    logger.exception("Closing the batch source failed")
+        _finish_batch(batch_id, on_done)
+    except Exception as e:
+        logger.exception(f"Batch {batch_id} failed")
+        cancel_running()
+        for child_id in parent["children"]:
+            child = download_sessions.get(child_id)
+            if child and child.get("status") == "queued":
+                child.update({"status": "error", "message": "Batch failed"})
+        parent.update({"status": "error", "message": f"Batch failed: {e}"})
+        try:
+            _emit(batch_id)
+        except Exception:
+            logger.exception(f"Could not report the failure of batch {batch_id}")
+    finally:
+        with _refresh_lock:
+            _last_refresh.pop(batch_id, None)
+
+
+def _feed_children(batch_id, parent, source, worker, fan_out, running):
+    exhausted = False
+    parent["status"] = "downloading"
+    refresh_batch(batch_id, force=True)
+    while not exhausted or running:
+        if download_cancel_flags.get(batch_id):
+            for job in running.values():
+                download_cancel_flags[job["download_id"]] = True
+            # children created up front but never started
+            for child_id in parent["children"]:
+                child = download_sessions.get(child_id)
+                if child and child.get("status") == "queued":
+                    child.update({"status": "cancelled", "message": "Cancelled"})
+            exhausted = True
+
+        while not exhausted and len(running) < fan_out:
+            try:
+                job = next(source)
+            except StopIteration:
+                exhausted = True
+                break
+            except Exception as e:
+                logger.exception("Batch enumeration failed")
+                parent["enumeration_error"] = str(e)
+                exhausted = True
+                break
+            if job.get("download_id") in download_sessions:
+                session = download_sessions[job["download_id"]]
+            else:
+                session = _attach_child(batch_id, job)
+                parent["total"] = len(parent["children"])
+            if session["status"] == "completed":
+                refresh_batch(batch_id)
+                continue
+            download_cancel_flags.pop(job["download_id"], None)
+            future = submit_download(job["download_id"], worker, job["download_id"], job["url"], job["platform"], job["quality"])
+            running[future] = job
+
+        if exhausted:
+            parent["enumerating"] = False
+        if not running:
+            break
+        done, _ = wait(list(running), timeout=0.1, return_when=FIRST_COMPLETED)
+        for future in done:
+            running.pop(future)
+        if done:
+            refresh_batch(batch_id, force=True)
+
+
+def _finish_batch(batch_id, on_done):
+    refresh_batch(batch_id, force=True)
+    parent = download_sessions[batch_id]
+    if download_cancel_flags.get(batch_id):
+        parent.update({"status": "cancelled", "message": "Batch cancelled"})
+    else:
+        parent.update({
+            "status": "completed" if parent["completed"] else "error",
+            "progress": 100,
+            "message": f"Batch finished: {parent['completed']} done, {parent['failed']} failed",
+        })
+        if parent.get("zip") and parent["completed"]:
+            parent["zip_url"] = f"/api/download/batch/{batch_id}/zip"
+        if on_done:
+            try:
+                on_done(parent)
+            except Exception:
+                logger.exception("Batch completion hook failed")
+    _emit(batch_id)
+
+
+def refresh_batch(batch_id, force=False):
+    """Recompute the parent's aggregate progress from its children and emit it to the batch room."""
+    parent = download_sessions.get(batch_id)
+    if not parent or parent.get("type") != "batch":
+        return
+    now = time.time()
+    with _refresh_lock:
+        if not force and now - _last_refresh.get(batch_id, 0) < REFRESH_INTERVAL:
+            return
+        _last_refresh[batch_id] = now
+
+    completed = failed = 0
+    progress = downloaded = total = 0
+    for child_id in parent["children"]:
+        child = download_sessions.get(child_id) or {}
+        status = child.get("status")
+        if status == "completed":
+            completed += 1
+        elif status in ("error", "cancelled"):
+            failed += 1
+        progress += 100 if status in TERMINAL else child.get("progress", 0)
+        downloaded += child.get("downloaded_bytes", 0)
+        total += child.get("total_bytes", 0)
+
+    count = len(parent["children"]) or 1
+    parent.update({
+        "completed": completed,
+        "failed": failed,
+        "progress": min(int(progress / count), 100),
+        "downloaded_bytes": downloaded,
+        "total_bytes": total,
+    })
+    if parent["status"] not in TERMINAL:
+        parent["message"] = f"{completed + failed}/{len(parent['children'])} finished"
+    _emit(batch_id)
+
+
+def _emit(batch_id):
+    socketio.emit("download_update", {"download_id": batch_id, "session": download_sessions[batch_id].payload()}, room=batch_id)
+
+
+def batch_files(batch_id):
+    """``(arcname, path)`` for every file produced by the batch's completed children."""
+    parent = download_sessions.get(batch_id) or {}
+    files, names = [], set()
+    for child_id in parent.get("children", []):
+        child = download_sessions.get(child_id) or {}
+        if child.get("status") != "completed":
+            continue
+        platform = child.get("platform")
+        for filename in session_files(child):
+            path = os.path.join(get_download_path(platform), filename)
+            arcname = f"{platform}/{filename}"
+            if arcname in names or not os.path.exists(path):
+                continue
+            names.add(arcname)
+            files.append((arcname, path))
+    return files
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only buffer that zipfile streams into; drained by the response generator."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._buf += b
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def iter_zip(files, chunk_size=1024 * 1024):
+    """Stream a ZIP of ``files`` without building it in memory or on disk.
+
+    Media is already compressed, so entries are stored; zipfile writes data
+    descriptors because the sink is not seekable.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for arcname, path in files:
+            with open(path, "rb") as src, zf.open(arcname, "w", force_zip64=True) as dst:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,154 @@
+# app/cancellation.py
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadCancelled(Exception):
+    def __init__(self, message="Download cancelled by user."):
+        super().__init__(message)
+
+
+# one condition for every token: cancels are rare, so waking all waiters on each is cheaper
+# than an Event (and its lock) per job
+_cancel_cond = threading.Condition(threading.Lock())
+
+
+class CancelToken:
+    """Per-job cancellation: a flag plus abort callbacks registered by whatever is blocking.
+
+    Stages register how to interrupt themselves (shut down a socket, kill ffmpeg,
+    drop a queued future) so cancelling does not wait for the next poll.
+    """
+
+    __slots__ = ("_cancelled", "_callbacks", "_next")
+
+    def __init__(self):
+        self._cancelled = False
+        self._callbacks = None
+        self._next = 0
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        with _cancel_cond:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks = list(self._callbacks.values()) if self._callbacks else ()
+            self._callbacks = None
+            _cancel_cond.notify_all()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"Cancel callback failed: {e}")
+
+    def wait(self, timeout=None):
+        if self._cancelled:
+            return True
+        with _cancel_cond:
+            return _cancel_cond.wait_for(lambda: self._cancelled, timeout)
+
+    def raise_if_cancelled(self):
+        if self._cancelled:
+            raise DownloadCancelled()
+
+    def register(self, callback):
+        """Run ``callback`` on cancel (immediately if already cancelled); returns a handle for ``unregister``."""
+        with _cancel_cond:
+            if not self._cancelled:
+                self._next += 1
+                if self._callbacks is None:
+                    self._callbacks = {}
+                self._callbacks[self._next] = callback
+                return self._next
+        callback()
+        return None
+
+    def unregister(self, handle):
+        with _cancel_cond:
+            if self._callbacks:
+                self._callbacks.pop(handle, None)
+
+    @contextmanager
+    def on_cancel(self, callback):
+        handle = self.register(callback)
+        try:
+            yield self
+        finally:
+            self.unregister(handle)
+
+
+class CancelFlags(dict):
+    """``download_cancel_flags``: job id -> CancelToken, the token doubling as the job's flag.
+
+    Existing ``download_cancel_flags[id] = True`` / ``.get(id)`` call sites keep
+    working (setting fires the token, reading says whether it fired); ``pop``
+    (done when a job is (re)queued) starts the job with a fresh token. Finished
+    jobs' tokens are released unless cancelled; those stay for late readers
+    until the session registry evicts the job.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._tokens_lock = threading.Lock()
+
+    def token(self, download_id):
+        token = super().get(download_id)
+        if token is None:
+            with self._tokens_lock:
+                token = super().get(download_id)
+                if token is None:
+                    token = CancelToken()
+                    super().__setitem__(download_id, token)
+        return token
+
+    def __setitem__(self, download_id, value):
+        if value:
+            self.token(download_id).cancel()
+
+    def __getitem__(self, download_id):
+        return super().__getitem__(download_id).cancelled
+
+    def get(self, download_id, default=None):
+        token = super().get(download_id)
+        return default if token is None else token.cancelled
+
+    def is_cancelled(self, download_id):
+        """Whether the job's flag is set (``in`` only says a token exists)."""
+        token = super().get(download_id)
+        return token is not None and token.cancelled
+
+    def pop(self, download_id, *default):
+        with self._tokens_lock:
+            token = super().pop(download_id, None)
+        if token is None:
+            if default:
+                return default[0]
+            raise KeyError(download_id)
+        return token.cancelled
+
+    def release(self, download_id):
+        """Forget a finished job's token (a cancelled one stays, as the job's flag, for late readers)."""
+        with self._tokens_lock:
+            token = super().get(download_id)
+            if token is not None and not token.cancelled:
+                super().pop(download_id, None)
+
+
+def abort_response(response):
+    """Unblock a thread sitting in ``iter_content`` on ``response`` by shutting its socket down."""
+    try:
+        sock = response.raw._fp.fp.raw._sock
+        sock.shutdown(socket.SHUT_RDWR)
+    except Exception:
+        try:
+            response.close()
+        except Exception:
+            pass
@@ -0,0 +1,375 @@
+# app/cluster.py
+"""Clustered mode: several backend nodes behind one load balancer.
+
+- Jobs are routed to a node by consistent hashing of their URL (``routed``),
+  so repeat requests for the same media hit the node whose caches know it;
+  requests landing elsewhere are proxied to the owner (or run locally if the
+  owner is unreachable).
+- Every node publishes its sessions to a shared state store (Redis, or a
+  SQLite file as a single-host stand-in), so ``join``, cancel and the job
+  routes work for jobs started on another node.
+- Socket.IO emits fan out through SOCKETIO_MESSAGE_QUEUE; ``sqlite://`` URLs
+  use ``SqliteBus``, the stand-in for Redis pub/sub.
+- With CLUSTER_SHARED_STORAGE=0 files missing locally are streamed from the
+  peer that has them.
+"""
+import json
+import time
+import bisect
+import hashlib
+import logging
+import threading
+from functools import wraps
+
+import socketio as python_socketio
+
+from .config import (
+    CLUSTER_NODES, CLUSTER_NODE_ID, CLUSTER_STATE_URL, CLUSTER_STATE_TTL, CLUSTER_SHARED_STORAGE, SOCKETIO_MESSAGE_QUEUE,
+    QUEUE_POLL_INTERVAL, download_sessions, download_cancel_flags,
+)
+from .job_queue import SessionPublisher, connect
+
+logger = logging.getLogger(__name__)
+
+# set on requests one node proxies to another, so they are never routed again
+HOP_HEADER = "X-Cluster-Hop"
+TERMINAL = ("completed", "error", "cancelled")
+
+
+def sqlite_path(url):
+    """``sqlite:///rel/path`` / ``sqlite:////abs/path`` -> filesystem path."""
+    path = url.split("://", 1)[1]
+    return path[1:] if path.startswith("/") else path
+
+
+class HashRing:
+    """Consistent hashing over node names; adding or removing a node only moves ~1/N of the keys."""
+
+    def __init__(self, nodes, replicas=64):
+        self._ring = sorted((self._hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._keys = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def node_for(self, key):
+        if not self._ring:
+            return None
+        i = bisect.bisect(self._keys, self._hash(key)) % len(self._ring)
+        return self._ring[i][1]
+
+
+# ------------ shared job state ------------
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_state (id TEXT PRIMARY KEY, session TEXT NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS cancel_log (seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL, requested_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS bus (seq INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, message TEXT NOT NULL, created_at REAL NOT NULL);
+"""
+
+
+# cancel requests read per poll, at most
+CANCEL_BATCH = 500
+
+
+class SqliteStateStore:
+    """Shared job state in a SQLite file: the stand-in for Redis when every node runs on one host.
+
+    Cancel requests go to an append-only log that each node reads from its
+    own cursor (``cancels_since``), so polling costs the same however many
+    jobs are running.
+    """
+
+    def __init__(self, path, ttl=CLUSTER_STATE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = connect(self.path, STATE_SCHEMA)
+        return db
+
+    def publish(self, updates):
+        now = time.time()
+        self._db().executemany(
+            "INSERT OR REPLACE INTO job_state (id, session, updated_at) VALUES (?, ?, ?)",
+            [(download_id, json.dumps(session), now) for download_id, session, _ in updates],
+        )
+
+    def get(self, download_id):
+        row = self._db().execute("SELECT session FROM job_state WHERE id = ?", (download_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def request_cancel(self, download_id):
+        self._db().execute("INSERT INTO cancel_log (id, requested_at) VALUES (?, ?)", (download_id, time.time()))
+
+    def cancel_cursor(self):
+        """Cursor past every cancel requested so far."""
+        return self._db().execute("SELECT COALESCE(MAX(seq), 0) FROM cancel_log").fetchone()[0]
+
+    def cancels_since(self, cursor, limit=CANCEL_BATCH):
+        """``(ids, cursor)``: up to ``limit`` cancels requested after ``cursor``, and the cursor past them."""
+        rows = self._db().execute("SELECT seq, id FROM cancel_log WHERE seq > ? ORDER BY seq LIMIT ?", (cursor, limit)).fetchall()
+        return [r[1] for r in rows], (rows[-1][0] if rows else cursor)
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        db = self._db()
+        db.execute("DELETE FROM job_state WHERE updated_at < ?", (cutoff,))
+        db.execute("DELETE FROM cancel_log WHERE requested_at < ?", (cutoff,))
+
+
+class RedisStateStore:
+    """Shared job state in Redis; keys expire CLUSTER_STATE_TTL after a job's last update.
+
+    Cancel requests are appended to a capped stream that nodes read from
+    their own cursor, as with the SQLite store's log.
+    """
+
+    def __init__(self, url, ttl=CLUSTER_STATE_TTL, prefix="downloader:", cancel_log_size=10000):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.cancel_log_size = cancel_log_size
+
+    def publish(self, updates):
+        pipe = self.redis.pipeline(transaction=False)
+        for download_id, session, _ in updates:
+            pipe.set(f"{self.prefix}job:{download_id}", json.dumps(session), ex=self.ttl)
+        pipe.execute()
+
+    def get(self, download_id):
+        raw = self.redis.get(f"{self.prefix}job:{download_id}")
+        return json.loads(raw) if raw else None
+
+    def request_cancel(self, download_id):
+        self.redis.xadd(f"{self.prefix}cancels", {"id": download_id}, maxlen=self.cancel_log_size, approximate=True)
+
+    def cancel_cursor(self):
+        last = self.redis.xrevrange(f"{self.prefix}cancels", count=1)
+        return last[0][0] if last else "0-0"
+
+    def cancels_since(self, cursor, limit=CANCEL_BATCH):
+        streams = self.redis.xread({f"{self.prefix}cancels": cursor}, count=limit)
+        entries = streams[0][1] if streams else []
+        ids = [fields[b"id"].decode("utf-8") for _, fields in entries]
+        return ids, (entries[-1][0] if entries else cursor)
+
+    def prune(self):
+        pass  # job keys expire on their own, the cancel stream is capped
+
+
+def state_store(url):
+    if url.startswith(("redis://", "rediss://")):
+        return RedisStateStore(url)
+    if url.startswith("sqlite://"):
+        return SqliteStateStore(sqlite_path(url))
+    raise Exception(f"Unsupported CLUSTER_STATE_URL: {url}")
+
+
+# ------------ Socket.IO message queue stand-in ------------
+class SqliteBus(python_socketio.PubSubManager):
+    """Socket.IO pub/sub over a SQLite table, for ``sqlite://`` message queue URLs.
+
+    Lets two local processes (cluster nodes, or a node and its workers) share
+    sockets without a Redis server; messages are polled and kept for a minute.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, url, channel="socketio", write_only=False, logger=None, json=None, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = sqlite_path(url)
+        self.retention = retention
+        self._local = threading.local()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = connect(self.path, STATE_SCHEMA)
+        return db
+
+    def _publish(self, data):
+        self._db().execute(
+            "INSERT INTO bus (channel, message, created_at) VALUES (?, ?, ?)", (self.channel, self.json.dumps(data), time.time()),
+        )
+
+    def _listen(self):
+        db = self._db()
+        seq = db.execute("SELECT COALESCE(MAX(seq), 0) FROM bus").fetchone()[0]
+        last_prune = time.monotonic()
+        while True:
+            rows = db.execute("SELECT seq, message FROM bus WHERE seq > ? AND channel = ? ORDER BY seq", (seq, self.channel)).fetchall()
+            for seq, message in rows:
+                yield message
+            if time.monotonic() - last_prune > self.retention:
+                last_prune = time.monotonic()
+                db.execute("DELETE FROM bus WHERE created_at < ?", (time.time() - self.retention,))
+            if not rows:
+                time.sleep(QUEUE_POLL_INTERVAL)
+
+
+def message_queue_options(write_only=False):
+    """``SocketIO.init_app`` kwargs for SOCKETIO_MESSAGE_QUEUE."""
+    if not SOCKETIO_MESSAGE_QUEUE:
+        return {}
+    if SOCKETIO_MESSAGE_QUEUE.startswith("sqlite://"):
+        return {"client_manager": SqliteBus(SOCKETIO_MESSAGE_QUEUE, channel="flask-socketio", write_only=write_only)}
+    return {"message_queue": SOCKETIO_MESSAGE_QUEUE}
+
+
+# ------------ the cluster ------------
+class Cluster:
+    def __init__(self, nodes=CLUSTER_NODES, node_id=CLUSTER_NODE_ID, state_url=CLUSTER_STATE_URL):
+        self.nodes = nodes
+        self.node_id = node_id
+        self.state_url = state_url
+        self.ring = HashRing(nodes)
+        self.store = None
+        self._publisher = SessionPublisher(interval=0.25)
+        self._cancel_cursor = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.nodes and self.node_id in self.nodes and self.state_url)
+
+    def start(self):
+        """Connect the state store and start publishing and relaying cancels (idempotent)."""
+        with self._lock:
+            if self._started or not self.enabled:
+                return
+            self.store = state_store(self.state_url)
+            self._cancel_cursor = self.store.cancel_cursor()
+            self._publisher.start(self.store)
+            threading.Thread(target=self._watch, name="cluster-watch", daemon=True).start()
+            self._started = True
+        logger.info(f"Cluster node {self.node_id} of {sorted(self.nodes)}")
+
+    # ------------ routing ------------
+    def owner(self, key):
+        return self.ring.node_for(key) if key else None
+
+    def forward(self, node, path=None, stream=False):
+        """Replay the current request on ``node``; returns a Flask response, or None if the node is unreachable."""
+        import requests
+        from flask import request, Response, stream_with_context
+        from .utils import client_id
+        headers = {k: v for k, v in request.headers.items() if k.lower() in ("content-type", "range", "x-admin-token", "accept")}
+        headers.update({HOP_HEADER: self.node_id, "X-Client-Id": client_id()})
+        try:
+            r = requests.request(
+                request.method, self.nodes[node] + (path or request.full_path), data=request.get_data(),
+                headers=headers, timeout=(3, 30), stream=stream, allow_redirects=False,
+            )
+        except requests.RequestException as e:
+            logger.warning(f"Node {node} unreachable, handling locally: {e}")
+            return None
+        passed = {k: v for k, v in r.headers.items() if k.lower() in (
+            "content-type", "content-length", "content-range", "accept-ranges", "content-disposition", "etag", "location")}
+        passed["X-Cluster-Node"] = node
+        if stream:
+            # chunk_size=None passes data on as it arrives (SSE), not in fixed-size blocks
+            return Response(stream_with_context(r.iter_content(chunk_size=None)), r.status_code, passed)
+        return Response(r.content, r.status_code, passed)
+
+    def fetch_file(self, path):
+        """Stream ``path`` from the first peer that has it (CLUSTER_SHARED_STORAGE=0); None if none does."""
+        if CLUSTER_SHARED_STORAGE:
+            return None
+        for node in self.nodes:
+            if node == self.node_id:
+                continue
+            response = self.forward(node, path, stream=True)
+            if response is not None and response.status_code in (200, 206):
+                return response
+            if response is not None:
+                response.close()
+        return None
+
+    # ------------ shared state ------------
+    def publish(self, download_id, session):
+        if self.store is not None:
+            self._publisher.publish(download_id, dict(session, node=self.node_id))
+
+    def lookup(self, download_id):
+        """A job's latest session from any node, or None."""
+        session = download_sessions.get(download_id)
+        if session is not None or self.store is None:
+            return session
+        try:
+            return self.store.get(download_id)
+        except Exception as e:
+            logger.warning(f"Shared state lookup failed: {e}")
+            return None
+
+    def request_cancel(self, download_id):
+        if self.store is not None:
+            self.store.request_cancel(download_id)
+
+    def relay_cancels(self):
+        """Apply cancels requested since the last call (on any node) to jobs running here."""
+        while True:
+            ids, self._cancel_cursor = self.store.cancels_since(self._cancel_cursor, CANCEL_BATCH)
+            for download_id in ids:
+                session = download_sessions.get(download_id)
+                if session is None or session.get("status") in TERMINAL:
+                    continue
+                if not download_cancel_flags.get(download_id):
+                    logger.info(f"Cancelling {download_id} on request from another node")
+                    download_cancel_flags[download_id] = True
+            if len(ids) < CANCEL_BATCH:
+                return
+
+    def _watch(self):
+        """Relay cancel requests; prune expired state."""
+        last_prune = time.monotonic()
+        while True:
+            time.sleep(0.5)
+            try:
+                self.relay_cancels()
+                if time.monotonic() - last_prune > 60:
+                    last_prune = time.monotonic()
+                    self.store.prune()
+            except Exception as e:
+                logger.warning(f"Cluster watch failed: {e}")
+
+
+cluster = Cluster()
+
+
+def routed(key):
+    """Run the decorated view on the node owning ``key(json_body)``, proxying the request there."""
+    def decorate(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request
+            if cluster.enabled and not request.headers.get(HOP_HEADER):
+                node = cluster.owner(key(request.get_json(silent=True) or {}))
+                if node and node != cluster.node_id:
+                    response = cluster.forward(node)
+                    if response is not None:
+                        return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def follows_job(view):
+    """Proxy a ``<download_id>`` / ``<batch_id>`` view to the node running that job."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from flask import request
+        job_id = kwargs.get("download_id") or kwargs.get("batch_id")
+        if cluster.enabled and job_id not in download_sessions and not request.headers.get(HOP_HEADER):
+            node = (cluster.lookup(job_id) or {}).get("node")
+            if node and node != cluster.node_id and node in cluster.nodes:
+                response = cluster.forward(node, stream=True)
+                if response is not None:
+                    return response
+        return view(*args, **kwargs)
+    return wrapper
@@ -1,15 +1,25 @@
 # app/config.py
 import os
-from concurrent.futures import ThreadPoolExecutor
+import socket
+import threading
+from .cancellation import CancelFlags
+from .job_state import SessionRegistry
 
 BASE_DIR = os.getcwd()
-DOWNLOADS_DIR = os.path.join(BASE_DIR, "downloads")
-os.makedirs(DOWNLOADS_DIR, exist_ok=True)
+DOWNLOADS_DIR = os.path.join(BASE_DIR, "downloads")  # created by create_app / get_download_path
 
-# shared executor and state
-executor = ThreadPoolExecutor(max_workers=4)
-download_sessions = {}         # {download_id: {...}}
-download_cancel_flags = {}     # {download_id: True}
+# shared state; ``executor`` and ``preview_executor`` are built on first use (see __getattr__ below)
+EXECUTOR_WORKERS = int(os.environ.get("EXECUTOR_WORKERS", "4"))
+PREVIEW_EXECUTOR_WORKERS = int(os.environ.get("PREVIEW_EXECUTOR_WORKERS", "8"))  # metadata lookups, kept off the download workers
+# finished jobs stay readable (file links, SSE, late joins) until SESSION_MAX_FINISHED newer ones
+# have finished or they go unread for SESSION_FINISHED_TTL seconds
+SESSION_MAX_FINISHED = int(os.environ.get("SESSION_MAX_FINISHED", "10000"))
+SESSION_FINISHED_TTL = int(os.environ.get("SESSION_FINISHED_TTL", "3600"))
+download_cancel_flags = CancelFlags()  # {download_id: CancelToken}; setting a flag fires the job's token
+download_sessions = SessionRegistry(   # {download_id: JobState}
+    SESSION_MAX_FINISHED, SESSION_FINISHED_TTL,
+    on_evict=lambda download_id: download_cancel_flags.pop(download_id, None),
+)
 
 # quality mapping used for conversion/resizing
 QUALITY_MAP = {
@@ -22,3 +32,122 @@ QUALITY_MAP = {
     '240p': {'width': 426,  'height': 240},
     '144p': {'width': 256,  'height': 144},
 }
+
+AUDIO_QUALITY_MAP = {
+    '320k': '320k',
+    '256k': '256k',
+    '192k': '192k',
+    '128k': '128k',
+}
+# bitrate used when an audio job does not ask for one
+DEFAULT_AUDIO_BITRATE = os.environ.get("DEFAULT_AUDIO_BITRATE", "192k")
+
+# segmented downloads: bytes per ranged request (YouTube throttles single requests above ~10MB)
+RANGE_CHUNK_SIZE = int(os.environ.get("RANGE_CHUNK_SIZE", str(8 * 1024 * 1024)))
+RANGE_PARTS = int(os.environ.get("RANGE_PARTS", "4"))
+# fsync finished downloads before reporting them (slower; survives power loss)
+WRITE_FSYNC = os.environ.get("WRITE_FSYNC", "0").lower() in ("1", "true", "yes")
+
+# long-lived Instaloader contexts (see instaloader_pool.py)
+# INSTALOADER_SESSION_USERS="user1,user2" loads saved sessions from INSTALOADER_SESSION_DIR
+INSTALOADER_POOL_SIZE = int(os.environ.get("INSTALOADER_POOL_SIZE", "2"))
+INSTALOADER_SESSION_USERS = [u.strip() for u in os.environ.get("INSTALOADER_SESSION_USERS", "").split(",") if u.strip()]
+INSTALOADER_SESSION_DIR = os.environ.get("INSTALOADER_SESSION_DIR") or None
+INSTALOADER_BACKOFF_SECONDS = int(os.environ.get("INSTALOADER_BACKOFF_SECONDS", "60"))
+INSTALOADER_LEASE_TIMEOUT = float(os.environ.get("INSTALOADER_LEASE_TIMEOUT", "10"))
+
+# pytubefix caches (see youtube_cache.py)
+YOUTUBE_MANIFEST_CACHE_SIZE = int(os.environ.get("YOUTUBE_MANIFEST_CACHE_SIZE", "256"))
+# treat signed stream URLs as expired this many seconds early
+YOUTUBE_MANIFEST_SAFETY_MARGIN = int(os.environ.get("YOUTUBE_MANIFEST_SAFETY_MARGIN", "300"))
+YOUTUBE_PLAYER_CACHE_SIZE = int(os.environ.get("YOUTUBE_PLAYER_CACHE_SIZE", "4"))
+
+# preview metadata cache and batch previews
+PREVIEW_CACHE_TTL = int(os.environ.get("PREVIEW_CACHE_TTL", "600"))
+PREVIEW_CACHE_SIZE = int(os.environ.get("PREVIEW_CACHE_SIZE", "512"))
+PREVIEW_BATCH_MAX_URLS = int(os.environ.get("PREVIEW_BATCH_MAX_URLS", "100"))
+# simultaneous upstream lookups per platform during batch previews
+PREVIEW_PLATFORM_CONCURRENCY = {"youtube": 4, "instagram": 2, "pinterest": 4}
+
+# batch download jobs
+BATCH_MAX_URLS = int(os.environ.get("BATCH_MAX_URLS", "200"))
+# children of one batch running at once on the shared executor
+BATCH_MAX_FAN_OUT = int(os.environ.get("BATCH_MAX_FAN_OUT", "4"))
+
+# shared download pipeline (app/pipeline.py): media of one post fetched at once,
+# and pooled connections per platform adapter session
+MEDIA_FETCH_WORKERS = int(os.environ.get("MEDIA_FETCH_WORKERS", "3"))
+PLATFORM_POOL_SIZE = int(os.environ.get("PLATFORM_POOL_SIZE", "16"))
+
+# Pinterest board downloads
+PINTEREST_BOARD_WORKERS = int(os.environ.get("PINTEREST_BOARD_WORKERS", "8"))
+PINTEREST_BOARD_PAGE_SIZE = int(os.environ.get("PINTEREST_BOARD_PAGE_SIZE", "25"))
+
+# bandwidth shaping (bytes/second, 0 = unlimited); adjustable at runtime via /api/admin/bandwidth
+BANDWIDTH_GLOBAL_LIMIT = int(os.environ.get("BANDWIDTH_GLOBAL_LIMIT", "0"))
+# BANDWIDTH_PLATFORM_LIMITS="youtube=20000000,instagram=5000000"
+BANDWIDTH_PLATFORM_LIMITS = {
+    k.strip(): int(v) for k, v in
+    (item.split("=", 1) for item in os.environ.get("BANDWIDTH_PLATFORM_LIMITS", "").split(",") if "=" in item)
+}
+# per socket sid / client IP
+BANDWIDTH_CLIENT_LIMIT = int(os.environ.get("BANDWIDTH_CLIENT_LIMIT", "0"))
+# admin endpoints require this in the X-Admin-Token header; without it they are disabled
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN") or None
+
+# profile every job ("sample" stacks or "cprofile") into downloads/_profiles; jobs can also be armed via /api/admin/profile
+PROFILE_JOBS = {"1": "sample", "true": "sample", "sample": "sample", "cprofile": "cprofile"}.get(os.environ.get("PROFILE_JOBS", "").lower())
+PROFILE_SAMPLE_INTERVAL = int(os.environ.get("PROFILE_SAMPLE_INTERVAL", "10"))  # milliseconds
+# limits on admin-requested profiles: how long a sampler runs, how many run (or wait armed) at once, files kept
+PROFILE_MAX_SECONDS = int(os.environ.get("PROFILE_MAX_SECONDS", "120"))
+PROFILE_MAX_ACTIVE = int(os.environ.get("PROFILE_MAX_ACTIVE", "2"))
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+
+# worker mode: JOB_QUEUE=sqlite makes the web process only enqueue jobs; WORKER_PROCESSES
+# ``python -m app.worker`` processes (0 = started separately) run them WORKER_THREADS at a time
+JOB_QUEUE = os.environ.get("JOB_QUEUE", "").lower()
+JOB_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH") or os.path.join(DOWNLOADS_DIR, "_queue", "jobs.sqlite3")
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", str(os.cpu_count() or 2)))
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", "2"))
+QUEUE_POLL_INTERVAL = float(os.environ.get("QUEUE_POLL_INTERVAL", "0.05"))  # seconds
+# e.g. redis://localhost:6379/0 -- workers then emit progress to sockets themselves, and every
+# cluster node reaches every socket; sqlite:////shared/bus.sqlite3 is a single-host stand-in
+SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE") or None
+
+# HTTP job followers (/api/jobs/<id>/events SSE and ETag long-polling of /api/jobs/<id>)
+UPDATE_BUS_MAX_JOBS = int(os.environ.get("UPDATE_BUS_MAX_JOBS", "10000"))  # jobs whose latest update is kept for followers
+JOB_EVENTS_MIN_INTERVAL = float(os.environ.get("JOB_EVENTS_MIN_INTERVAL", "0.25"))  # seconds between events to one follower
+JOB_EVENTS_KEEPALIVE = float(os.environ.get("JOB_EVENTS_KEEPALIVE", "15"))
+JOB_LONGPOLL_MAX_WAIT = float(os.environ.get("JOB_LONGPOLL_MAX_WAIT", "25"))  # stays under the cluster proxy read timeout
+
+# clustered mode (see cluster.py): CLUSTER_NODES="a=http://10.0.0.1:5000,b=http://10.0.0.2:5000"
+# plus this node's CLUSTER_NODE_ID; jobs are routed to nodes by consistent hashing of their URL
+CLUSTER_NODES = {
+    k.strip(): v.strip().rstrip("/") for k, v in
+    (item.split("=", 1) for item in os.environ.get("CLUSTER_NODES", "").split(",") if "=" in item)
+}
+CLUSTER_NODE_ID = os.environ.get("CLUSTER_NODE_ID") or None
+# the job-queue rows this node owns when JOB_QUEUE_PATH is on shared storage; a restart clears only these
+JOB_QUEUE_OWNER = os.environ.get("JOB_QUEUE_OWNER") or CLUSTER_NODE_ID or socket.gethostname()
+# shared job state: redis://... or sqlite:////shared/cluster.sqlite3 (stand-in for nodes on one host)
+CLUSTER_STATE_URL = os.environ.get("CLUSTER_STATE_URL") or None
+CLUSTER_STATE_TTL = int(os.environ.get("CLUSTER_STATE_TTL", "3600"))  # seconds a job's shared state outlives its last update
+# "0": every node keeps its own downloads/ and fetches missing files from its peers
+CLUSTER_SHARED_STORAGE = os.environ.get("CLUSTER_SHARED_STORAGE", "1").lower() in ("1", "true", "yes")
+
+
+# ------------ Lazily created executors ------------
+_EXECUTORS = {"executor": EXECUTOR_WORKERS, "preview_executor": PREVIEW_EXECUTOR_WORKERS}
+_executors_lock = threading.Lock()
+
+
+def __getattr__(name):
+    """``from .config import executor`` starts the pool on first use, not when config is imported."""
+    if name not in _EXECUTORS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _executors_lock:
+        pool = globals().get(name)
+        if pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            pool = globals()[name] = ThreadPoolExecutor(max_workers=_EXECUTORS[name], thread_name_prefix=name)
+    return pool
@@ -0,0 +1,229 @@
+# app/instaloader_pool.py
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import instaloader
+from instaloader.exceptions import ConnectionException, TooManyRequestsException
+
+from .config import (
+    INSTALOADER_POOL_SIZE,
+    INSTALOADER_SESSION_USERS,
+    INSTALOADER_SESSION_DIR,
+    INSTALOADER_BACKOFF_SECONDS,
+    INSTALOADER_LEASE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+# a context is rebuilt after this many consecutive non-429 failures
+MAX_CONSECUTIVE_FAILURES = 3
+# logged-in contexts re-check their session at most this often
+LOGIN_CHECK_INTERVAL = 600
+MAX_BACKOFF_SECONDS = 1800
+
+
+class _FailFastRateController(instaloader.RateController):
+    """Raise on 429 instead of sleeping, so the pool can move the request to another context."""
+
+    def handle_429(self, query_type):
+        raise TooManyRequestsException(f"429 Too Many Requests ({query_type})")
+
+
+class PooledContext:
+    def __init__(self, index, username=None):
+        self.index = index
+        self.username = username
+        self.loader = None
+        self.leased = False
+        self.uses = 0
+        self.failures = 0
+        self.strikes = 0
+        self.backoff_until = 0.0
+        self.last_used = 0.0
+        self.last_login_check = 0.0
+
+    @property
+    def logged_in(self):
+        return bool(self.loader and self.loader.context.is_logged_in)
+
+    def build(self):
+        if self.loader:
+            try:
+                self.loader.close()
+            except Exception:
+                pass
+        self.loader = instaloader.Instaloader(
+            download_pictures=False,
+            download_videos=False,
+            quiet=True,
+            user_agent=USER_AGENT,
+            max_connection_attempts=1,
+            rate_controller=lambda ctx: _FailFastRateController(ctx),
+        )
+        self.failures = 0
+        if self.username:
+            try:
+                self.loader.load_session_from_file(self.username, self._session_file())
+                self.last_login_check = 0.0
+            except Exception as e:
+                logger.warning(f"Instaloader session for {self.username} not loaded, using anonymous context: {e}")
+        logger.info(f"Instaloader context #{self.index} ready (logged_in={self.logged_in})")
+
+    def _session_file(self):
+        if not INSTALOADER_SESSION_DIR:
+            return None
+        return os.path.join(INSTALOADER_SESSION_DIR, f"session-{self.username}")
+
+    def healthy(self):
+        """Cheap local health check; logged-in contexts also verify their session periodically."""
+        if self.loader is None or self.failures >= MAX_CONSECUTIVE_FAILURES:
+            return False
+        if self.logged_in and time.time() - self.last_login_check > LOGIN_CHECK_INTERVAL:
+            self.last_login_check = time.time()
+            try:
+                if self.loader.test_login() != self.username:
+                    logger.warning(f"Instaloader session for {self.username} expired")
+                    return False
+            except TooManyRequestsException:
+                raise
+            except Exception as e:
+                logger.warning(f"Instaloader login check failed for {self.username}: {e}")
+        return True
+
+    def stats(self):
+        return {
+            "index": self.index,
+            "username": self.username,
+            "logged_in": self.logged_in,
+            "leased": self.leased,
+            "uses": self.uses,
+            "failures": self.failures,
+            "backoff_remaining": max(0.0, round(self.backoff_until - time.time(), 1)),
+        }
+
+
+class InstaloaderPool:
+    """Long-lived Instaloader contexts leased one request at a time.
+
+    Contexts keep their HTTP session, cookies and rate-limit bookkeeping between
+    requests. A context that hits a 429 is parked with exponential backoff and
+    new leases go to the least-used context that is free and not backing off.
+    """
+
+    def __init__(self, size=2, usernames=None, backoff=60, lease_timeout=10):
+        usernames = list(usernames or [])
+        size = max(size, len(usernames), 1)
+        self.backoff = backoff
+        self.lease_timeout = lease_timeout
+        self._contexts = [
+            PooledContext(i, usernames[i] if i < len(usernames) else None) for i in range(size)
+        ]
+        self._cond = threading.Condition()
+
+    def _pick(self, now, loader=None):
+        free = [c for c in self._contexts if not c.leased and c.backoff_until <= now and (loader is None or c.loader is loader)]
+        if not free:
+            return None
+        # logged-in contexts first, then spread load by usage
+        return min(free, key=lambda c: (not c.username, c.uses, c.last_used))
+
+    def _acquire(self, loader=None):
+        deadline = time.time() + self.lease_timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                ctx = self._pick(now, loader)
+                if ctx:
+                    ctx.leased = True
+                    return ctx
+                if loader is not None:
+                    pinned = next((c for c in self._contexts if c.loader is loader), None)
+                    if pinned is None:
+                        raise Exception("Instagram context was reset, restart the sync")
+                    if pinned.backoff_until > now:
+                        raise TooManyRequestsException(
+                            f"Instagram context is rate limited, retry in {int(pinned.backoff_until - now)}s"
+                        )
+                elif all(c.backoff_until > now for c in self._contexts):
+                    wait = min(c.backoff_until for c in self._contexts) - now
+                    raise TooManyRequestsException(
+                        f"All Instagram contexts are rate limited, retry in {int(wait)}s"
+                    )
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise Exception("No Instagram context available, try again shortly")
+                self._cond.wait(remaining)
+
+    def _release(self, ctx, error=None):
+        with self._cond:
+            ctx.leased = False
+            ctx.uses += 1
+            ctx.last_used = time.time()
+            if error is None:
+                ctx.failures = 0
+                ctx.strikes = 0
+            elif _is_rate_limited(error):
+                ctx.strikes += 1
+                wait = min(self.backoff * 2 ** (ctx.strikes - 1), MAX_BACKOFF_SECONDS)
+                ctx.backoff_until = time.time() + wait
+                logger.warning(f"Instaloader context #{ctx.index} rate limited, backing off {wait}s")
+            elif isinstance(error, ConnectionException):
+                ctx.failures += 1
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, loader=None):
+        """Yield a ready ``Instaloader``; errors raised inside the block update the context's health.
+
+        ``loader`` leases that same context again (objects such as a profile's
+        post iterator stay bound to the context that created them); it is not
+        rebuilt in between, and the lease fails if the pool has replaced it.
+        """
+        ctx = self._acquire(loader)
+        try:
+            if loader is None and not ctx.healthy():
+                ctx.build()
+        except Exception as e:
+            self._release(ctx, e)
+            raise
+        try:
+            yield ctx.loader
+        except Exception as e:
+            self._release(ctx, e)
+            raise
+        self._release(ctx)
+
+    def get_post(self, shortcode, attempts=None):
+        """Fetch a ``Post``, moving to another context when one gets rate limited."""
+        attempts = attempts or len(self._contexts)
+        last_error = None
+        for _ in range(attempts):
+            try:
+                with self.lease() as L:
+                    return instaloader.Post.from_shortcode(L.context, shortcode)
+            except Exception as e:
+                last_error = e
+                if not _is_rate_limited(e):
+                    raise
+        raise last_error
+
+    def stats(self):
+        with self._cond:
+            return [c.stats() for c in self._contexts]
+
+
+def _is_rate_limited(error):
+    return isinstance(error, TooManyRequestsException) or "429" in str(error)
+
+
+instaloader_pool = InstaloaderPool(
+    size=INSTALOADER_POOL_SIZE,
+    usernames=INSTALOADER_SESSION_USERS,
+    backoff=INSTALOADER_BACKOFF_SECONDS,
+    lease_timeout=INSTALOADER_LEASE_TIMEOUT,
+)
@@ -0,0 +1,431 @@
+# app/job_queue.py
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import importlib
+import subprocess
+import threading
+from concurrent.futures import Future
+
+from .config import (
+    JOB_QUEUE, JOB_QUEUE_PATH, JOB_QUEUE_OWNER, WORKER_PROCESSES, WORKER_THREADS, QUEUE_POLL_INTERVAL,
+    SOCKETIO_MESSAGE_QUEUE, download_sessions, download_cancel_flags,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    fn TEXT NOT NULL,
+    args TEXT NOT NULL,
+    session TEXT NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (owner, state, enqueued_at);
+CREATE TABLE IF NOT EXISTS updates (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    session TEXT NOT NULL,
+    terminal INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS updates_by_owner ON updates (owner, seq);
+CREATE TABLE IF NOT EXISTS settings (
+    owner TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (owner, key)
+);
+CREATE TABLE IF NOT EXISTS workers (
+    owner TEXT NOT NULL,
+    id TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    metrics TEXT NOT NULL,
+    PRIMARY KEY (owner, id)
+);
+"""
+# finished jobs and applied updates are pruned after this long
+RETENTION_SECONDS = 3600
+# a worker that has not checked in for this long no longer counts (for limit shares and metrics)
+WORKER_STALE_SECONDS = 10
+# immediate attempts at writing a job's final snapshot before leaving it to the background flush
+FINISH_RETRIES = 3
+
+
+def connect(path, schema):
+    """WAL-mode connection to ``path`` with ``schema`` applied; sqlite3 connections are per thread."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    db = sqlite3.connect(path, timeout=30, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(schema)
+    return db
+
+
+def fn_path(fn):
+    """``module:qualname`` for a module-level function, else None (closures cannot cross processes)."""
+    qualname = getattr(fn, "__qualname__", "")
+    if "<" in qualname or not getattr(fn, "__module__", None):
+        return None
+    return f"{fn.__module__}:{qualname}"
+
+
+def resolve_fn(path):
+    module, qualname = path.split(":", 1)
+    obj = importlib.import_module(module)
+    for part in qualname.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+class SqliteJobQueue:
+    """Jobs, their cancel requests and a log of session snapshots in one SQLite file.
+
+    The web process enqueues and reads the update log; worker processes
+    claim jobs and append snapshots. WAL mode lets readers and the single
+    writer of the moment proceed without blocking each other. Every row
+    carries its node's ``owner``, so nodes sharing one file (cluster mode on
+    shared storage) only ever see, claim or clear their own jobs.
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH, owner=JOB_QUEUE_OWNER):
+        self.path = path
+        self.owner = owner
+        self._local = threading.local()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = connect(self.path, SCHEMA)
+        return db
+
+    def reset(self):
+        """Forget this node's jobs from a previous run of its web process; their sessions are gone."""
+        db = self._db()
+        db.execute("DELETE FROM jobs WHERE owner = ?", (self.owner,))
+        db.execute("DELETE FROM updates WHERE owner = ?", (self.owner,))
+        db.execute("DELETE FROM workers WHERE owner = ?", (self.owner,))
+
+    def put(self, download_id, fn, args, session):
+        self._db().execute(
+            "INSERT OR REPLACE INTO jobs (id, owner, fn, args, session, state, enqueued_at) VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+            (download_id, self.owner, fn, json.dumps(args), json.dumps(dict(session or {})), time.time()),
+        )
+
+    def claim(self, worker):
+        """Oldest queued job as ``(id, fn, args, session, enqueued_at)``, now running on ``worker``; None if empty."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT id, fn, args, session, enqueued_at FROM jobs WHERE owner = ? AND state = 'queued' ORDER BY enqueued_at LIMIT 1",
+                (self.owner,),
+            ).fetchone()
+            if row:
+                db.execute("UPDATE jobs SET state = 'running', worker = ?, started_at = ? WHERE id = ?", (worker, time.time(), row[0]))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2]), json.loads(row[3]), row[4]
+
+    def cancel(self, download_id):
+        """Request cancellation; returns True when the job had not started (it is dropped)."""
+        db = self._db()
+        db.execute("UPDATE jobs SET cancel = 1 WHERE id = ? AND owner = ?", (download_id, self.owner))
+        dropped = db.execute(
+            "UPDATE jobs SET state = 'done', finished_at = ? WHERE id = ? AND owner = ? AND state = 'queued'",
+            (time.time(), download_id, self.owner),
+        ).rowcount
+        return bool(dropped)
+
+    def cancelled(self, ids):
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        return [r[0] for r in self._db().execute(f"SELECT id FROM jobs WHERE cancel = 1 AND id IN ({marks})", list(ids))]
+
+    def publish(self, updates):
+        """Append ``[(id, session, terminal)]`` snapshots in one transaction."""
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for download_id, session, terminal in updates:
+                db.execute(
+                    "INSERT INTO updates (owner, job_id, session, terminal) VALUES (?, ?, ?, ?)",
+                    (self.owner, download_id, json.dumps(session), int(terminal)),
+                )
+                if terminal:
+                    db.execute("UPDATE jobs SET state = 'done', finished_at = ? WHERE id = ?", (now, download_id))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def updates_since(self, seq, limit=500):
+        return self._db().execute(
+            "SELECT seq, job_id, session, terminal FROM updates WHERE owner = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (self.owner, seq, limit),
+        ).fetchall()
+
+    def last_seq(self):
+        return self._db().execute("SELECT COALESCE(MAX(seq), 0) FROM updates WHERE owner = ?", (self.owner,)).fetchone()[0]
+
+    def orphans(self, worker):
+        """Jobs ``worker`` was running when it died."""
+        return [r[0] for r in self._db().execute(
+            "SELECT id FROM jobs WHERE owner = ? AND worker = ? AND state = 'running'", (self.owner, worker),
+        )]
+
+    def prune(self, applied_seq):
+        db = self._db()
+        db.execute("DELETE FROM updates WHERE owner = ? AND seq <= ?", (self.owner, applied_seq))
+        db.execute("DELETE FROM jobs WHERE owner = ? AND state = 'done' AND finished_at < ?", (self.owner, time.time() - RETENTION_SECONDS))
+
+    def set_setting(self, key, value):
+        self._db().execute("INSERT OR REPLACE INTO settings (owner, key, value) VALUES (?, ?, ?)", (self.owner, key, json.dumps(value)))
+
+    def setting(self, key, default=None):
+        row = self._db().execute("SELECT value FROM settings WHERE owner = ? AND key = ?", (self.owner, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def heartbeat(self, worker, metrics):
+        """Record that ``worker`` is alive, with its metrics snapshot."""
+        self._db().execute(
+            "INSERT OR REPLACE INTO workers (owner, id, seen_at, metrics) VALUES (?, ?, ?, ?)",
+            (self.owner, worker, time.time(), json.dumps(metrics)),
+        )
+
+    def workers(self):
+        """``{worker: metrics snapshot}`` for this node's workers seen in the last WORKER_STALE_SECONDS."""
+        rows = self._db().execute(
+            "SELECT id, metrics FROM workers WHERE owner = ? AND seen_at > ?", (self.owner, time.time() - WORKER_STALE_SECONDS),
+        )
+        return {worker: json.loads(metrics) for worker, metrics in rows}
+
+    def stats(self):
+        rows = self._db().execute("SELECT state, COUNT(*) FROM jobs WHERE owner = ? GROUP BY state", (self.owner,)).fetchall()
+        return dict(rows)
+
+
+class QueueDispatcher:
+    """Web-process side of worker mode.
+
+    ``submit`` enqueues and returns a Future that resolves when the job's
+    worker finishes it. A listener thread applies workers' session snapshots
+    to ``download_sessions`` (re-emitting them unless workers already emit
+    through the Socket.IO message queue), and a supervisor keeps
+    WORKER_PROCESSES ``python -m app.worker`` processes running. Both start
+    with the first submitted job, so reloader parents never spawn workers.
+    Bandwidth limits are handed to the workers through the queue
+    (``share_limits``), and their metrics come back with their heartbeats.
+    """
+
+    def __init__(self, queue, processes=WORKER_PROCESSES, threads=WORKER_THREADS):
+        self.queue = queue
+        self.processes = processes
+        self.threads = threads
+        self.relay = not SOCKETIO_MESSAGE_QUEUE
+        self._futures = {}
+        self._workers = {}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        return JOB_QUEUE == "sqlite"
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            self.queue.reset()
+            self.share_limits()
+            self._seq = self.queue.last_seq()
+            threading.Thread(target=self._listen, name="job-queue-listener", daemon=True).start()
+            if self.processes:
+                for i in range(self.processes):
+                    self._spawn(f"w{i}")
+                threading.Thread(target=self._supervise, name="job-queue-supervisor", daemon=True).start()
+            import atexit
+            atexit.register(self.stop)
+            self._started = True
+
+    def stop(self):
+        self._stop.set()
+        for proc in list(self._workers.values()):
+            if proc.poll() is None:
+                proc.terminate()
+
+    def submit(self, download_id, fn, args):
+        path = fn_path(fn)
+        if path is None:
+            raise Exception(f"{fn!r} cannot run in a worker process")
+        self.start()
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            self._futures[download_id] = future
+        self.queue.put(download_id, path, list(args), download_sessions.get(download_id))
+
+        token = download_cancel_flags.token(download_id)
+        handle = token.register(lambda: self._cancel(download_id))
+        future.add_done_callback(lambda f: token.unregister(handle))
+        return future
+
+    def share_limits(self):
+        """Publish the current bandwidth limits; this node's workers split them between themselves."""
+        from .bandwidth import bandwidth
+        self.queue.set_setting("bandwidth", bandwidth.limits())
+
+    def worker_metrics(self):
+        """Metrics snapshots of this node's live workers."""
+        return list(self.queue.workers().values())
+
+    def _cancel(self, download_id):
+        if not self.queue.cancel(download_id):
+            return  # running: the worker sees the request and cancels its token
+        session = download_sessions.get(download_id)
+        if session is not None:
+            session.update({"status": "cancelled", "message": "Download cancelled"})
+            self._apply(download_id, session, terminal=True)
+
+    # ------------ progress from workers ------------
+    def _listen(self):
+        last_prune = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                rows = self.queue.updates_since(self._seq)
+            except Exception as e:
+                logger.warning(f"Job queue read failed: {e}")
+                rows = []
+            for seq, download_id, session, terminal in rows:
+                self._seq = seq
+                try:
+                    self._apply(download_id, json.loads(session), bool(terminal))
+                except Exception:
+                    logger.exception(f"Could not apply update for {download_id}")
+            if time.monotonic() - last_prune > 30:
+                last_prune = time.monotonic()
+                self.queue.prune(self._seq)
+            if len(rows) < 500:
+                self._stop.wait(QUEUE_POLL_INTERVAL)
+
+    def _apply(self, download_id, session, terminal=False):
+        from .utils import emit_status
+        download_sessions[download_id] = session  # replaces the record in place, keeping its batch link
+        emit_status(download_id, broadcast=self.relay)
+        if terminal:
+            download_cancel_flags.release(download_id)
+            with self._lock:
+                future = self._futures.pop(download_id, None)
+            if future is not None:
+                future.set_result(None)
+
+    # ------------ worker processes ------------
+    def _spawn(self, worker):
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [backend_dir, os.environ.get("PYTHONPATH")])))
+        self._workers[worker] = subprocess.Popen(
+            [sys.executable, "-m", "app.worker", "--id", worker, "--threads", str(self.threads),
+             "--queue", self.queue.path, "--owner", self.queue.owner, "--parent", str(os.getpid())],
+            env=env,
+        )
+        logger.info(f"Started worker {worker} (pid {self._workers[worker].pid})")
+
+    def _supervise(self):
+        while not self._stop.wait(1):
+            for worker, proc in list(self._workers.items()):
+                if proc.poll() is None:
+                    continue
+                logger.warning(f"Worker {worker} exited with {proc.returncode}, restarting")
+                for download_id in self.queue.orphans(worker):
+                    session = dict(download_sessions.get(download_id) or {}, status="error", message="Worker process exited during the download")
+                    self.queue.publish([(download_id, session, True)])
+                if not self._stop.is_set():
+                    self._spawn(worker)
+
+    def stats(self):
+        with self._lock:
+            workers = {w: p.pid for w, p in self._workers.items() if p.poll() is None}
+        return {"jobs": self.queue.stats(), "workers": workers, "pending_futures": len(self._futures)}
+
+
+class SessionPublisher:
+    """Coalesces ``emit_status`` calls into batched writes to a sink's ``publish([(id, session, terminal)])``.
+
+    Worker processes publish to the job queue, cluster nodes to the shared
+    state store. The latest snapshot per job is written every ``interval``;
+    ``finish`` writes the final one right away.
+    """
+
+    def __init__(self, interval=QUEUE_POLL_INTERVAL):
+        self.interval = interval
+        self.sink = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.sink is not None
+
+    def start(self, sink):
+        self.sink = sink
+        threading.Thread(target=self._run, name="session-publisher", daemon=True).start()
+
+    def publish(self, download_id, session):
+        with self._lock:
+            self._pending[download_id] = (dict(session), False)
+
+    def finish(self, download_id, session):
+        """Write the final snapshot now, retrying; if the sink stays down it is left to the background flush."""
+        with self._lock:
+            self._pending[download_id] = (dict(session), True)
+        for attempt in range(1, FINISH_RETRIES + 1):
+            try:
+                self.flush()
+                return
+            except Exception as e:
+                logger.warning(f"Publishing the final state of {download_id} failed (attempt {attempt}): {e}")
+                time.sleep(self.interval * attempt)
+        logger.error(f"Final state of {download_id} not published yet, retrying in the background")
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                self.sink.publish([(i, s, t) for i, (s, t) in pending.items()])
+            except Exception:
+                # keep the batch for the next flush, never over a newer snapshot
+                for download_id, entry in pending.items():
+                    self._pending.setdefault(download_id, entry)
+                raise
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Publishing progress failed: {e}")
+
+
+dispatcher = QueueDispatcher(SqliteJobQueue())
+publisher = SessionPublisher()
@@ -0,0 +1,248 @@
+# app/job_state.py
+import json
+import time
+import itertools
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+TERMINAL = ("completed", "error", "cancelled")
+
+# keys nearly every job has get a slot; anything else (batch bookkeeping, skipped, zip_url...) goes to ``_extra``
+FIELDS = (
+    "status", "message", "progress", "platform", "quality", "client", "created_at", "parent_id", "type",
+    "filename", "downloaded_files", "download_url", "downloaded_bytes", "total_bytes", "speed", "eta",
+)
+_FIELD_SET = frozenset(FIELDS)
+# versions come from one counter: ``next`` on it is atomic, unlike ``+= 1`` on a slot
+_versions = itertools.count(1)
+
+
+class JobState(MutableMapping):
+    """One job's session: a slotted record that still reads and writes like the old session dict.
+
+    Every write gives it a new ``version``; ``payload()`` (the plain dict sent to sockets
+    and peers) and ``encode()`` (its JSON) are built once per version however
+    many followers read them. Lists stored in it (``children``, ``items``) are
+    shared with the payload, so in-place appends show up only after the next write.
+    """
+
+    __slots__ = FIELDS + ("_extra", "_version", "_payload", "_json", "_registry", "_id")
+
+    def __init__(self, data=()):
+        self._extra = None
+        self._version = 0
+        self._payload = self._json = None
+        self._registry = self._id = None
+        if data:
+            self.update(data)
+
+    @property
+    def version(self):
+        return self._version
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in _FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+        self._version = next(_versions)
+        if key == "status" and self._registry is not None:
+            self._registry._status_changed(self._id, self)
+
+    def __delitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+        self._version = next(_versions)
+
+    def __iter__(self):
+        for name in FIELDS:
+            if hasattr(self, name):
+                yield name
+        if self._extra:
+            yield from list(self._extra)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        return default if self._extra is None else self._extra.get(key, default)
+
+    def __repr__(self):
+        return f"JobState({self.payload()!r})"
+
+    def replace(self, data):
+        """Swap in ``data`` wholesale, keeping the record (and its batch link) in place."""
+        parent_id = self.get("parent_id")
+        for name in FIELDS:
+            if hasattr(self, name):
+                delattr(self, name)
+        self._extra = None
+        self._version = next(_versions)
+        if parent_id:
+            self.parent_id = parent_id
+        self.update(data)
+
+    def payload(self):
+        """The session as a plain dict, cached until the next write; treat it as read-only."""
+        cached = self._payload
+        version = self._version
+        if cached is None or cached[0] != version:
+            data = {name: getattr(self, name) for name in FIELDS if hasattr(self, name)}
+            if self._extra:
+                data.update(self._extra)
+            cached = self._payload = (version, data)
+        return cached[1]
+
+    def encode(self):
+        """``payload()`` as JSON, cached the same way."""
+        cached = self._json
+        version = self._version
+        if cached is None or cached[0] != version:
+            cached = self._json = (version, json.dumps(self.payload(), default=str))
+        return cached[1]
+
+
+class SessionRegistry(dict):
+    """``download_sessions``: job id -> ``JobState``, with finished jobs evicted.
+
+    Assigning a dict stores it as a ``JobState``; assigning over a known job
+    replaces its contents in place, so threads holding the record keep seeing
+    it. Finished top-level jobs are kept for late readers (file links, SSE,
+    ``join``) and dropped least recently used first once more than
+    ``max_terminal`` have finished or one goes unread for ``ttl`` seconds;
+    batch children go together with their batch. ``on_evict(id)`` runs for
+    every dropped job.
+    """
+
+    def __init__(self, max_terminal, ttl, on_evict=None):
+        super().__init__()
+        self.max_terminal = max_terminal
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.evicted = 0
+        self._terminal = OrderedDict()  # {download_id: last read (monotonic)}
+        self._lock = threading.Lock()
+
+    def __setitem__(self, download_id, value):
+        record = super().get(download_id)
+        if record is not None:
+            if record is not value:
+                record.replace(value)
+            return
+        record = value if isinstance(value, JobState) else JobState(value)
+        record._registry, record._id = self, download_id
+        super().__setitem__(download_id, record)
+        self._status_changed(download_id, record)
+
+    def __getitem__(self, download_id):
+        if download_id in self._terminal:
+            self._touch(download_id)
+        return super().__getitem__(download_id)
+
+    def get(self, download_id, default=None):
+        if download_id in self._terminal:
+            self._touch(download_id)
+        return super().get(download_id, default)
+
+    def setdefault(self, download_id, default=None):
+        if download_id not in self:
+            self[download_id] = default if default is not None else {}
+        return self[download_id]
+
+    def update(self, *args, **kwargs):
+        for download_id, value in dict(*args, **kwargs).items():
+            self[download_id] = value
+
+    def __delitem__(self, download_id):
+        self.pop(download_id)
+
+    def pop(self, download_id, *default):
+        with self._lock:
+            self._terminal.pop(download_id, None)
+        record = super().pop(download_id, *default)
+        if isinstance(record, JobState) and record._registry is self:
+            record._registry = None
+        return record
+
+    def _touch(self, download_id):
+        with self._lock:
+            if download_id in self._terminal:
+                self._terminal[download_id] = time.monotonic()
+                self._terminal.move_to_end(download_id)
+
+    def _status_changed(self, download_id, record):
+        """Called by a record whenever its status is written."""
+        with self._lock:
+            if record.get("status") in TERMINAL and not record.get("parent_id"):
+                self._terminal[download_id] = time.monotonic()
+                self._terminal.move_to_end(download_id)
+            else:
+                self._terminal.pop(download_id, None)
+            expired = self._expired()
+        self._drop(expired)
+
+    def _expired(self):
+        expired = []
+        cutoff = time.monotonic() - self.ttl
+        while self._terminal:
+            download_id, last_read = next(iter(self._terminal.items()))
+            if len(self._terminal) <= self.max_terminal and last_read >= cutoff:
+                break
+            del self._terminal[download_id]
+            expired.append(download_id)
+        return expired
+
+    def _drop(self, expired):
+        for download_id in expired:
+            record = super().pop(download_id, None)
+            if record is None:
+                continue
+            dropped = [(download_id, record)]
+            for child_id in record.get("children") or ():
+                child = super().pop(child_id, None)
+                if child is not None:
+                    dropped.append((child_id, child))
+            for dropped_id, dropped_record in dropped:
+                dropped_record._registry = None
+                if self.on_evict:
+                    self.on_evict(dropped_id)
+            self.evicted += len(dropped)
+
+    def sweep(self):
+        """Drop jobs past their TTL now rather than at the next finish."""
+        with self._lock:
+            expired = self._expired()
+        self._drop(expired)
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            finished = len(self._terminal)
+        return {"sessions": len(self), "finished": finished, "evicted": self.evicted}
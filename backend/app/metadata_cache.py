@@ -0,0 +1,73 @@
+# app/metadata_cache.py
+import time
+import threading
+from collections import OrderedDict
+
+from .config import PREVIEW_CACHE_SIZE, PREVIEW_CACHE_TTL
+
+
+class MetadataCache:
+    """Small TTL + LRU cache with single-flight loading.
+
+    Concurrent ``get_or_load`` calls for the same key share one ``loader``
+    call, so duplicate links (in one batch or across users) are resolved once.
+    """
+
+    def __init__(self, max_entries=512, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader, cacheable=lambda value: True):
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    break
+            event.wait()
+            # the owner either cached a value or failed / produced something uncacheable
+            value = self.get(key)
+            if value is not None:
+                return value
+        try:
+            value = loader()
+            if cacheable(value):
+                self.set(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+# preview payloads keyed by canonical URL (see utils.canonicalize_url)
+preview_cache = MetadataCache(max_entries=PREVIEW_CACHE_SIZE, ttl=PREVIEW_CACHE_TTL)
@@ -0,0 +1,379 @@
+# app/metrics.py
+import os
+import time
+import inspect
+import logging
+import threading
+from bisect import bisect_left
+from functools import wraps
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from .config import DOWNLOADS_DIR, download_sessions
+from .tracing import tracer
+from .profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+THROUGHPUT_BUCKETS = tuple(2 ** i * 128 * 1024 for i in range(14))  # 128 KB/s .. 1 GB/s
+DISK_USAGE_TTL = 30
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n) or "unknown") for n in self.label_names)
+
+    def snapshot(self):
+        """``[[label values, value]]``, JSON-ready, for merging into another process's ``render``."""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def _add(self, a, b):
+        return a + b
+
+    def render(self, peers=()):
+        """Exposition lines; ``peers`` are ``Registry.snapshot()``s of other processes, added in."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = dict(self._values)
+        for peer in peers:
+            for key, value in peer.get(self.name) or ():
+                key = tuple(key)
+                values[key] = self._add(values[key], value) if key in values else value
+        for key, value in sorted(values.items()):
+            lines.extend(self._render_one(key, value))
+        return lines
+
+    def _render_one(self, key, value):
+        return [f"{self.name}{_label_text(self.label_names, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Set/inc/dec gauge; ``collect`` (if given) returns ``{label values tuple: value}`` at scrape time.
+
+    ``node_wide`` gauges already describe the whole node from the web process
+    (sessions, disk usage), so worker processes' values are not added in.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect=None, node_wide=False):
+        super().__init__(name, help, labels)
+        self._collect = collect
+        self.node_wide = node_wide
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _refresh(self):
+        if self._collect:
+            try:
+                values = self._collect()
+            except Exception as e:
+                logger.debug(f"Gauge {self.name} collection failed: {e}")
+                values = {}
+            with self._lock:
+                self._values = dict(values)
+
+    def snapshot(self):
+        if self.node_wide:
+            return None
+        self._refresh()
+        return super().snapshot()
+
+    def render(self, peers=()):
+        self._refresh()
+        return super().render(() if self.node_wide else peers)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), [list(counts), total, count]] for key, (counts, total, count) in self._values.items()]
+
+    def _add(self, a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def _render_one(self, key, value):
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{_label_text(self.label_names + ('le',), key + (bound,))} {cumulative}")
+        lines.append(f"{self.name}_bucket{_label_text(self.label_names + ('le',), key + ('+Inf',))} {count}")
+        lines.append(f"{self.name}_sum{_label_text(self.label_names, key)} {total}")
+        lines.append(f"{self.name}_count{_label_text(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        """``{name: values}`` of every metric that worker processes report to the web process."""
+        snapshot = {}
+        for metric in self._metrics:
+            values = metric.snapshot()
+            if values is not None:
+                snapshot[metric.name] = values
+        return snapshot
+
+    def render(self, peers=()):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(peers))
+        return "\n".join(lines) + "\n"
+
+
+_disk_cache = {"at": 0.0, "value": {}}
+_disk_lock = threading.Lock()
+
+
+def _disk_usage():
+    """Bytes under downloads/ per platform folder; walking the tree is cached for DISK_USAGE_TTL."""
+    with _disk_lock:
+        if time.monotonic() - _disk_cache["at"] < DISK_USAGE_TTL:
+            return _disk_cache["value"]
+        usage = {}
+        for entry in (os.scandir(DOWNLOADS_DIR) if os.path.isdir(DOWNLOADS_DIR) else ()):
+            if not entry.is_dir():
+                continue
+            total = 0
+            for root, _, files in os.walk(entry.path):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+            usage[(entry.name,)] = total
+        _disk_cache.update(at=time.monotonic(), value=usage)
+        return usage
+
+
+def _executor_occupancy():
+    from . import config
+    executor = vars(config).get("executor")  # a scrape must not start the pool
+    queued = executor._work_queue.qsize() if executor else 0
+    return {("running",): _running[0], ("queued",): queued, ("workers",): _capacity[0] or config.EXECUTOR_WORKERS}
+
+
+_running = [0]
+_running_lock = threading.Lock()
+_capacity = [None]  # a worker process's thread count, reported instead of EXECUTOR_WORKERS
+
+
+def set_capacity(threads):
+    _capacity[0] = threads
+
+registry = Registry()
+jobs_total = registry.register(Counter("downloader_jobs_total", "Jobs finished, by final state.", ("platform", "kind", "state")))
+metadata_seconds = registry.register(Histogram("downloader_metadata_seconds", "Time to resolve media metadata.", ("platform",)))
+download_throughput = registry.register(Histogram(
+    "downloader_download_throughput_bytes_per_second", "Throughput of each completed media fetch.", ("platform",), THROUGHPUT_BUCKETS,
+))
+download_bytes = registry.register(Counter("downloader_download_bytes_total", "Bytes fetched from upstream.", ("platform",)))
+ffmpeg_seconds = registry.register(Histogram("downloader_ffmpeg_seconds", "Duration of ffmpeg runs.", ("platform", "operation")))
+queue_wait_seconds = registry.register(Histogram("downloader_queue_wait_seconds", "Time a job waited for an executor worker.", ("platform",)))
+job_seconds = registry.register(Histogram("downloader_job_seconds", "End-to-end job latency from submission.", ("platform", "kind", "state")))
+executor_occupancy = registry.register(Gauge("downloader_executor_jobs", "Download executor occupancy.", ("state",), _executor_occupancy))
+active_sockets = registry.register(Gauge("downloader_active_sockets", "Connected Socket.IO clients.", node_wide=True))
+sessions_gauge = registry.register(Gauge(
+    "downloader_sessions", "Entries in download_sessions.", collect=lambda: {(): len(download_sessions)}, node_wide=True,
+))
+sessions_evicted = registry.register(Gauge(
+    "downloader_sessions_evicted", "Finished sessions evicted from download_sessions.", collect=lambda: {(): download_sessions.evicted}, node_wide=True,
+))
+disk_usage = registry.register(Gauge("downloader_disk_usage_bytes", "Bytes stored under downloads/, per folder.", ("folder",), _disk_usage, node_wide=True))
+
+
+def session_platform(download_id):
+    return (download_sessions.get(download_id) or {}).get("platform")
+
+
+_job_local = threading.local()
+
+
+def timed_submit(download_id, fn, queued_at=None):
+    """Wrap an executor task so its queue wait and the executor's occupancy are recorded.
+
+    ``queued_at`` (wall clock) backdates the submission, for jobs enqueued by another process.
+    """
+    queued_at = queued_at or time.time()
+    queued = time.monotonic() - (time.time() - queued_at)
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        queue_wait_seconds.observe(time.monotonic() - queued, platform=session_platform(download_id))
+        _job_local.queued = queued
+        _job_local.queued_at = queued_at
+        with _running_lock:
+            _running[0] += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _job_local.queued = _job_local.queued_at = None
+            with _running_lock:
+                _running[0] -= 1
+    return run
+
+
+def track_job(kind):
+    """Decorate a ``process_*(download_id, url, platform, ...)`` worker: count its final state and latency.
+
+    Also opens the job's root trace span, with the time it spent queued as its first child.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(download_id, url, platform, *args, **kwargs):
+            # from submission when run through submit_download, so queue wait is included
+            start = getattr(_job_local, "queued", None) or time.monotonic()
+            queued_at = getattr(_job_local, "queued_at", None)
+            tracer.begin(download_id)
+            with profiler.watch(f"job:{download_id}", download_id), \
+                    tracer.span(download_id, "job", start=queued_at, platform=platform, kind=kind, host=urlsplit(url).hostname or ""):
+                if queued_at:
+                    tracer.record(download_id, "queued", queued_at, time.time())
+                try:
+                    return fn(download_id, url, platform, *args, **kwargs)
+                finally:
+                    state = (download_sessions.get(download_id) or {}).get("status", "unknown")
+                    tracer.annotate(download_id, state=state)
+                    jobs_total.inc(platform=platform, kind=kind, state=state)
+                    job_seconds.observe(time.monotonic() - start, platform=platform, kind=kind, state=state)
+        return wrapper
+    return decorate
+
+
+_transfer_local = threading.local()
+
+
+def track_transfer(fn):
+    """Decorate a ``(url, filepath, ..., download_id=...)`` fetcher: record bytes and throughput on success.
+
+    Nested tracked calls on the same thread (a ranged fetch falling back to a
+    plain stream) are only counted once, by the outermost.
+    """
+    signature = inspect.signature(fn)
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if getattr(_transfer_local, "active", False):
+            return fn(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        filepath = bound.arguments.get("filepath")
+        download_id = bound.arguments.get("download_id")
+        platform = session_platform(download_id)
+        _transfer_local.active = True
+        start = time.monotonic()
+        try:
+            with tracer.span(download_id, "fetch", host=urlsplit(bound.arguments.get("url") or "").hostname or "",
+                             file=os.path.basename(filepath or "")) as span:
+                result = fn(*args, **kwargs)
+                size = os.path.getsize(filepath) if filepath and os.path.exists(filepath) else None
+                if span is not None and size is not None:
+                    span.attrs["bytes"] = size
+        finally:
+            _transfer_local.active = False
+        elapsed = time.monotonic() - start
+        if size is None:
+            return result
+        download_bytes.inc(size, platform=platform)
+        if elapsed > 0:
+            download_throughput.observe(size / elapsed, platform=platform)
+        return result
+    return wrapper
+
+
+def track_ffmpeg(fn):
+    """Decorate ``run_ffmpeg``: time every run by platform and ``operation`` (merge, resize, encode)."""
+    signature = inspect.signature(fn)
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        download_id = bound.arguments.get("download_id")
+        operation = bound.arguments.get("operation", "ffmpeg")
+        with tracer.span(download_id, operation), ffmpeg_seconds.time(platform=session_platform(download_id), operation=operation):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def timed_metadata(download_id, platform):
+    """Time a metadata lookup in both the histogram and the job's trace."""
+    with tracer.span(download_id, "resolve_metadata"), metadata_seconds.time(platform=platform):
+        yield
+
+
+def render():
+    """The registry as Prometheus text; in worker mode this node's worker processes are added in."""
+    from .job_queue import dispatcher
+    return registry.render(dispatcher.worker_metrics() if dispatcher.enabled else ())
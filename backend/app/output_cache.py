@@ -0,0 +1,213 @@
+# app/output_cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: indexes are only shared between threads
+    fcntl = None
+
+from .config import DOWNLOADS_DIR
+from .utils import canonicalize_url, get_download_path
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.path.join(DOWNLOADS_DIR, "_index")
+
+
+class _IndexLock:
+    """Thread lock plus an advisory ``flock`` on ``<index>.lock``, so worker processes (JOB_QUEUE) can share an index."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                if self._fd is None:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except OSError as e:
+                logger.debug(f"Index lock unavailable, continuing unlocked: {e}")
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None and self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+
+class _JsonIndex:
+    """Small JSON file under ``downloads/_index``, rewritten atomically.
+
+    The in-memory copy is reloaded whenever another process replaced the
+    file, and every access holds the index lock, so read-modify-write
+    cycles from several worker processes do not clobber each other.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = _IndexLock(path + ".lock")
+        self._entries = None
+        self._version = None
+
+    def _file_version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        version = self._file_version()
+        if self._entries is None or version != self._version:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except Exception as e:
+                logger.warning(f"Output index unreadable, starting fresh: {e}")
+                self._entries = {}
+            self._version = version
+        return self._entries
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+        self._version = self._file_version()
+
+    def _persist(self):
+        try:
+            self._save()
+        except Exception as e:
+            logger.warning(f"Could not persist {os.path.basename(self.path)}: {e}")
+
+
+class OutputCache(_JsonIndex):
+    """Persistent map of (canonical URL, quality) -> files already produced for it.
+
+    Lets bulk modes skip media that a previous job finished; entries whose
+    files were deleted are treated as misses.
+    """
+
+    @staticmethod
+    def _key(url, quality):
+        return f"{canonicalize_url(url)}|{(quality or '').lower()}"
+
+    def lookup(self, url, quality):
+        with self._lock:
+            entry = self._load().get(self._key(url, quality))
+        if not entry:
+            return None
+        folder = get_download_path(entry["platform"])
+        if all(os.path.exists(os.path.join(folder, f)) for f in entry["files"]):
+            return entry
+        return None
+
+    def record(self, url, quality, platform, files):
+        files = [f for f in files if f]
+        if not files:
+            return
+        with self._lock:
+            self._load()[self._key(url, quality)] = {
+                "platform": platform,
+                "files": files,
+                "completed_at": time.time(),
+            }
+            self._persist()
+
+
+class SyncIndex(_JsonIndex):
+    """Per-source sync state for incremental bulk modes (high-water marks, resume cursors)."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    @contextmanager
+    def exclusive(self, key):
+        """Hold ``key`` for one sync run; raises if another run (thread or worker process) holds it."""
+        with self._running_lock:
+            if key in self._running:
+                raise Exception("This source is already being synced, try again when that run finishes")
+            self._running.add(key)
+        fd = None
+        try:
+            if fcntl is not None:
+                path = os.path.join(os.path.dirname(self.path), "sync_locks", hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise Exception("This source is already being synced, try again when that run finishes")
+            yield
+        finally:
+            if fd is not None:
+                os.close(fd)  # drops the flock
+            with self._running_lock:
+                self._running.discard(key)
+
+    def get(self, key):
+        with self._lock:
+            return dict(self._load().get(key) or {})
+
+    def update(self, key, **fields):
+        with self._lock:
+            entry = self._load().setdefault(key, {})
+            entry.update(fields, updated_at=time.time())
+            self._persist()
+
+    def clear(self, key):
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                self._persist()
+
+
+class AudioVariantCache(_JsonIndex):
+    """Encoded audio variants keyed by (media id, codec, bitrate); missing files are misses."""
+
+    @staticmethod
+    def _key(platform, media_id, codec, bitrate):
+        return f"{platform}:{media_id}|{codec}|{bitrate}"
+
+    def lookup(self, platform, media_id, codec, bitrate):
+        with self._lock:
+            entry = self._load().get(self._key(platform, media_id, codec, bitrate))
+        if entry and os.path.exists(os.path.join(get_download_path(platform), entry["filename"])):
+            return entry["filename"]
+        return None
+
+    def record(self, platform, media_id, codec, bitrate, filename):
+        with self._lock:
+            self._load()[self._key(platform, media_id, codec, bitrate)] = {"filename": filename, "created_at": time.time()}
+            self._persist()
+
+
+def session_files(session):
+    """Every file a completed session produced (media plus the optional audio link)."""
+    files = list(session.get("downloaded_files") or [session.get("filename")])
+    if session.get("audio_link"):
+        files.append(session["audio_link"]["filename"])
+    return [f for f in files if f]
+
+
+output_cache = OutputCache(os.path.join(INDEX_DIR, "completed.json"))
+sync_index = SyncIndex(os.path.join(INDEX_DIR, "sync.json"))
+audio_cache = AudioVariantCache(os.path.join(INDEX_DIR, "audio.json"))
@@ -0,0 +1,220 @@
+# app/pipeline.py
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .config import download_sessions, download_cancel_flags, DEFAULT_AUDIO_BITRATE, MEDIA_FETCH_WORKERS
+from .audio_ladder import build_ladder, cached_variants
+from .cancellation import DownloadCancelled
+from .metrics import timed_metadata
+from .tracing import tracer
+from .utils import (
+    cancel_token, emit_status, fail_session, smooth_emit_progress, get_download_path, sanitize_filename,
+    download_stream_fast, download_stream_ranged, iter_ranges, resize_with_ffmpeg, run_ffmpeg, ProgressMeter,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def output_name(filename):
+    """Sanitize the stem only, so long titles never lose their extension."""
+    stem, ext = os.path.splitext(filename)
+    return sanitize_filename(stem) + ext
+
+
+def fetch(adapter, media, filepath, download_id=None, start_progress=0, end_progress=100):
+    """Download one descriptor to ``filepath`` over the adapter's pooled session."""
+    session = adapter.session()
+    with tracer.span(download_id, f"fetch_{media.kind}", **media.attrs):
+        if media.ranged:
+            download_stream_ranged(media.url, filepath, media.size, download_id, start_progress, end_progress, session=session)
+        else:
+            download_stream_fast(media.url, filepath, download_id, start_progress, end_progress, session=session)
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _resize(filepath, quality, download_id, start_progress, end_progress):
+    """Convert to ``quality`` next to the original; keeps the original if ffmpeg fails."""
+    stem, ext = os.path.splitext(filepath)
+    converted = f"{stem}_{quality}{ext}"
+    try:
+        resize_with_ffmpeg(filepath, converted, quality, download_id, start_progress, end_progress)
+        os.remove(filepath)
+        return converted
+    except Exception as e:
+        logger.warning(f"Quality conversion failed for {os.path.basename(filepath)}, keeping original: {e}")
+        return filepath
+
+
+def _span(start, end, fraction):
+    if end is None:
+        return None
+    return start + int((end - start) * fraction)
+
+
+def produce(adapter, resolution, media, quality, download_id, start_progress, end_progress, report=True):
+    """Fetch, merge and convert one descriptor; returns ``(filename, audio companion filename)``.
+
+    ``report=False`` (several items of one job in parallel) leaves the shared
+    progress bar to the byte counters instead of each item's ffmpeg runs;
+    ``end_progress=None`` as well leaves it entirely to the caller.
+    """
+    save_path = get_download_path(adapter.name)
+    filepath = os.path.join(save_path, output_name(media.filename))
+    resize = media.resize and adapter.wants_resize(quality)
+    step = (lambda fraction: _span(start_progress, end_progress, fraction)) if report else (lambda fraction: None)
+    companion = None
+
+    if media.audio:
+        tmp_video = filepath + ".video.tmp"
+        tmp_audio = filepath + ".audio.tmp"
+        try:
+            if report:
+                download_sessions[download_id]["message"] = "Downloading video stream..."
+                emit_status(download_id)
+            fetch(adapter, media, tmp_video, download_id, start_progress, _span(start_progress, end_progress, 0.3))
+            if report:
+                download_sessions[download_id]["message"] = "Downloading audio stream..."
+                emit_status(download_id)
+            fetch(adapter, media.audio, tmp_audio, download_id, _span(start_progress, end_progress, 0.3), _span(start_progress, end_progress, 0.6))
+
+            if report:
+                smooth_emit_progress(download_id, step(0.61), "Merging audio and video...")
+            try:
+                run_ffmpeg(
+                    ["-i", tmp_video, "-i", tmp_audio, "-c:v", "copy", "-c:a", "aac", "-preset", "ultrafast", "-threads", "0", filepath],
+                    download_id, resolution.duration, step(0.61), step(0.7 if resize else 0.9), "Merging audio and video",
+                    cleanup=[filepath], operation="merge",
+                )
+            except Exception as e:
+                raise Exception(f"FFmpeg merge failed: {e}")
+            if resize:
+                filepath = _resize(filepath, quality, download_id, step(0.7), step(0.9))
+
+            # audio-only companion at the default ladder bitrate (reused if already encoded)
+            try:
+                with tracer.span(download_id, "mp3", bitrate=DEFAULT_AUDIO_BITRATE):
+                    ladder = build_ladder(
+                        tmp_audio, adapter.name, resolution.media_id, f"{resolution.title}_audio", [DEFAULT_AUDIO_BITRATE],
+                        download_id=download_id, duration=resolution.duration, start_progress=step(0.9), end_progress=step(1),
+                    )
+                companion = ladder[DEFAULT_AUDIO_BITRATE]
+            except Exception as e:
+                logger.warning(f"Audio companion encode failed: {e}")
+        finally:
+            _remove(tmp_video, tmp_audio)
+    else:
+        fetch(adapter, media, filepath, download_id, start_progress, _span(start_progress, end_progress, 0.8) if resize else end_progress)
+        if resize:
+            if not report and end_progress is not None:
+                smooth_emit_progress(download_id, end_progress, f"Converting to {quality}...")
+            filepath = _resize(filepath, quality, download_id, step(0.8), step(1))
+    return os.path.basename(filepath), companion
+
+
+def run_download(adapter, download_id, url, quality):
+    """resolve -> fetch -> merge/convert -> finalize, the same for every platform."""
+    try:
+        token = cancel_token(download_id)
+        token.raise_if_cancelled()
+        with timed_metadata(download_id, adapter.name):
+            resolution = adapter.resolve(url, quality)
+        # resolution cannot be interrupted; don't start downloading if cancelled meanwhile
+        token.raise_if_cancelled()
+        items = resolution.downloads
+        if not items:
+            raise Exception(f"No media found for this {adapter.name.capitalize()} post")
+        smooth_emit_progress(download_id, 10, f"Fetching {resolution.title}...")
+
+        files, companions = [], []
+        if len(items) == 1:
+            filename, companion = produce(adapter, resolution, items[0], quality, download_id, 15, 99)
+            files.append(filename)
+            companions += [companion] if companion else []
+        else:
+            share = 80 / len(items)
+            with ThreadPoolExecutor(max_workers=MEDIA_FETCH_WORKERS) as pool:
+                futures = {
+                    pool.submit(produce, adapter, resolution, media, quality, download_id, 10 + int(i * share), 10 + int((i + 1) * share), False): i
+                    for i, media in enumerate(items)
+                }
+                results = {}
+                try:
+                    for future in as_completed(futures):
+                        results[futures[future]] = future.result()
+                except BaseException:
+                    # drop queued items; running ones abort through the job's cancel token
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+            for i in sorted(results):
+                filename, companion = results[i]
+                files.append(filename)
+                companions += [companion] if companion else []
+        if download_cancel_flags.get(download_id):
+            raise DownloadCancelled()
+
+        finish(adapter, download_id, files, companions[0] if companions else None,
+               "Download completed! ✅" if len(files) == 1 else f"Downloaded {len(files)} file(s)")
+    except Exception as e:
+        logger.exception(f"{adapter.name.capitalize()} download error")
+        if "FFmpeg" in str(e):
+            e = Exception(f"{e}\n\nPlease install FFmpeg to merge video and audio streams.")
+        fail_session(download_id, e)
+
+
+def finish(adapter, download_id, files, audio_filename=None, message="Download completed! ✅"):
+    data = {
+        "status": "completed", "progress": 100, "message": message,
+        "filename": files[0], "downloaded_files": files, "download_url": f"/downloads/{adapter.name}/{files[0]}",
+    }
+    if audio_filename:
+        data["audio_link"] = {"url": f"/downloads/{adapter.name}/{audio_filename}", "filename": audio_filename}
+    download_sessions[download_id].update(data)
+    emit_status(download_id)
+
+
+def run_audio(adapter, download_id, url, bitrates=None):
+    """Audio extraction for every platform.
+
+    With ``bitrates`` all missing mp3 variants come out of one ffmpeg run fed
+    straight from the fetch (audio-only streams are piped, videos are read
+    through the range proxy so ffmpeg can seek); variants already encoded for
+    this media are returned without fetching anything. Without ``bitrates``
+    the source audio stream is saved as-is.
+    """
+    media_id = adapter.media_id(url)
+    if bitrates and media_id:
+        cached = cached_variants(adapter.name, media_id, bitrates)
+        if cached:
+            return finish(adapter, download_id, [cached[b] for b in bitrates], message="Audio served from cache ✅")
+
+    resolution = adapter.resolve_audio(url)
+    source = resolution.media[0]
+    smooth_emit_progress(download_id, 10, f"Fetching audio for {resolution.title}...")
+
+    if not bitrates:
+        filename = output_name(source.filename)
+        smooth_emit_progress(download_id, 15, "Downloading audio stream...")
+        fetch(adapter, source, os.path.join(get_download_path(adapter.name), filename), download_id, 15, 99)
+        return finish(adapter, download_id, [filename], message="Audio downloaded successfully! ✅")
+
+    base_name = os.path.splitext(source.filename)[0]
+    smooth_emit_progress(download_id, 15, f"Downloading and converting audio to {', '.join(bitrates)}...")
+    if source.kind == "audio" and source.size:
+        meter = ProgressMeter(download_id, source.size, 15, 99)
+        # generator: nothing is fetched unless the ladder actually has variants to encode
+        chunks = iter_ranges(source.url, 0, source.size, download_id, meter, session=adapter.session())
+        ladder = build_ladder(chunks, adapter.name, resolution.media_id, base_name, bitrates, download_id=download_id)
+    else:
+        from .range_proxy import range_proxy
+        with range_proxy.serve(source.url, download_id) as proxied:
+            ladder = build_ladder(proxied, adapter.name, resolution.media_id, base_name, bitrates, download_id=download_id)
+    finish(adapter, download_id, [ladder[b] for b in bitrates], message="Audio extracted successfully! ✅")
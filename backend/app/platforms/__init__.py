@@ -1,2 +1,68 @@
 # app/platforms/__init__.py
-# just a package marker
+"""Platform registry.
+
+Each platform is a ``PlatformAdapter`` (see base.py) registered here under a
+URL matcher. The adapter module, and pytubefix / instaloader with it, is
+imported the first time a job or request for that platform needs it, so
+starting the server or a worker does not pay for every platform up front.
+"""
+import re
+import sys
+import importlib
+import threading
+
+# name -> (URL matcher, "module:AdapterClass"), matched in registration order
+_REGISTRY = {}
+_adapters = {}
+_lock = threading.Lock()
+
+
+def register(name, pattern, adapter):
+    _REGISTRY[name] = (re.compile(pattern, re.IGNORECASE), adapter)
+
+
+register("youtube", r"youtube\.com|youtu\.be", "youtube:YoutubeAdapter")
+register("instagram", r"instagram\.com", "instagram:InstagramAdapter")
+register("pinterest", r"pinterest\.[a-z.]+|pin\.it", "pinterest:PinterestAdapter")
+
+
+def platform_names():
+    return list(_REGISTRY)
+
+
+def match_platform(url):
+    """Name of the platform whose matcher accepts ``url``, else None (no imports)."""
+    for name, (matcher, _) in _REGISTRY.items():
+        if matcher.search(url or ""):
+            return name
+    return None
+
+
+def load_platform(name):
+    """Import and return ``app.platforms.<name>``."""
+    if name not in _REGISTRY:
+        raise Exception(f"Unsupported platform: {name}")
+    module_name = _REGISTRY[name][1].split(":")[0]
+    return importlib.import_module(f"{__name__}.{module_name}")
+
+
+def get_adapter(name):
+    """The platform's adapter instance, created on first use."""
+    adapter = _adapters.get(name)
+    if adapter is None:
+        module = load_platform(name)
+        with _lock:
+            adapter = _adapters.get(name)
+            if adapter is None:
+                adapter = _adapters[name] = getattr(module, _REGISTRY[name][1].split(":")[1])()
+    return adapter
+
+
+def adapter_for_url(url):
+    name = match_platform(url)
+    return get_adapter(name) if name else None
+
+
+def loaded_platforms():
+    """Names of the platforms imported so far in this process."""
+    return [name for name, (_, path) in _REGISTRY.items() if f"{__name__}.{path.split(':')[0]}" in sys.modules]
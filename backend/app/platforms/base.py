@@ -0,0 +1,151 @@
+# app/platforms/base.py
+import os
+import threading
+
+from ..config import QUALITY_MAP, PLATFORM_POOL_SIZE
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+class MediaDescriptor:
+    """One output file of a job and how to fetch it.
+
+    ``ranged`` fetches go through the segmented engine (``size`` may be None);
+    ``audio`` is a companion audio-only stream merged into this one; ``resize``
+    converts the result to the requested quality. ``thumbnail`` kinds are only
+    exported (ZIP / preview), never downloaded.
+    """
+
+    __slots__ = ("url", "filename", "kind", "size", "ranged", "audio", "resize", "thumbnail", "attrs")
+
+    def __init__(self, url, filename, kind="video", size=None, ranged=False, audio=None, resize=False, thumbnail=None, **attrs):
+        self.url = url
+        self.filename = filename
+        self.kind = kind
+        self.size = size
+        self.ranged = ranged
+        self.audio = audio
+        self.resize = resize
+        self.thumbnail = thumbnail
+        self.attrs = attrs
+
+    def export(self):
+        """``{url, filename, type}`` entries for a ZIP export (adaptive pairs as two files)."""
+        if not self.audio:
+            return [{"url": self.url, "filename": self.filename, "type": self.kind}]
+        stem = os.path.splitext(self.filename)[0]
+        return [
+            {"url": self.url, "filename": f"{stem}_video.mp4", "type": "video"},
+            {"url": self.audio.url, "filename": self.audio.filename, "type": "audio"},
+        ]
+
+
+class Resolution:
+    """What a URL resolved to: the files to produce plus the metadata describing them."""
+
+    __slots__ = ("media_id", "title", "media", "metadata", "duration")
+
+    def __init__(self, media_id, title, media, metadata=None, duration=None):
+        self.media_id = media_id
+        self.title = title
+        self.media = media
+        self.metadata = metadata or {}
+        self.duration = duration
+
+    @property
+    def downloads(self):
+        return [m for m in self.media if m.kind != "thumbnail"]
+
+
+class PlatformAdapter:
+    """Resolves a platform's URLs to media descriptors; ``app.pipeline`` does the rest.
+
+    Subclasses implement ``media_id`` (cheap, from the URL alone) and
+    ``resolve``; ``resolve_audio`` defaults to the first video of ``resolve``.
+    Page fetches and media downloads share the adapter's pooled session.
+    """
+
+    name = None
+    headers = {"User-Agent": USER_AGENT}
+    ux_tip = None
+
+    def __init__(self):
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    # ------------ to implement ------------
+    def media_id(self, url):
+        raise NotImplementedError
+
+    def resolve(self, url, quality=None):
+        """Return a ``Resolution``; ``quality=None`` asks for the best available (previews, exports)."""
+        raise NotImplementedError
+
+    # ------------ defaults ------------
+    def resolve_audio(self, url):
+        """Resolution whose first media is the audio source (audio-only stream or a video to decode)."""
+        resolution = self.resolve(url)
+        video = next((m for m in resolution.media if m.kind == "video"), None)
+        if not video:
+            raise Exception(f"This {self.name.capitalize()} post doesn't contain a video")
+        stem = os.path.splitext(video.filename)[0]
+        resolution.media = [MediaDescriptor(video.url, f"{stem}_audio.mp4", "video", video.size, video.ranged)]
+        return resolution
+
+    def wants_resize(self, quality):
+        return bool(quality and quality in QUALITY_MAP)
+
+    def session(self):
+        """Pooled ``requests.Session`` for this platform, created on first use."""
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=PLATFORM_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(self.headers)
+                self._session = session
+            return self._session
+
+    def get_page(self, url, timeout=15, **kwargs):
+        r = self.session().get(url, timeout=timeout, **kwargs)
+        r.raise_for_status()
+        return r.text
+
+    def download(self, download_id, url, quality):
+        from ..pipeline import run_download
+        run_download(self, download_id, url, quality)
+
+    def extract_audio(self, download_id, url, bitrates=None):
+        from ..pipeline import run_audio
+        run_audio(self, download_id, url, bitrates)
+
+    def export(self, url):
+        """``(metadata, media_urls)`` for the metadata ZIP."""
+        resolution = self.resolve(url)
+        media_urls = [entry for m in resolution.media for entry in m.export()]
+        return dict(resolution.metadata, platform=self.name, post_url=url), media_urls
+
+    def preview(self, url):
+        """Preview payload and HTTP status."""
+        if not self.media_id(url):
+            return {"error": f"Invalid {self.name.capitalize()} link"}, 400
+        resolution = self.resolve(url)
+        media = [
+            {"type": m.kind, "url": m.url, "thumbnail": m.thumbnail} if m.kind == "video" else {"type": m.kind, "url": m.url}
+            for m in resolution.downloads
+        ]
+        if not media:
+            return {"error": "No media found. The post might be private or unavailable."}, 404
+        author = resolution.metadata.get("author")
+        return {
+            "platform": self.name,
+            "title": resolution.title,
+            "author": f"@{author}" if author else None,
+            "media": media,
+            "thumbnail": media[0].get("thumbnail") or media[0]["url"],
+            "available_qualities": list(QUALITY_MAP),
+            "ux_tip": self.ux_tip,
+        }, 200
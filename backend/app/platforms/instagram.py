@@ -1,172 +1,178 @@
 # app/platforms/instagram.py
-import os
-import logging
 import re
+import logging
 import instaloader
-import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from ..config import download_sessions, download_cancel_flags
-from ..utils import get_download_path, smooth_emit_progress, emit_status, resize_with_ffmpeg, download_stream_fast, sanitize_filename
+from ..instaloader_pool import instaloader_pool
+from ..output_cache import output_cache, sync_index
+from .base import PlatformAdapter, MediaDescriptor, Resolution, USER_AGENT
 logger = logging.getLogger(__name__)
 
+# first path segments that are never usernames
+RESERVED_PATHS = {"p", "reel", "reels", "tv", "stories", "explore", "accounts", "direct", "about", "developer"}
+
 def extract_shortcode(url):
     m = re.search(r"/(?:p|reel|reels)/([A-Za-z0-9_-]+)", url)
     return m.group(1) if m else None
 
-def gather_instagram_metadata(url):
-    """Return (metadata, media_urls_list) where media_urls_list contains dicts {url, filename, type}"""
-    shortcode = extract_shortcode(url)
-    if not shortcode:
-        raise Exception("Invalid Instagram URL")
-    metadata = {"platform":"instagram","post_url":url}
-    media_urls = []
-    try:
-        L = instaloader.Instaloader(download_pictures=False, download_videos=False, quiet=True, user_agent="Mozilla/5.0")
-        post = instaloader.Post.from_shortcode(L.context, shortcode)
+def extract_profile_username(url):
+    """``instagram.com/<username>/`` -> username (also accepts a bare ``@username``)."""
+    m = re.match(r"^@?([A-Za-z0-9_.]{1,30})$", url.strip())
+    if not m:
+        m = re.search(r"instagram\.com/([A-Za-z0-9_.]{1,30})/?(?:[?#]|$)", url)
+    if not m or m.group(1).lower() in RESERVED_PATHS:
+        return None
+    return m.group(1).lower()
+
+class ProfileSync:
+    """Iterate a profile's posts newest-first as batch jobs, stopping at the last synced post.
+
+    The high-water mark (newest shortcode and timestamp) lives in the sync index
+    under ``instagram:<username>``; a re-sync of an unchanged profile costs the
+    profile lookup plus one page of posts. The mark only moves forward through
+    ``commit`` once every post above it has been enumerated and downloaded.
+    """
+
+    def __init__(self, username, quality="1080p", full=False, limit=None):
+        self.username = username
+        self.quality = quality
+        self.limit = limit
+        self.key = f"instagram:{username}"
+        self.since = 0 if full else sync_index.get(self.key).get("timestamp", 0)
+        self.newest = None
+        self.reached_mark = False
+
+    def __iter__(self):
+        # run_batch only advances this when a fan-out slot frees up, which can take hours over a
+        # whole profile, so the pooled context is leased per step rather than for the whole sync
+        count = 0
+        with instaloader_pool.lease() as L:
+            profile = instaloader.Profile.from_username(L.context, self.username)
+            posts = profile.get_posts()
+        while True:
+            # the iterator fetches its next page on the context that created it
+            with instaloader_pool.lease(L):
+                post = next(posts, None)
+            if post is None:
+                break
+            ts = post.date_utc.timestamp()
+            if ts <= self.since:
+                # pinned posts sit above newer ones; only a regular post ends the scan
+                if getattr(post, "is_pinned", False):
+                    continue
+                self.reached_mark = True
+                return
+            if self.newest is None or ts > self.newest[1]:
+                self.newest = (post.shortcode, ts)
+            url = f"https://www.instagram.com/p/{post.shortcode}/"
+            yield {
+                "url": url,
+                "platform": "instagram",
+                "quality": self.quality,
+                "canonical_url": url,
+                "cached": output_cache.lookup(url, self.quality),
+            }
+            count += 1
+            if self.limit and count >= self.limit:
+                return
+        self.reached_mark = True
+
+    def commit(self, parent):
+        """Batch completion hook: advance the high-water mark if nothing above it was missed."""
+        if not self.reached_mark or parent.get("failed") or parent.get("enumeration_error"):
+            return
+        if self.newest:
+            sync_index.update(self.key, shortcode=self.newest[0], timestamp=self.newest[1])
+        else:
+            sync_index.update(self.key)
+
+def _clean(url):
+    return str(url).replace("\\u0026", "&").replace("\\/", "/")
+
+
+class InstagramAdapter(PlatformAdapter):
+    """Posts, reels and carousels: every item is a file, resized to the requested quality.
+
+    Metadata comes from a pooled Instaloader context; when that fails (rate
+    limits, login walls) the public embed page is scraped instead.
+    """
+
+    name = "instagram"
+    headers = {
+        "User-Agent": USER_AGENT,
+        "Accept": "text/html,application/xhtml+xml",
+        "Accept-Language": "en-US,en;q=0.9",
+        "Referer": "https://www.instagram.com/",
+    }
+    ux_tip = "📱 Instagram Post • All qualities available with conversion"
+
+    def media_id(self, url):
+        return extract_shortcode(url)
+
+    def resolve(self, url, quality=None):
+        shortcode = extract_shortcode(url)
+        if not shortcode:
+            raise Exception("Invalid Instagram URL")
+        try:
+            resolution = self._from_post(shortcode)
+            if resolution.media:
+                return resolution
+        except Exception as e:
+            logger.info(f"Instaloader lookup for {shortcode} failed, scraping the embed page: {e}")
+        return self._from_embed(shortcode)
+
+    def _from_post(self, shortcode):
+        post = instaloader_pool.get_post(shortcode)
         title = "Instagram Post"
         caption = getattr(post, "caption", None)
         if caption:
+            caption = str(caption).strip()
             title = caption[:100] + ("..." if len(caption) > 100 else "")
-        metadata.update({
-            "title": title,
-            "author": getattr(post, "owner_username", None),
-            "caption": caption
-        })
         nodes = []
         try:
             if hasattr(post, "get_sidecar_nodes"):
                 sidecar = post.get_sidecar_nodes
                 nodes = list(sidecar()) if callable(sidecar) else list(sidecar)
-        except:
+        except Exception:
             pass
+        media = []
         if nodes:
-            for idx, node in enumerate(nodes):
-                is_video = getattr(node, "is_video", False)
-                if is_video:
-                    video_url = getattr(node, "video_url", None)
-                    if video_url:
-                        media_urls.append({"url": str(video_url).replace("\\u0026","&"), "filename": f"{shortcode}_{idx+1}.mp4", "type":"video"})
-                else:
-                    img_url = getattr(node, "display_url", None)
-                    if img_url:
-                        media_urls.append({"url": str(img_url).replace("\\u0026","&"), "filename": f"{shortcode}_{idx+1}.jpg", "type":"image"})
+            for idx, node in enumerate(nodes, 1):
+                if getattr(node, "is_video", False):
+                    if getattr(node, "video_url", None):
+                        media.append(MediaDescriptor(_clean(node.video_url), f"{shortcode}_{idx}.mp4", "video", resize=True, thumbnail=getattr(node, "display_url", None)))
+                elif getattr(node, "display_url", None):
+                    media.append(MediaDescriptor(_clean(node.display_url), f"{shortcode}_{idx}.jpg", "image", resize=True))
+        elif getattr(post, "is_video", False):
+            media.append(MediaDescriptor(_clean(post.video_url), f"{shortcode}.mp4", "video", resize=True, thumbnail=str(post.url)))
         else:
-            if getattr(post, "is_video", False):
-                media_urls.append({"url": str(post.video_url).replace("\\u0026","&"), "filename": f"{shortcode}.mp4", "type":"video"})
-            else:
-                media_urls.append({"url": str(post.url).replace("\\u0026","&"), "filename": f"{shortcode}.jpg", "type":"image"})
-    except Exception as e:
-        # fallback scraping
-        try:
-            headers = {"User-Agent":"Mozilla/5.0","Referer":"https://www.instagram.com/"}
-            embed_url = f"https://www.instagram.com/p/{shortcode}/embed/captioned/"
-            r = requests.get(embed_url, headers=headers, timeout=15)
-            r.raise_for_status()
-            html = r.text
-            video_patterns = [r'"video_url":"(https://[^"]+)"', r'"video_url":\s*"(https://[^"]+)"']
-            for pattern in video_patterns:
-                match = re.search(pattern, html)
-                if match:
-                    media_urls.append({"url": match.group(1).replace("\\u0026","&").replace("\\/","/"), "filename": f"{shortcode}.mp4", "type":"video"})
-                    break
-            if not media_urls:
-                img_patterns = [r'"display_url":"(https://[^"]+)"', r'"thumbnail_src":"(https://[^"]+)"']
-                for pattern in img_patterns:
-                    matches = re.findall(pattern, html)
-                    for i, img_url in enumerate(matches[:10]):
-                        clean_url = img_url.replace("\\u0026","&").replace("\\/","/")
-                        media_urls.append({"url": clean_url, "filename": f"{shortcode}_{i+1}.jpg", "type":"image"})
-        except Exception:
-            raise Exception("Failed to gather metadata")
-    return metadata, media_urls
+            media.append(MediaDescriptor(_clean(post.url), f"{shortcode}.jpg", "image", resize=True))
+        metadata = {"title": title, "author": getattr(post, "owner_username", None), "caption": caption}
+        return Resolution(shortcode, title, media, metadata)
 
-def download_instagram(download_id, url, quality='1080p'):
-    try:
-        shortcode = extract_shortcode(url)
-        if not shortcode:
-            raise Exception("Invalid Instagram URL")
-        save_path = get_download_path("instagram")
-        metadata, media_urls = gather_instagram_metadata(url)
-        if not media_urls:
-            raise Exception("No media URLs found")
-        files = []
-        def download_single(idx, mi):
-            if download_cancel_flags.get(download_id):
-                return None
-            media_url = mi["url"]
-            is_video = mi["type"] == "video"
-            ext = ".mp4" if is_video else ".jpg"
-            filename = sanitize_filename(mi.get("filename", f"{shortcode}_{idx}{ext}"))
-            filepath = os.path.join(save_path, filename)
-            download_stream_fast(media_url, filepath, download_id, 10 + int((idx-1)/len(media_urls)*70), 10 + int(idx/len(media_urls)*70), max_retries=3)
-            # conversion
-            from ..config import QUALITY_MAP
-            if quality and quality in QUALITY_MAP:
-
-                converted = filepath.replace(ext, f"_{quality}{ext}")
-                try:
-                    smooth_emit_progress(download_id, 70 + int(idx/len(media_urls)*20), f"Converting to {quality}...")
-                    resize_with_ffmpeg(filepath, converted, quality)
-                    os.remove(filepath)
-                    filepath = converted
-                    filename = os.path.basename(converted)
-                except Exception as e:
-                    logger.warning(f"Quality conversion failed for {filename}: {e}")
-            return filename
-
-        with ThreadPoolExecutor(max_workers=3) as pool:
-            futures = {pool.submit(download_single, i+1, m): i for i,m in enumerate(media_urls)}
-            for future in as_completed(futures):
-                if download_cancel_flags.get(download_id):
-                    pool.shutdown(wait=False)
-                    raise Exception("Download cancelled")
-                fn = future.result()
-                if fn:
-                    files.append(fn)
-        if not files:
-            raise Exception("No files downloaded")
-        smooth_emit_progress(download_id, 100, "Completed ✅")
-        download_sessions[download_id].update({
-            "status":"completed",
-            "filename": files[0],
-            "downloaded_files": files,
-            "message": f"Downloaded {len(files)} file(s)"
-        })
-        emit_status(download_id)
-    except Exception as e:
-        logger.exception("Instagram download error")
-        download_sessions[download_id] = {"status":"error","message":str(e)}
-        emit_status(download_id)
-
-def extract_instagram_audio(download_id, url):
-    try:
-        shortcode = extract_shortcode(url)
-        if not shortcode:
-            raise Exception("Invalid Instagram URL")
-        metadata, media_urls = gather_instagram_metadata(url)
-        video_url = None
-        for m in media_urls:
-            if m["type"] == "video":
-                video_url = m["url"]
+    def _from_embed(self, shortcode):
+        html = self.get_page(f"https://www.instagram.com/p/{shortcode}/embed/captioned/")
+        title, author = "Instagram Post", None
+        for pattern in [r'"caption":"([^"]{1,200})', r'"edge_media_to_caption".*?"text":"([^"]{1,200})', r'<meta property="og:description" content="([^"]{1,200})']:
+            m = re.search(pattern, html)
+            if m and m.group(1).strip() not in ("", "Instagram", "Instagram Post"):
+                caption = m.group(1).strip()
+                title = caption[:100] + ("..." if len(caption) > 100 else "")
                 break
-        if not video_url:
-            raise Exception("No video found for audio extraction")
-        save_path = get_download_path("instagram")
-        filename = sanitize_filename(f"{shortcode}_audio.mp3")
-        filepath = os.path.join(save_path, filename)
-        ffmpeg_path = __import__("..utils", fromlist=["find_ffmpeg"]).find_ffmpeg()
-        if not ffmpeg_path:
-            raise Exception("FFmpeg is required for audio extraction")
-        smooth_emit_progress(download_id, 20, "Extracting audio directly (fast)...")
-        cmd = [ffmpeg_path, "-i", video_url, "-vn", "-acodec", "libmp3lame", "-b:a", "192k", "-y", filepath]
-        subprocess = __import__("subprocess")
-        res = subprocess.run(cmd, capture_output=True, text=True, timeout=180)
-        if res.returncode != 0:
-            raise Exception(f"Audio extraction failed: {res.stderr}")
-        smooth_emit_progress(download_id, 100, "Audio extracted! ✅")
-        download_sessions[download_id].update({"status":"completed","progress":100,"message":"Audio extracted successfully! ✅","filename":filename,"downloaded_files":[filename],"download_url":f"/downloads/instagram/{filename}"})
-        emit_status(download_id)
-    except Exception as e:
-        logger.exception("Instagram audio extraction error")
-        download_sessions[download_id] = {"status":"error","message":str(e)}
-        emit_status(download_id)
+        for pattern in [r'"username":"([^"]+)"', r'"owner":\{"username":"([^"]+)"']:
+            m = re.search(pattern, html)
+            if m:
+                author = m.group(1)
+                break
+        media = []
+        m = re.search(r'"video_url":\s*"(https://[^"]+)"', html)
+        if m:
+            media.append(MediaDescriptor(_clean(m.group(1)), f"{shortcode}.mp4", "video", resize=True))
+        else:
+            seen = set()
+            for pattern in [r'"display_url":"(https://[^"]+)"', r'"thumbnail_src":"(https://[^"]+)"']:
+                for img_url in re.findall(pattern, html):
+                    img_url = _clean(img_url)
+                    if img_url not in seen and len(seen) < 10:
+                        seen.add(img_url)
+                        media.append(MediaDescriptor(img_url, f"{shortcode}_{len(seen)}.jpg", "image", resize=True))
+        return Resolution(shortcode, title, media, {"title": title, "author": author})
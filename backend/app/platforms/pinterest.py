@@ -1,12 +1,41 @@
 # app/platforms/pinterest.py
 import os
 import re
+import json
 import logging
+import threading
 import requests
-from ..config import download_sessions, download_cancel_flags
-from ..utils import get_download_path, smooth_emit_progress, emit_status, resize_with_ffmpeg, download_stream_fast, sanitize_filename
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from ..config import download_sessions, download_cancel_flags, PINTEREST_BOARD_WORKERS, PINTEREST_BOARD_PAGE_SIZE
+from ..output_cache import output_cache, sync_index
+from ..utils import canonicalize_url, smooth_emit_progress, emit_status, fail_session, get_download_path
+from ..cancellation import DownloadCancelled
+from .base import PlatformAdapter, MediaDescriptor, Resolution
 logger = logging.getLogger(__name__)
 
+RESOURCE_URL = "https://www.pinterest.com/resource/{name}/get/"
+# first path segments that are never a username/board pair
+RESERVED_PATHS = {"pin", "search", "ideas", "today", "resource", "settings", "business", "_"}
+# pick the first progressive mp4 in this order; HLS lists are skipped
+VIDEO_FORMATS = ["V_720P", "V_EXP7", "V_EXP6", "V_EXP5", "V_EXP4", "V_EXP3"]
+# output cache quality key for media kept at its published size (board pins)
+ORIGINAL = "original"
+IMAGE_PATTERNS = [r'"images":\{"orig":\{"url":"([^"]+)"', r'"url":"(https://i\.pinimg\.com/originals/[^"]+)"']
+TITLE_PATTERNS = [r'"title":"([^"]{1,200})', r'"description":"([^"]{1,200})', r'<meta property="og:title" content="([^"]+)"']
+
+def extract_pin_id(url):
+    m = re.search(r"/pin/(\d+)", url)
+    return m.group(1) if m else None
+
+def extract_board(url):
+    """``pinterest.com/<username>/<board>/`` -> (username, board_slug), else None."""
+    m = re.search(r"pinterest\.[a-z.]+/([^/?#]+)/([^/?#]+)/?(?:[?#]|$)", url)
+    if not m or m.group(1).lower() in RESERVED_PATHS:
+        return None
+    return m.group(1), m.group(2)
+
 def extract_video_url(html):
     patterns = [
         r'"video_url":"(https:[^"]+mp4[^"]*)"',
@@ -19,106 +48,202 @@ def extract_video_url(html):
             return m.group(1).replace("\\u0026", "&").replace("\\/", "/").replace("\\", "")
     return None
 
-def gather_pinterest_metadata(url):
-    headers = {"User-Agent":"Mozilla/5.0","Referer":"https://www.pinterest.com/"}
-    r = requests.get(url, headers=headers, timeout=15)
-    r.raise_for_status()
-    html = r.text
-    title = "Pinterest Post"
-    for pattern in [r'"title":"([^"]{1,500})', r'"description":"([^"]{1,500})', r'<meta property="og:title" content="([^"]+)"']:
-        m = re.search(pattern, html)
-        if m:
-            title = m.group(1).strip()
-            if title and title != "Pinterest":
-                break
-    media_urls = []
-    video_url = extract_video_url(html)
-    if video_url:
-        media_urls.append({"url": video_url.replace("\\u0026","&"), "filename":"pinterest_video.mp4", "type":"video"})
-        thumbnail_match = re.search(r'"thumbnailUrl":"([^"]+)"', html)
-        if thumbnail_match:
-            media_urls.append({"url": thumbnail_match.group(1).replace("\\u0026","&"), "filename":"thumbnail.jpg", "type":"thumbnail"})
-    else:
-        for pattern in [r'"images":\{"orig":\{"url":"([^"]+)"', r'"url":"(https://i\.pinimg\.com/originals/[^"]+)"']:
+class PinterestAdapter(PlatformAdapter):
+    """Single pins resolve to their progressive video, else the original image;
+    board URLs are handed to ``download_pinterest_board``."""
+
+    name = "pinterest"
+    headers = {"User-Agent": "Mozilla/5.0", "Referer": "https://www.pinterest.com/"}
+    ux_tip = "📌 Pinterest • All qualities available with conversion"
+
+    def media_id(self, url):
+        return extract_pin_id(url) or canonicalize_url(url)
+
+    def resolve(self, url, quality=None):
+        html = self.get_page(url)
+        title = "Pinterest Post"
+        for pattern in TITLE_PATTERNS:
             m = re.search(pattern, html)
             if m:
-                media_urls.append({"url": m.group(1).replace("\\u0026","&").replace("\\/","/"), "filename":"pinterest_image.jpg", "type":"image"})
-                break
-    metadata = {"platform":"pinterest","title":title,"post_url":url}
-    return metadata, media_urls
-
-def download_pinterest(download_id, url, quality='1080p'):
-    try:
-        headers = {"User-Agent":"Mozilla/5.0","Referer":"https://www.pinterest.com/"}
-        r = requests.get(url, headers=headers, timeout=10)
-        r.raise_for_status()
-        html = r.text
+                title = m.group(1).strip()
+                if title and title != "Pinterest":
+                    break
+        name = f"pinterest_{extract_pin_id(url) or 'post'}"
+        media = []
         video_url = extract_video_url(html)
-        save_path = get_download_path("pinterest")
-        media_url = None
         if video_url:
-            media_url = video_url
-            ext = ".mp4"
+            m = re.search(r'"thumbnailUrl":"([^"]+)"', html)
+            thumbnail = m.group(1).replace("\\u0026", "&") if m else None
+            media.append(MediaDescriptor(video_url, f"{name}.mp4", "video", resize=True, thumbnail=thumbnail))
+            if thumbnail:
+                media.append(MediaDescriptor(thumbnail, f"{name}_thumbnail.jpg", "thumbnail"))
         else:
-            main_image_patterns = [r'"images":\{"orig":\{"url":"([^"]+)"', r'"url":"(https://i\.pinimg\.com/originals/[^"]+)"']
-            for p in main_image_patterns:
-                m = re.search(p, html)
+            for pattern in IMAGE_PATTERNS:
+                m = re.search(pattern, html)
                 if m:
-                    media_url = m.group(1).replace("\\u0026","&").replace("\\/","/")
+                    media.append(MediaDescriptor(m.group(1).replace("\\u0026", "&").replace("\\/", "/"), f"{name}.jpg", "image", resize=True))
                     break
-            ext = ".jpg"
-        if not media_url:
-            raise Exception("No media found for this Pinterest post")
-        filename = sanitize_filename("pinterest_post") + ext
-        filepath = os.path.join(save_path, filename)
-        download_stream_fast(media_url, filepath, download_id, 10, 80)
-        from ..config import QUALITY_MAP
-        if quality and quality in QUALITY_MAP:
-            smooth_emit_progress(download_id, 85, f"Converting to {quality}...")
-            converted_file = filepath.replace(ext, f"_{quality}{ext}")
-            try:
-                resize_with_ffmpeg(filepath, converted_file, quality)
-                os.remove(filepath)
-                filepath = converted_file
-                filename = os.path.basename(converted_file)
-            except Exception as e:
-                logger.warning(f"Quality conversion failed, keeping original: {e}")
-
-        smooth_emit_progress(download_id, 100, "Completed ✅")
-        download_sessions[download_id].update({
-            "status":"completed","filename":filename,"downloaded_files":[filename],"message":f"Download completed at {quality}!"
-        })
-        emit_status(download_id)
-    except Exception as e:
-        logger.exception("Pinterest download error")
-        download_sessions[download_id] = {"status":"error","message":str(e)}
-        emit_status(download_id)
+        return Resolution(self.media_id(url), title, media, {"title": title})
+
+    def download(self, download_id, url, quality):
+        if extract_board(url):
+            return download_pinterest_board(download_id, url, quality)
+        super().download(download_id, url, quality)
 
-def extract_pinterest_audio(download_id, url):
+# ------------ Boards ------------
+def _pooled_session(pool_size=4):
+    """Session for listing board pages (pin media goes through the adapter's own pool)."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": "Mozilla/5.0", "Referer": "https://www.pinterest.com/"})
+    return session
+
+def _resource(session, name, options, source_url):
+    r = session.get(
+        RESOURCE_URL.format(name=name),
+        params={"source_url": source_url, "data": json.dumps({"options": options, "context": {}})},
+        headers={"Accept": "application/json", "X-Requested-With": "XMLHttpRequest", "X-Pinterest-PWS-Handler": "www/[username]/[slug].js"},
+        timeout=15,
+    )
+    r.raise_for_status()
+    return r.json()["resource_response"]
+
+def iter_board_pages(session, username, slug, bookmark=None, page_size=PINTEREST_BOARD_PAGE_SIZE):
+    """Yield ``(pins, next_bookmark)`` one resource page at a time, starting after ``bookmark``."""
+    source_url = f"/{username}/{slug}/"
+    board = _resource(session, "BoardResource", {"username": username, "slug": slug, "field_set_key": "detailed"}, source_url)
+    board_id = board["data"]["id"]
+    while bookmark != "-end-":
+        options = {"board_id": board_id, "board_url": source_url, "page_size": page_size, "field_set_key": "react_grid_pin"}
+        if bookmark:
+            options["bookmarks"] = [bookmark]
+        page = _resource(session, "BoardFeedResource", options, source_url)
+        pins = [p for p in (page.get("data") or []) if p.get("type", "pin") == "pin" and p.get("id")]
+        bookmark = page.get("bookmark") or "-end-"
+        yield pins, bookmark
+
+def pin_media(pin):
+    """``MediaDescriptor`` for a board pin (progressive video if any, else the original image).
+
+    Board media is kept at its original size, so there is no per-pin re-encoding.
+    """
+    pin_id = pin["id"]
+    videos = ((pin.get("videos") or {}).get("video_list")) or {}
+    for fmt in VIDEO_FORMATS:
+        url = (videos.get(fmt) or {}).get("url")
+        if url and ".mp4" in url:
+            return MediaDescriptor(url, f"pinterest_{pin_id}.mp4", "video")
+    images = pin.get("images") or {}
+    image = images.get("orig") or next(iter(images.values()), None)
+    if image and image.get("url"):
+        ext = os.path.splitext(image["url"].split("?")[0])[1] or ".jpg"
+        return MediaDescriptor(image["url"], f"pinterest_{pin_id}{ext}", "image")
+    return None
+
+def download_pinterest_board(download_id, url, quality='1080p'):
+    """Download every pin of a board, fetching media while later pages are still being listed.
+
+    Each pin goes through the same pipeline as a single pin (``pipeline.produce``
+    on the Pinterest adapter), so pooled connections, metrics and cancellation
+    behave alike; pins already on disk at their original size, from an earlier
+    run or as single pins, come from the output cache. The board cursor, with
+    the files of the pages before it, is saved after each page whose pins are
+    all on disk, so a cancelled or failed run resumes from there and still
+    returns the whole board. Only one run per board at a time.
+    """
+    from ..pipeline import produce, finish
+    from . import get_adapter
     try:
-        headers = {"User-Agent":"Mozilla/5.0","Referer":"https://www.pinterest.com/"}
-        r = requests.get(url, headers=headers, timeout=10)
-        r.raise_for_status()
-        html = r.text
-        video_url = extract_video_url(html)
-        if not video_url:
-            raise Exception("This Pinterest post doesn't contain a video")
-        path = get_download_path("pinterest")
-        filename = sanitize_filename("pinterest_audio.mp3")
-        filepath = os.path.join(path, filename)
-        ffmpeg_path = __import__("..utils", fromlist=["find_ffmpeg"]).find_ffmpeg()
-        if not ffmpeg_path:
-            raise Exception("FFmpeg is required for audio extraction")
-        smooth_emit_progress(download_id, 20, "Extracting audio directly (fast)...")
-        cmd = [ffmpeg_path, "-i", video_url, "-vn", "-acodec", "libmp3lame", "-b:a", "192k", "-y", filepath]
-        subprocess = __import__("subprocess")
-        res = subprocess.run(cmd, capture_output=True, text=True, timeout=180)
-        if res.returncode != 0:
-            raise Exception(f"Audio extraction failed: {res.stderr}")
-        smooth_emit_progress(download_id, 100, "Audio extracted! ✅")
-        download_sessions[download_id].update({"status":"completed","progress":100,"message":"Audio extracted successfully! ✅","filename":filename,"downloaded_files":[filename],"download_url":f"/downloads/pinterest/{filename}"})
-        emit_status(download_id)
+        username, slug = extract_board(url)
+        key = f"pinterest:{username}/{slug}".lower()
+        adapter = get_adapter("pinterest")
+        lock = threading.Lock()
+        counts = {"found": 0, "done": 0, "failed": 0}
+
+        def fetch(pin, media):
+            if download_cancel_flags.get(download_id):
+                return None
+            pin_url = f"https://www.pinterest.com/pin/{pin['id']}/"
+            try:
+                cached = output_cache.lookup(pin_url, ORIGINAL)
+                if cached:
+                    names = cached["files"]
+                else:
+                    resolution = Resolution(pin["id"], pin.get("title") or f"pinterest_{pin['id']}", [media])
+                    name, _ = produce(adapter, resolution, media, quality, download_id, None, None, report=False)
+                    names = [name]
+                    output_cache.record(pin_url, ORIGINAL, "pinterest", names)
+            except Exception:
+                with lock:
+                    counts["failed"] += 1
+                raise
+            with lock:
+                counts["done"] += 1
+                progress = 10 + int(counts["done"] / max(counts["found"], 1) * 85)
+                download_sessions[download_id]["progress"] = max(download_sessions[download_id].get("progress", 0), progress)
+                download_sessions[download_id]["message"] = f"Downloaded {counts['done']}/{counts['found']} pins..."
+            emit_status(download_id)
+            return names
+
+        files = []
+        pages = deque()  # (bookmark after the page, futures) in board order
+        clean = True
+
+        def commit_pages(block):
+            # collect finished pages in order; the cursor stops at the first page with a failure
+            nonlocal clean
+            while pages and (block or all(f.done() for f in pages[0][1])):
+                after, futures = pages.popleft()
+                page_ok = True
+                for f in futures:
+                    try:
+                        names = f.result()
+                    except Exception as e:
+                        logger.warning(f"Pinterest board pin failed: {e}")
+                        names = None
+                    if names:
+                        files.extend(names)
+                    else:
+                        page_ok = False
+                clean = clean and page_ok
+                if clean:
+                    sync_index.update(key, bookmark=after, files=list(files))
+
+        # a second run of the same board would move (and finally clear) this run's cursor
+        with sync_index.exclusive(key), _pooled_session() as session:
+            cursor = sync_index.get(key)
+            bookmark = cursor.get("bookmark")
+            # pins listed before the cursor were fetched by an earlier run
+            folder = get_download_path("pinterest")
+            files.extend(name for name in cursor.get("files", []) if os.path.exists(os.path.join(folder, name)))
+            lost = len(cursor.get("files", [])) - len(files)
+            smooth_emit_progress(download_id, 10, f"Listing board {slug}...")
+            with ThreadPoolExecutor(max_workers=PINTEREST_BOARD_WORKERS) as pool:
+                for pins, after in iter_board_pages(session, username, slug, bookmark):
+                    if download_cancel_flags.get(download_id):
+                        break
+                    futures = []
+                    for pin in pins:
+                        media = pin_media(pin)
+                        if media:
+                            with lock:
+                                counts["found"] += 1
+                            futures.append(pool.submit(fetch, pin, media))
+                    pages.append((after, futures))
+                    commit_pages(block=False)
+                commit_pages(block=True)
+
+            if download_cancel_flags.get(download_id):
+                raise DownloadCancelled()
+            if not files:
+                raise Exception("No pins downloaded from this board")
+            if clean:
+                sync_index.clear(key)
+        message = f"Downloaded {len(files)} pin(s)" + (f", {counts['failed']} failed" if counts["failed"] else "")
+        if lost:
+            message += f", {lost} from an earlier run no longer on disk"
+        finish(adapter, download_id, files, message=message)
     except Exception as e:
-        logger.exception("Pinterest audio extraction error")
-        download_sessions[download_id] = {"status":"error","message":str(e)}
-        emit_status(download_id)
+        logger.exception("Pinterest board download error")
+        fail_session(download_id, e)
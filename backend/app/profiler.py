@@ -0,0 +1,249 @@
+# app/profiler.py
+import os
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from .config import (
+    DOWNLOADS_DIR,
+    PROFILE_JOBS,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_MAX_SECONDS,
+    PROFILE_MAX_ACTIVE,
+    PROFILE_MAX_FILES,
+)
+
+logger = logging.getLogger(__name__)
+
+PROFILES_DIR = os.path.join(DOWNLOADS_DIR, "_profiles")
+MAX_STACK_DEPTH = 128
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+
+def _folded(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _prune(keep):
+    """Delete the oldest profile files so at most ``keep`` remain."""
+    try:
+        paths = [os.path.join(PROFILES_DIR, f) for f in os.listdir(PROFILES_DIR)]
+        paths.sort(key=os.path.getmtime)
+    except OSError:
+        return
+    for path in paths[:max(len(paths) - keep, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _output_path(name, ext):
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    _prune(PROFILE_MAX_FILES - 1)
+    return os.path.join(PROFILES_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{name}.{ext}")
+
+
+class Sampler:
+    """Wall-clock stack sampler over ``sys._current_frames()``.
+
+    Every ``interval`` seconds it records the stack of each selected thread;
+    the result is written in the collapsed ``label;frame;frame count`` format
+    that flamegraph.pl, speedscope and inferno read directly. Nothing is
+    installed in the sampled threads, so the cost is one walk per sample.
+    Sampling ends after ``limit`` seconds even if ``stop`` is not called yet.
+    """
+
+    def __init__(self, name, select, interval=None, limit=PROFILE_MAX_SECONDS):
+        self.name = name
+        self.select = select
+        self.interval = max(float(interval or PROFILE_SAMPLE_INTERVAL), 1.0) / 1000
+        self.limit = limit
+        self.samples = Counter()
+        self.path = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def finished(self):
+        return self._stop.is_set() or (self._thread.ident is not None and not self._thread.is_alive())
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = time.monotonic() + self.limit
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                label = self.select(ident)
+                if label:
+                    self.samples[f"{label};{_folded(frame)}"] += 1
+
+    def stop(self):
+        """Stop sampling and write the collapsed stacks; returns the file path."""
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.path = _output_path(self.name, "folded")
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Profile {self.name}: {sum(self.samples.values())} samples -> {self.path}")
+        return self.path
+
+
+class Profiler:
+    """Opt-in profiling of jobs and time windows, written to ``downloads/_profiles``.
+
+    Threads doing interesting work (download workers, proxy generators) label
+    themselves with ``watch``. A job is profiled when PROFILE_JOBS is set or
+    it was armed through the admin endpoint: ``sample`` attaches a Sampler to
+    the job's worker thread, ``cprofile`` runs cProfile in it. ``window``
+    samples either the labelled threads or every thread (Socket.IO included)
+    for a fixed time. At most PROFILE_MAX_ACTIVE admin requests (windows and
+    armed or running jobs) are live at once; more raise ``ProfilerBusy``.
+    """
+
+    def __init__(self, default_mode=PROFILE_JOBS):
+        self.default_mode = default_mode
+        self._lock = threading.Lock()
+        self._labels = {}
+        self._armed = {}  # {download_id: (mode, expires at)}
+        self._requested = set()
+        self._jobs = {}
+        self._windows = {}
+
+    def label(self, ident):
+        return self._labels.get(ident)
+
+    def _expire(self, now):
+        """Forget armed jobs that never started and job samplers that hit their time limit."""
+        for download_id, (_, expires) in list(self._armed.items()):
+            if expires < now:
+                del self._armed[download_id]
+                self._requested.discard(download_id)
+        for download_id in list(self._requested):
+            sampler = self._jobs.get(download_id)
+            if sampler is not None and sampler.finished:
+                self._requested.discard(download_id)
+
+    def _claim(self, download_id=None):
+        """Count one more admin request against PROFILE_MAX_ACTIVE; call with the lock held."""
+        self._expire(time.monotonic())
+        if download_id in self._requested:
+            return
+        if len(self._requested) + len(self._windows) >= PROFILE_MAX_ACTIVE:
+            raise ProfilerBusy(f"{PROFILE_MAX_ACTIVE} profiles are already running, try again later")
+        if download_id:
+            self._requested.add(download_id)
+
+    def arm(self, download_id, mode="sample"):
+        """Profile ``download_id``: right away if it is running, else when it starts (within PROFILE_MAX_SECONDS)."""
+        with self._lock:
+            self._claim(download_id)
+            ident = next((i for i, label in self._labels.items() if label == f"job:{download_id}"), None)
+            if ident is None or mode != "sample":
+                self._armed[download_id] = (mode, time.monotonic() + PROFILE_MAX_SECONDS)
+                return "armed"
+            if download_id not in self._jobs:
+                self._jobs[download_id] = Sampler(f"job_{download_id}", lambda i: self._labels.get(i) if i == ident else None).start()
+            return "attached"
+
+    @contextmanager
+    def watch(self, label, download_id=None):
+        """Label the current thread for the duration of the block (and profile the job if asked to)."""
+        ident = threading.get_ident()
+        with self._lock:
+            previous = self._labels.get(ident)
+            self._labels[ident] = label
+            armed = self._armed.pop(download_id, None)
+            mode = armed[0] if armed else (self.default_mode if download_id else None)
+        profile = None
+        if mode == "cprofile":
+            profile = cProfile.Profile()
+            profile.enable()
+        elif mode == "sample":
+            with self._lock:
+                self._jobs[download_id] = Sampler(f"job_{download_id}", lambda i: self._labels.get(i) if i == ident else None).start()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                self._dump_cprofile(profile, f"job_{download_id}")
+            with self._lock:
+                if previous is None:
+                    self._labels.pop(ident, None)
+                else:
+                    self._labels[ident] = previous
+                sampler = self._jobs.pop(download_id, None) if download_id else None
+                self._requested.discard(download_id)
+            if sampler:
+                sampler.stop()
+
+    def _dump_cprofile(self, profile, name):
+        path = _output_path(name, "prof")
+        profile.dump_stats(path)
+        with open(path[:-len(".prof")] + ".txt", "w", encoding="utf-8") as f:
+            pstats.Stats(profile, stream=f).sort_stats("cumulative").print_stats(60)
+        logger.info(f"cProfile {name} -> {path}")
+
+    def window(self, seconds, scope="workers", interval=None):
+        """Sample for ``seconds``; ``scope="all"`` includes unlabelled threads. Returns the future file's name."""
+        seconds = max(0.1, min(float(seconds), PROFILE_MAX_SECONDS))
+        if scope == "all":
+            select = lambda ident: self._labels.get(ident) or "thread"
+        else:
+            select = self._labels.get
+        name = f"window_{scope}_{int(time.time() * 1000)}"
+        sampler = Sampler(name, select, interval, limit=seconds)
+        with self._lock:
+            self._claim()
+            self._windows[name] = sampler.start()
+
+        def finish():
+            sampler.stop()
+            with self._lock:
+                self._windows.pop(name, None)
+
+        timer = threading.Timer(seconds, finish)
+        timer.daemon = True
+        timer.start()
+        return name
+
+    def status(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            running = {
+                "labelled_threads": len(self._labels),
+                "armed_jobs": {download_id: mode for download_id, (mode, _) in self._armed.items()},
+                "sampling_jobs": list(self._jobs),
+                "windows": list(self._windows),
+            }
+        files = sorted(os.listdir(PROFILES_DIR)) if os.path.isdir(PROFILES_DIR) else []
+        return dict(running, default_mode=self.default_mode or None, files=files)
+
+
+profiler = Profiler()
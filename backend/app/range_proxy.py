@@ -0,0 +1,193 @@
+# app/range_proxy.py
+import re
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .utils import iter_ranges, ProgressMeter
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1024 * 1024
+# per source; ffmpeg re-reads the moov atom and seeks back and forth in interleaved mp4
+MAX_CACHED_BLOCKS = 32
+HEADERS = {"User-Agent": "Mozilla/5.0", "Referer": "https://www.google.com/"}
+
+
+class _Source:
+    """One remote file exposed to ffmpeg: size, pooled fetches and an LRU of fetched blocks."""
+
+    def __init__(self, url, session, download_id=None, start_progress=20, end_progress=95):
+        self.url = url
+        self.session = session
+        self.download_id = download_id
+        self.start_progress = start_progress
+        self.end_progress = end_progress
+        self.size = None
+        self.ranged = False
+        self.meter = None
+        self.blocks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def probe(self):
+        with self.lock:
+            if self.size is None:
+                with self.session.get(self.url, headers=dict(HEADERS, Range="bytes=0-0"), stream=True, timeout=15) as r:
+                    r.raise_for_status()
+                    self.ranged = r.status_code == 206
+                    m = re.search(r"/(\d+)$", r.headers.get("Content-Range", ""))
+                    self.size = int(m.group(1)) if m else int(r.headers.get("Content-Length", 0))
+                if not self.size:
+                    raise Exception(f"Could not determine size of {self.url}")
+                if self.ranged:
+                    self.meter = ProgressMeter(self.download_id, self.size, self.start_progress, self.end_progress)
+        return self.size
+
+    def block(self, index):
+        with self.lock:
+            data = self.blocks.get(index)
+            if data is not None:
+                self.blocks.move_to_end(index)
+                return data
+            start = index * BLOCK_SIZE
+            stop = min(start + BLOCK_SIZE, self.size)
+            data = b"".join(iter_ranges(self.url, start, stop, self.download_id, self.meter, chunk_size=BLOCK_SIZE, session=self.session))
+            self.blocks[index] = data
+            while len(self.blocks) > MAX_CACHED_BLOCKS:
+                self.blocks.popitem(last=False)
+            return data
+
+    def read(self, start, end):
+        """Yield bytes ``[start, end]`` block by block."""
+        pos = start
+        while pos <= end:
+            index = pos // BLOCK_SIZE
+            data = self.block(index)
+            offset = pos - index * BLOCK_SIZE
+            piece = data[offset:offset + end + 1 - pos]
+            if not piece:
+                break
+            pos += len(piece)
+            yield piece
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _source(self):
+        source = self.server.sources.get(self.path.strip("/"))
+        if source is None:
+            self.send_error(404)
+        return source
+
+    def _range(self, size):
+        m = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if not m:
+            return 0, size - 1, False
+        start = int(m.group(1) or 0)
+        end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+        return start, end, True
+
+    def _headers(self, source):
+        try:
+            size = source.probe()
+        except Exception as e:
+            logger.warning(f"Range proxy probe failed: {e}")
+            self.send_error(502)
+            return None
+        start, end, partial = self._range(size)
+        if start >= size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+        self.send_response(206 if partial else 200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        return start, end
+
+    def do_HEAD(self):
+        source = self._source()
+        if source:
+            self._headers(source)
+
+    def do_GET(self):
+        source = self._source()
+        if not source:
+            return
+        span = self._headers(source)
+        if not span:
+            return
+        try:
+            for piece in source.read(*span):
+                self.wfile.write(piece)
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg dropped this connection to seek elsewhere
+            pass
+        except Exception as e:
+            logger.warning(f"Range proxy read failed: {e}")
+            self.close_connection = True
+
+
+class RangeProxy:
+    """Loopback HTTP server that lets ffmpeg read remote media through our downloader.
+
+    ffmpeg seeks with ``Range`` requests; each one is answered from cached 1 MB
+    blocks fetched over a pooled session with per-request retries, and fetched
+    bytes count towards the job's progress.
+    """
+
+    def __init__(self):
+        self._server = None
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+        self._session.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+
+    def _start(self):
+        with self._lock:
+            if self._server is None:
+                server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+                server.daemon_threads = True
+                server.sources = {}
+                threading.Thread(target=server.serve_forever, name="range-proxy", daemon=True).start()
+                self._server = server
+                logger.info(f"Range proxy listening on 127.0.0.1:{server.server_port}")
+            return self._server
+
+    @contextmanager
+    def serve(self, url, download_id=None, start_progress=20, end_progress=95):
+        """Yield a loopback URL for ``url`` that stays valid for the duration of the block.
+
+        Origins that ignore ``Range`` are handed to ffmpeg directly.
+        """
+        source = _Source(url, self._session, download_id, start_progress, end_progress)
+        source.probe()
+        if not source.ranged:
+            logger.info(f"{url} does not support ranges, ffmpeg will read it directly")
+            yield url
+            return
+        server = self._start()
+        token = uuid.uuid4().hex
+        server.sources[token] = source
+        try:
+            yield f"http://127.0.0.1:{server.server_port}/{token}"
+        finally:
+            server.sources.pop(token, None)
+
+
+range_proxy = RangeProxy()
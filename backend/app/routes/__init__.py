@@ -3,9 +3,13 @@ from .base_routes import base_bp
 from .preview_routes import preview_bp
 from .download_routes import download_bp
 from .audio_routes import audio_bp
+from .admin_routes import admin_bp
+from .job_routes import jobs_bp
 
 def register_routes(app):
     app.register_blueprint(base_bp)
     app.register_blueprint(preview_bp)
     app.register_blueprint(download_bp)
     app.register_blueprint(audio_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(jobs_bp)
@@ -0,0 +1,79 @@
+# app/routes/admin_routes.py
+import hmac
+from functools import wraps
+from flask import Blueprint, request, jsonify
+from ..config import ADMIN_TOKEN
+from ..bandwidth import bandwidth
+from ..job_queue import dispatcher
+from ..profiler import profiler, ProfilerBusy
+
+admin_bp = Blueprint("admin", __name__)
+
+def admin_required(view):
+    """Require ``X-Admin-Token``; the endpoints are closed altogether while ADMIN_TOKEN is unset."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Admin endpoints are disabled (ADMIN_TOKEN is not set)"}), 403
+        token = request.headers.get("X-Admin-Token") or ""
+        if not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@admin_bp.route("/api/admin/bandwidth", methods=["GET", "POST"])
+@admin_required
+def bandwidth_limits():
+    """Read or change bandwidth limits (bytes/second, 0 = unlimited) without a restart.
+
+    Body: ``{"global"?, "platforms"?: {name: rate}, "client_default"?, "clients"?: {sid_or_ip: rate | null}}``.
+    In worker mode the limits are passed on to the workers (see ``QueueDispatcher.share_limits``);
+    the bucket stats returned are the web process's own.
+    """
+    if request.method == "POST":
+        data = request.get_json() or {}
+        try:
+            bandwidth.set_limits(
+                global_rate=data.get("global"),
+                platforms=data.get("platforms"),
+                client_default=data.get("client_default"),
+                clients=data.get("clients"),
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid limit: {e}"}), 400
+        if dispatcher.enabled:
+            dispatcher.share_limits()
+    return jsonify(bandwidth.stats())
+
+@admin_bp.route("/api/admin/profile", methods=["GET", "POST"])
+@admin_required
+def profile():
+    """Profiling status, or start one.
+
+    Body: ``{"seconds", "scope"?: "workers"|"all", "interval_ms"?}`` samples a
+    time window; ``{"download_id", "mode"?: "sample"|"cprofile"}`` profiles one
+    job (attaching now if it is running). Output lands in ``downloads/_profiles``.
+    Samplers stop after PROFILE_MAX_SECONDS; beyond PROFILE_MAX_ACTIVE live
+    requests it answers 429.
+    """
+    if request.method == "POST":
+        data = request.get_json() or {}
+        try:
+            return _start_profile(data)
+        except ProfilerBusy as e:
+            return jsonify({"error": str(e)}), 429
+    return jsonify(profiler.status())
+
+def _start_profile(data):
+    if data.get("download_id"):
+        mode = data.get("mode") or "sample"
+        if mode not in ("sample", "cprofile"):
+            return jsonify({"error": "mode must be sample or cprofile"}), 400
+        return jsonify({"download_id": data["download_id"], "state": profiler.arm(data["download_id"], mode)})
+    if data.get("seconds"):
+        try:
+            name = profiler.window(data["seconds"], data.get("scope") or "workers", data.get("interval_ms"))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid window: {e}"}), 400
+        return jsonify({"window": name}), 202
+    return jsonify({"error": "Provide seconds or download_id"}), 400
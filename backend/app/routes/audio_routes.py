@@ -1,50 +1,57 @@
 # app/routes/audio_routes.py
 from flask import Blueprint, request, jsonify
 import uuid
-from ..config import executor, download_sessions, download_cancel_flags
-from ..utils import emit_status, smooth_emit_progress
-from ..platforms.youtube import extract_youtube_audio
-from ..platforms.instagram import extract_instagram_audio
-from ..platforms.pinterest import extract_pinterest_audio
+from ..config import download_sessions, download_cancel_flags
+from ..audio_ladder import normalize_bitrates
+from ..utils import emit_status, smooth_emit_progress, fail_session, submit_download, client_id, canonicalize_url
+from ..bandwidth import bandwidth
+from ..metrics import track_job
+from ..platforms import get_adapter, platform_names
+from ..cluster import routed
 
 audio_bp = Blueprint("audio", __name__)
 
 @audio_bp.route("/api/download-audio", methods=["POST"])
+@routed(lambda data: canonicalize_url(data.get("url", "")))
 def download_audio_only():
     try:
         data = request.get_json() or {}
         url = data.get("url", "").strip()
         platform = (data.get("platform") or "").lower()
+        # "bitrates": ["320k", "128k"] builds several variants from one decode
+        bitrates = data.get("bitrates") or data.get("bitrate")
 
         if not url:
             return jsonify({"error": "Missing URL"}), 400
-        if platform not in ["youtube", "instagram", "pinterest"]:
+        if platform not in platform_names():
             return jsonify({"error": "Audio extraction not supported for this platform"}), 400
+        # YouTube without a bitrate keeps the source stream as-is
+        try:
+            bitrates = normalize_bitrates(bitrates) if bitrates or platform != "youtube" else None
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
 
         download_id = str(uuid.uuid4())
         download_sessions[download_id] = {
-            "status":"queued", "progress":0, "message":"Extracting audio...", "platform":platform
+            "status":"queued", "progress":0, "message":"Extracting audio...", "platform":platform,
+            "client": client_id(),
         }
         emit_status(download_id)
         download_cancel_flags.pop(download_id, None)
 
-        executor.submit(process_audio_download, download_id, url, platform)
+        submit_download(download_id, process_audio_download, download_id, url, platform, bitrates)
 
         return jsonify({"download_id": download_id}), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def process_audio_download(download_id, url, platform):
+@track_job("audio")
+def process_audio_download(download_id, url, platform, bitrates=None):
     try:
         smooth_emit_progress(download_id, 5, "Preparing audio extraction...")
-        if platform == "youtube":
-            extract_youtube_audio(download_id, url)
-        elif platform == "instagram":
-            extract_instagram_audio(download_id, url)
-        elif platform == "pinterest":
-            extract_pinterest_audio(download_id, url)
-        else:
-            raise Exception("Unsupported platform for audio extraction")
+        get_adapter(platform).extract_audio(download_id, url, bitrates)
     except Exception as e:
-        download_sessions[download_id] = {"status":"error","message":str(e)}
-        emit_status(download_id)
+        fail_session(download_id, e)
+    finally:
+        download_cancel_flags.release(download_id)
+        bandwidth.release(download_id)
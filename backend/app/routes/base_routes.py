@@ -1,24 +1,47 @@
 # app/routes/base_routes.py
 import os
 from flask import Blueprint, jsonify, request, Response
-from ..config import DOWNLOADS_DIR
-from ..utils import get_download_path, serve_file_with_ranges
+from ..config import DOWNLOADS_DIR, download_sessions
+from ..utils import get_download_path, serve_file_with_ranges, client_id
+from ..bandwidth import bandwidth
+from ..profiler import profiler
+from ..cluster import cluster, HOP_HEADER
 
 base_bp = Blueprint("base", __name__)
 
 @base_bp.route("/api/health")
 def health():
+    import sys
     from ..utils import find_ffmpeg
+    from ..platforms import loaded_platforms
+    from ..job_queue import dispatcher
     ffmpeg_available = find_ffmpeg() is not None
+    # a health check must not be what imports instaloader
+    pool = sys.modules.get("app.instaloader_pool")
     return jsonify({
         "status": "ok",
         "timestamp": __import__("datetime").datetime.now().isoformat(),
         "ffmpeg_available": ffmpeg_available,
+        "platforms_loaded": loaded_platforms(),
+        "instaloader_contexts": pool.instaloader_pool.stats() if pool else [],
+        "sessions": download_sessions.stats(),
+        "job_queue": dispatcher.stats() if dispatcher.enabled else None,
+        "cluster": {"node": cluster.node_id, "nodes": sorted(cluster.nodes)} if cluster.enabled else None,
     })
 
+@base_bp.route("/api/metrics")
+def metrics():
+    from ..metrics import render
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
 @base_bp.route("/downloads/<platform>/<path:filename>")
 def serve_platform_file(platform, filename):
     # uses shared util which handles range headers
+    if cluster.enabled and not request.headers.get(HOP_HEADER) and not os.path.exists(os.path.join(DOWNLOADS_DIR, platform, filename)):
+        # per-node storage: the file may have been produced on another node
+        response = cluster.fetch_file(request.full_path)
+        if response is not None:
+            return response
     return serve_file_with_ranges(platform, filename)
 
 @base_bp.route("/api/proxy-image")
@@ -35,10 +58,17 @@ def proxy_image():
         }
         r = requests.get(image_url, headers=headers, timeout=15, stream=True)
         r.raise_for_status()
+        client = client_id()
         def generate():
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    yield chunk
+            flow = f"proxy:{id(r)}"
+            try:
+                with profiler.watch("proxy"):
+                    for chunk in r.iter_content(chunk_size=8192):
+                        if chunk:
+                            bandwidth.throttle(flow, len(chunk), "proxy", client)
+                            yield chunk
+            finally:
+                bandwidth.release(flow)
         return Response(generate(), content_type=r.headers.get("Content-Type", "image/jpeg"), headers={
             "Cache-Control": "public, max-age=31536000",
             "Access-Control-Allow-Origin": "*",
@@ -62,10 +92,17 @@ def proxy_video():
             proxy_headers["Range"] = range_header
         r = requests.get(video_url, headers=proxy_headers, timeout=20, stream=True, allow_redirects=True)
         r.raise_for_status()
+        client = client_id()
         def generate():
-            for chunk in r.iter_content(chunk_size=1024*64):
-                if chunk:
-                    yield chunk
+            flow = f"proxy:{id(r)}"
+            try:
+                with profiler.watch("proxy"):
+                    for chunk in r.iter_content(chunk_size=1024*64):
+                        if chunk:
+                            bandwidth.throttle(flow, len(chunk), "proxy", client)
+                            yield chunk
+            finally:
+                bandwidth.release(flow)
         client_response = Response(generate(), status=r.status_code, content_type=r.headers.get("Content-Type", "video/mp4"))
         for header in ["Content-Type", "Content-Length", "Content-Range", "Accept-Ranges"]:
             if header in r.headers:
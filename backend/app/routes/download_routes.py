@@ -1,11 +1,17 @@
 # app/routes/download_routes.py
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context
+import os
 import uuid
-from ..config import executor, download_sessions, download_cancel_flags
-from ..utils import emit_status, smooth_emit_progress, get_download_path
-from ..platforms.youtube import download_youtube
-from ..platforms.instagram import download_instagram
-from ..platforms.pinterest import download_pinterest
+from ..config import download_sessions, download_cancel_flags, BATCH_MAX_URLS, BATCH_MAX_FAN_OUT
+from ..utils import emit_status, smooth_emit_progress, get_download_path, sanitize_filename, detect_platform, fail_session, submit_download, client_id, canonicalize_url
+from ..batch_jobs import start_batch, start_stream_batch, batch_files, iter_zip
+from ..output_cache import output_cache, session_files
+from ..bandwidth import bandwidth
+from ..metrics import track_job
+from ..tracing import tracer
+from ..platforms import get_adapter, load_platform
+from ..pipeline import output_name
+from ..cluster import routed, follows_job
 import zipfile
 from io import BytesIO
 from datetime import datetime
@@ -13,6 +19,7 @@ from datetime import datetime
 download_bp = Blueprint("download", __name__)
 
 @download_bp.route("/api/download", methods=["POST"])
+@routed(lambda data: canonicalize_url(data.get("url", "")))
 def start_download():
     try:
         data = request.get_json() or {}
@@ -40,32 +47,136 @@ def start_download():
             "message": "Initializing download...",
             "platform": platform,
             "quality": quality,
+            "client": client_id(),
             "created_at": datetime.now().isoformat()
         }
         emit_status(download_id)
         download_cancel_flags.pop(download_id, None)
 
         # submit background task
-        executor.submit(process_download, download_id, url, platform, quality)
+        submit_download(download_id, process_download, download_id, url, platform, quality)
 
         return jsonify({"download_id": download_id}), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _first_url(data):
+    """Cluster routing key of a batch: its first URL."""
+    first = (data.get("items") or [{"url": u} for u in (data.get("urls") or [])] or [{}])[0]
+    return canonicalize_url(first.get("url", "") if isinstance(first, dict) else "")
+
+@track_job("video")
 def process_download(download_id, url, platform, quality):
     try:
         smooth_emit_progress(download_id, 5, f"Preparing download at {quality}...")
-        if platform == "youtube":
-            download_youtube(download_id, url, quality)
-        elif platform == "instagram":
-            download_instagram(download_id, url, quality)
-        elif platform == "pinterest":
-            download_pinterest(download_id, url, quality)
-        else:
-            raise Exception("Unsupported platform")
+        get_adapter(platform).download(download_id, url, quality)
+        session = download_sessions.get(download_id) or {}
+        if session.get("status") == "completed":
+            with tracer.span(download_id, "finalize"):
+                output_cache.record(url, quality, platform, session_files(session))
     except Exception as e:
-        download_sessions[download_id] = {"status":"error","message": str(e)}
-        emit_status(download_id)
+        fail_session(download_id, e)
+    finally:
+        download_cancel_flags.release(download_id)
+        bandwidth.release(download_id)
+
+@download_bp.route("/api/download/batch", methods=["POST"])
+@routed(lambda data: _first_url(data))
+def start_batch_download():
+    """Submit many URLs as one job.
+
+    Body: ``{"urls": [...]}`` or ``{"items": [{"url", "platform"?, "quality"?}]}``,
+    plus optional ``quality``, ``fan_out`` and ``zip``. Progress for the whole
+    batch is emitted to the returned ``batch_id`` room.
+    """
+    try:
+        data = request.get_json() or {}
+        items = data.get("items") or [{"url": u} for u in (data.get("urls") or [])]
+        items = [dict(i, url=i.get("url", "").strip()) for i in items if isinstance(i, dict) and i.get("url", "").strip()]
+        if not items:
+            return jsonify({"error": "No URLs provided"}), 400
+        if len(items) > BATCH_MAX_URLS:
+            return jsonify({"error": f"Too many URLs (max {BATCH_MAX_URLS})"}), 400
+        unsupported = [i["url"] for i in items if not (i.get("platform") or detect_platform(i["url"]))]
+        if unsupported:
+            return jsonify({"error": "Unsupported platform", "urls": unsupported}), 400
+
+        quality = (data.get("quality") or "1080p").lower()
+        fan_out = max(1, min(int(data.get("fan_out") or 3), BATCH_MAX_FAN_OUT))
+        batch_id = start_batch(items, process_download, quality, fan_out, bool(data.get("zip")), client=client_id())
+        session = download_sessions[batch_id]
+        return jsonify({"batch_id": batch_id, "download_id": batch_id, "children": session["children"], "items": session["items"]}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@download_bp.route("/api/download/playlist", methods=["POST"])
+@routed(lambda data: data.get("url", "").strip())
+def start_playlist_download():
+    """Download every video of a YouTube playlist or channel as one batch.
+
+    Body: ``{"url", "quality"?, "fan_out"?, "zip"?, "limit"?}``. Videos are
+    enumerated lazily while earlier ones download; videos already on disk at
+    the same quality are attached as completed without re-downloading.
+    """
+    try:
+        data = request.get_json() or {}
+        url = data.get("url", "").strip()
+        if not url:
+            return jsonify({"error": "Missing URL"}), 400
+        youtube = load_platform("youtube")
+        if not youtube.is_youtube_collection(url):
+            return jsonify({"error": "Not a YouTube playlist or channel URL"}), 400
+
+        quality = (data.get("quality") or "1080p").lower()
+        fan_out = max(1, min(int(data.get("fan_out") or 3), BATCH_MAX_FAN_OUT))
+        limit = int(data["limit"]) if data.get("limit") else None
+        source = youtube.iter_youtube_collection(url, quality, limit)
+        batch_id = start_stream_batch(source, process_download, fan_out, bool(data.get("zip")), source_url=url, client=client_id())
+        return jsonify({"batch_id": batch_id, "download_id": batch_id}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@download_bp.route("/api/download/profile", methods=["POST"])
+@routed(lambda data: (data.get("username") or data.get("url") or "").strip().lower())
+def start_profile_download():
+    """Download an Instagram profile's posts as one batch, incrementally.
+
+    Body: ``{"url" | "username", "quality"?, "fan_out"?, "zip"?, "limit"?, "full"?}``.
+    Only posts newer than the last successful sync are fetched unless ``full`` is set.
+    """
+    try:
+        data = request.get_json() or {}
+        instagram = load_platform("instagram")
+        username = instagram.extract_profile_username(data.get("username") or data.get("url") or "")
+        if not username:
+            return jsonify({"error": "Missing or invalid Instagram profile"}), 400
+
+        quality = (data.get("quality") or "1080p").lower()
+        fan_out = max(1, min(int(data.get("fan_out") or 3), BATCH_MAX_FAN_OUT))
+        limit = int(data["limit"]) if data.get("limit") else None
+        sync = instagram.ProfileSync(username, quality, full=bool(data.get("full")), limit=limit)
+        batch_id = start_stream_batch(
+            iter(sync), process_download, fan_out, bool(data.get("zip")),
+            on_done=sync.commit, source_url=f"https://www.instagram.com/{username}/", since=sync.since, client=client_id(),
+        )
+        return jsonify({"batch_id": batch_id, "download_id": batch_id, "since": sync.since}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@download_bp.route("/api/download/batch/<batch_id>/zip")
+@follows_job
+def download_batch_zip(batch_id):
+    session = download_sessions.get(batch_id)
+    if not session or session.get("type") != "batch":
+        return jsonify({"error": "Unknown batch"}), 404
+    files = batch_files(batch_id)
+    if not files:
+        return jsonify({"error": "No completed files in this batch yet"}), 404
+    return Response(
+        stream_with_context(iter_zip(files)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="batch_{batch_id[:8]}.zip"'},
+    )
 
 @download_bp.route("/api/download-zip")
 def download_zip():
@@ -89,8 +200,7 @@ def download_zip():
 @download_bp.route("/api/download-with-metadata", methods=["POST"])
 def download_with_metadata():
     # This endpoint is heavy — creates an in-memory ZIP containing metadata and media.
-    # We kept the original idea but simplified code to avoid duplication: platform-specific logic below
-    from .preview_routes import extract_video_url  # reuse helper
+    # The platform adapter resolves metadata & media URLs; media is fetched over its pooled session
     import json
     data = request.get_json() or {}
     url = data.get("url", "").strip()
@@ -99,39 +209,8 @@ def download_with_metadata():
         return jsonify({"error":"Missing URL or platform"}), 400
 
     try:
-        # Use platform modules to collect metadata & media URLs
-        media_urls = []
-        metadata = {"platform": platform, "post_url": url}
-        # For brevity we re-run preview logic (could be refactored to shared function)
-        if platform == "youtube":
-            from pytubefix import YouTube
-            yt = YouTube(url)
-            metadata.update({
-                "title": yt.title,
-                "description": yt.description or "No description available",
-                "author": yt.author,
-                "duration": f"{yt.length // 60}:{yt.length % 60:02d}",
-                "thumbnail_url": yt.thumbnail_url
-            })
-            progressive = yt.streams.filter(progressive=True, file_extension="mp4").order_by("resolution").desc().first()
-            if progressive:
-                media_urls.append({"url": progressive.url, "filename": sanitize_filename(yt.title)+".mp4"})
-            else:
-                best_video = yt.streams.filter(file_extension="mp4", only_video=True).order_by("resolution").desc().first()
-                best_audio = yt.streams.filter(only_audio=True).order_by("abr").desc().first()
-                if best_video:
-                    media_urls.append({"url": best_video.url, "filename": sanitize_filename(yt.title)+"_video.mp4"})
-                if best_audio:
-                    media_urls.append({"url": best_audio.url, "filename": sanitize_filename(yt.title)+"_audio.mp4"})
-        elif platform == "instagram":
-            # use instagram platform module to build metadata
-            from ..platforms.instagram import gather_instagram_metadata
-            metadata, media_urls = gather_instagram_metadata(url)
-        elif platform == "pinterest":
-            from ..platforms.pinterest import gather_pinterest_metadata
-            metadata, media_urls = gather_pinterest_metadata(url)
-        else:
-            return jsonify({"error":"Unsupported platform"}), 400
+        adapter = get_adapter(platform)
+        metadata, media_urls = adapter.export(url)
 
         # Build zip stream
         zip_buffer = BytesIO()
@@ -140,13 +219,12 @@ def download_with_metadata():
             zf.writestr("metadata.json", json.dumps(metadata, indent=2, ensure_ascii=False))
             zf.writestr("README.txt", f"{platform.upper()} download\nURL: {url}\nTitle: {metadata.get('title','N/A')}\n")
             # Download media content into zip
-            import requests
             for mi in media_urls:
                 try:
-                    r = requests.get(mi["url"], headers={"User-Agent":"Mozilla/5.0"}, timeout=60, stream=True)
+                    r = adapter.session().get(mi["url"], timeout=60, stream=True)
                     r.raise_for_status()
                     content = r.content
-                    zf.writestr(mi.get("filename", f"file_{uuid.uuid4().hex}"), content)
+                    zf.writestr(output_name(mi.get("filename") or f"file_{uuid.uuid4().hex}"), content)
                 except Exception as e:
                     zf.writestr(f"ERROR_{mi.get('filename','unknown')}.txt", f"Failed to fetch {mi.get('url')}\nError: {e}")
         zip_buffer.seek(0)
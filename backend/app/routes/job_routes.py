@@ -0,0 +1,102 @@
+# app/routes/job_routes.py
+import json
+import time
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from ..config import JOB_EVENTS_MIN_INTERVAL, JOB_EVENTS_KEEPALIVE, JOB_LONGPOLL_MAX_WAIT
+from ..tracing import tracer
+from ..cluster import follows_job
+from ..update_bus import update_bus
+
+jobs_bp = Blueprint("jobs", __name__)
+
+@jobs_bp.route("/api/jobs/<download_id>")
+@follows_job
+def job_status(download_id):
+    """The job's current ``{download_id, session}`` with an ETag.
+
+    Long polling: with ``If-None-Match`` set to the last ETag the request
+    waits up to ``?wait=`` seconds (default and cap JOB_LONGPOLL_MAX_WAIT)
+    for the next update and answers 304 if none came.
+    """
+    update = update_bus.current(download_id)
+    if update is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if_none_match = (request.headers.get("If-None-Match") or "").strip('W/"')
+    if if_none_match == update.etag:
+        try:
+            wait = min(float(request.args.get("wait", JOB_LONGPOLL_MAX_WAIT)), JOB_LONGPOLL_MAX_WAIT)
+        except ValueError:
+            wait = JOB_LONGPOLL_MAX_WAIT
+        deadline = time.monotonic() + wait
+        while update and update.etag == if_none_match and not update.terminal and time.monotonic() < deadline:
+            update = update_bus.wait(download_id, update.version, deadline - time.monotonic())
+        if update is None:
+            return jsonify({"error": "Unknown job"}), 404
+    headers = {"ETag": f'"{update.etag}"', "Cache-Control": "no-cache"}
+    if if_none_match == update.etag:
+        return Response(status=304, headers=headers)
+    return Response(update.body, mimetype="application/json", headers=headers)
+
+@jobs_bp.route("/api/jobs/<download_id>/events")
+@follows_job
+def job_events(download_id):
+    """Server-Sent Events: an ``update`` event per change of the job (coalesced), closed once it finishes.
+
+    Event ids are the same ETags as ``/api/jobs/<id>``; a reconnect with
+    ``Last-Event-ID`` skips the snapshot the client already has.
+    """
+    update = update_bus.current(download_id)
+    if update is None:
+        return jsonify({"error": "Unknown job"}), 404
+    last_seen = request.headers.get("Last-Event-ID")
+
+    def events():
+        nonlocal update
+        sent = last_seen
+        yield "retry: 3000\n\n"
+        while True:
+            if update.etag != sent:
+                yield f"id: {update.etag}\nevent: update\ndata: {update.body}\n\n"
+                sent = update.etag
+            if update.terminal:
+                return
+            version = update.version
+            time.sleep(JOB_EVENTS_MIN_INTERVAL)  # updates in between are coalesced into the next one
+            update = update_bus.wait(download_id, version, JOB_EVENTS_KEEPALIVE)
+            if update is None:
+                return
+            if update.version == version:
+                yield ": keepalive\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@jobs_bp.route("/api/jobs/<download_id>/trace")
+@follows_job
+def job_trace(download_id):
+    """Span timeline of a recent job.
+
+    ``?format=chrome`` returns Trace Event JSON (chrome://tracing, Perfetto),
+    ``?format=otlp`` an OTLP/JSON export body; add ``download=1`` to save it as a file.
+    """
+    fmt = (request.args.get("format") or "json").lower()
+    if fmt == "chrome":
+        body = tracer.chrome_trace(download_id)
+    elif fmt == "otlp":
+        body = tracer.otlp(download_id)
+    elif fmt == "json":
+        body = tracer.get(download_id)
+    else:
+        return jsonify({"error": "Unknown format"}), 400
+    if body is None:
+        return jsonify({"error": "No trace for this job"}), 404
+    if request.args.get("download"):
+        return Response(
+            json.dumps(body),
+            mimetype="application/json",
+            headers={"Content-Disposition": f'attachment; filename="trace_{download_id}_{fmt}.json"'},
+        )
+    return jsonify(body)
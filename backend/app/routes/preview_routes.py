@@ -1,215 +1,142 @@
 # app/routes/preview_routes.py
-from flask import Blueprint, request, jsonify
-from pytubefix import YouTube
-import requests
-import re
-import instaloader
-from ..config import QUALITY_MAP
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from ..config import PREVIEW_BATCH_MAX_URLS, PREVIEW_PLATFORM_CONCURRENCY
+from ..metadata_cache import preview_cache
+from ..platforms import get_adapter
+from ..utils import detect_platform, canonicalize_url
 
 preview_bp = Blueprint("preview", __name__)
 
-def extract_shortcode(url):
-    m = re.search(r"/(?:p|reel|reels)/([A-Za-z0-9_-]+)", url)
-    return m.group(1) if m else None
-
-def extract_video_url(html):
-    patterns = [
-        r'"video_url":"(https:[^"]+mp4[^"]*)"',
-        r'"contentUrl":"(https:[^"]+mp4[^"]*)"',
-        r'"url":"(https:[^"]+\.mp4[^"]*)"',
-    ]
-    for pattern in patterns:
-        m = re.search(pattern, html)
-        if m:
-            return m.group(1).replace("\\u0026", "&").replace("\\/", "/").replace("\\", "")
-    return None
+platform_slots = {p: threading.BoundedSemaphore(n) for p, n in PREVIEW_PLATFORM_CONCURRENCY.items()}
+SLOT_POLL_INTERVAL = 0.05  # seconds
 
 @preview_bp.route("/api/preview", methods=["POST"])
 def preview():
+    data = request.get_json() or {}
+    url = data.get("url", "").strip()
+    if not url:
+        return jsonify({"error": "URL required"}), 400
+    payload, status = cached_preview(url)
+    return jsonify(payload), status
+
+def build_preview(url):
+    """Resolve preview data for one URL; returns ``(payload, http_status)``."""
     try:
-        data = request.get_json() or {}
-        url = data.get("url", "").strip()
-        if not url:
-            return jsonify({"error": "URL required"}), 400
-
-        if "youtu" in url:
-            platform = "youtube"
-        elif "instagram.com" in url:
-            platform = "instagram"
-        elif "pinterest.com" in url:
-            platform = "pinterest"
-        else:
-            return jsonify({"error": "Unsupported URL"}), 400
-
-        all_qualities = list(QUALITY_MAP.keys())
-
-        if platform == "youtube":
-            yt = YouTube(url)
-            progressive_stream = yt.streams.filter(progressive=True, file_extension="mp4").order_by("resolution").desc().first()
-            if progressive_stream:
-                best_video = progressive_stream
-                best_audio = None
-            else:
-                best_video = yt.streams.filter(file_extension="mp4", only_video=True).order_by("resolution").desc().first()
-                best_audio = yt.streams.filter(only_audio=True).order_by("abr").desc().first()
-            return jsonify({
-                "platform": "youtube",
-                "title": yt.title,
-                "thumbnail": yt.thumbnail_url,
-                "video_url": progressive_stream.url if progressive_stream else best_video.url,
-                "audio_url": None if progressive_stream else (best_audio.url if best_audio else None),
-                "available_qualities": all_qualities,
-                "duration": yt.length,
-                "author": yt.author,
-                "ux_tip": "🎥 All quality options available with FFmpeg conversion",
-            })
-
-        if platform == "instagram":
-            shortcode = extract_shortcode(url)
-            if not shortcode:
-                return jsonify({"error": "Invalid Instagram link"}), 400
-
-            media_items = []
-            title = "Instagram Post"
-            author = None
+        platform = detect_platform(url)
+        if not platform:
+            return {"error": "Unsupported URL"}, 400
 
-            try:
-                L = instaloader.Instaloader(download_pictures=False, download_videos=False, quiet=True,
-                                            user_agent="Mozilla/5.0")
-                post = instaloader.Post.from_shortcode(L.context, shortcode)
-
-                if hasattr(post, "caption") and post.caption:
-                    caption = str(post.caption).strip()
-                    title = caption[:100] + ("..." if len(caption) > 100 else "")
-
-                if hasattr(post, "owner_username"):
-                    author = post.owner_username
-
-                nodes = []
-                try:
-                    if hasattr(post, "get_sidecar_nodes"):
-                        sidecar = post.get_sidecar_nodes
-                        nodes = list(sidecar()) if callable(sidecar) else list(sidecar)
-                except:
-                    pass
-
-                if nodes:
-                    for node in nodes:
-                        is_video = getattr(node, "is_video", False)
-                        if is_video:
-                            video_url = getattr(node, "video_url", None)
-                            thumbnail = getattr(node, "display_url", None)
-                            if video_url:
-                                media_items.append({"type":"video","url":str(video_url).replace("\\u0026","&"),"thumbnail":thumbnail})
-                        else:
-                            img_url = getattr(node, "display_url", None)
-                            if img_url:
-                                media_items.append({"type":"image","url":str(img_url).replace("\\u0026","&")})
-                else:
-                    if getattr(post, "is_video", False):
-                        media_items.append({"type":"video","url":str(post.video_url).replace("\\u0026","&"),"thumbnail":str(post.url)})
-                    else:
-                        media_items.append({"type":"image","url":str(post.url).replace("\\u0026","&")})
+        # the adapter (and its platform library) is imported on first use
+        return get_adapter(platform).preview(url)
+    except Exception as ex:
+        return {"error": f"Preview failed: {str(ex)}"}, 500
 
-            except Exception as e:
-                # fallback to scraping
-                pass
+def cached_preview(url):
+    """``build_preview`` behind the metadata cache; only successful previews are cached."""
+    return preview_cache.get_or_load(
+        canonicalize_url(url),
+        lambda: build_preview(url),
+        cacheable=lambda result: result[1] == 200,
+    )
 
-            if not media_items:
+def _preview_in_slot(slot, url):
+    try:
+        return cached_preview(url)
+    finally:
+        slot.release()
+
+def iter_batch_previews(urls):
+    """Yield one result dict per input URL, in completion order.
+
+    Links that canonicalize to the same post are resolved once and fanned out
+    to every position they appeared at. A lookup is only handed to the shared
+    executor once its platform has a free slot, so a burst of one platform's
+    URLs waits here instead of holding executor threads the others need.
+    """
+    from ..config import preview_executor
+
+    positions = {}
+    for i, url in enumerate(urls):
+        positions.setdefault(canonicalize_url(url), []).append(i)
+    waiting = {}
+    for canonical, idxs in positions.items():
+        waiting.setdefault(detect_platform(urls[idxs[0]]), deque()).append(canonical)
+
+    futures = {}
+    while waiting or futures:
+        for platform in list(waiting):
+            queue, slot = waiting[platform], platform_slots.get(platform)
+            while queue and (slot is None or slot.acquire(blocking=False)):
+                canonical = queue.popleft()
+                url = urls[positions[canonical][0]]
                 try:
-                    headers = {"User-Agent":"Mozilla/5.0","Accept":"text/html,application/xhtml+xml","Accept-Language":"en-US,en;q=0.9"}
-                    embed_url = f"https://www.instagram.com/p/{shortcode}/embed/captioned/"
-                    r = requests.get(embed_url, headers=headers, timeout=15)
-                    if r.status_code == 200:
-                        html = r.text
-                        # title
-                        caption_patterns = [r'"caption":"([^"]{1,200})', r'"edge_media_to_caption".*?"text":"([^"]{1,200})', r'<meta property="og:description" content="([^"]{1,200})']
-                        for pattern in caption_patterns:
-                            match = re.search(pattern, html)
-                            if match:
-                                caption = match.group(1).strip()
-                                if caption and caption not in ["Instagram","Instagram Post"]:
-                                    title = caption[:100] + ("..." if len(caption) > 100 else "")
-                                    break
-                        # author
-                        username_patterns = [r'"username":"([^"]+)"', r'"owner":\{"username":"([^"]+)"']
-                        for pattern in username_patterns:
-                            match = re.search(pattern, html)
-                            if match:
-                                author = match.group(1)
-                                break
-                        # video
-                        video_patterns = [r'"video_url":"(https://[^"]+)"', r'"video_url":\s*"(https://[^"]+)"']
-                        for pattern in video_patterns:
-                            match = re.search(pattern, html)
-                            if match:
-                                video_url = match.group(1).replace("\\u0026","&").replace("\\/","/")
-                                media_items.append({"type":"video","url":video_url,"thumbnail":None})
-                                break
-                        if not media_items:
-                            img_patterns = [r'"display_url":"(https://[^"]+)"', r'"thumbnail_src":"(https://[^"]+)"']
-                            for pattern in img_patterns:
-                                matches = re.findall(pattern, html)
-                                for img_url in matches[:5]:
-                                    clean_url = img_url.replace("\\u0026","&").replace("\\/","/")
-                                    if clean_url not in [m["url"] for m in media_items]:
-                                        media_items.append({"type":"image","url":clean_url})
+                    future = preview_executor.submit(cached_preview, url) if slot is None else preview_executor.submit(_preview_in_slot, slot, url)
                 except Exception:
-                    pass
-
-            if not media_items:
-                return jsonify({"error":"No media found. The post might be private or unavailable."}), 404
-
-            return jsonify({
-                "platform":"instagram",
-                "title": title,
-                "author": f"@{author}" if author else None,
-                "media": media_items,
-                "thumbnail": media_items[0].get("thumbnail") or media_items[0]["url"],
-                "available_qualities": all_qualities,
-                "ux_tip": "📱 Instagram Post • All qualities available with conversion"
-            })
-
-        if platform == "pinterest":
+                    if slot is not None:
+                        slot.release()
+                    raise
+                futures[future] = canonical
+            if not queue:
+                del waiting[platform]
+        if not futures:
+            time.sleep(SLOT_POLL_INTERVAL)  # every slot we need is held by other requests
+            continue
+        # slots are shared with other requests, so look again now and then even if none of ours finished
+        done, _ = wait(futures, timeout=SLOT_POLL_INTERVAL if waiting else None, return_when=FIRST_COMPLETED)
+        for future in done:
+            canonical = futures.pop(future)
             try:
-                headers = {"User-Agent":"Mozilla/5.0","Referer":"https://www.pinterest.com/"}
-                r = requests.get(url, headers=headers, timeout=15)
-                r.raise_for_status()
-                html = r.text
-                media_items = []
-                video_url = extract_video_url(html)
-                if video_url:
-                    thumbnail_match = re.search(r'"thumbnailUrl":"([^"]+)"', html)
-                    thumbnail = thumbnail_match.group(1).replace("\\u0026","&") if thumbnail_match else ""
-                    media_items.append({"type":"video","url":video_url.replace("\\u0026","&"),"thumbnail":thumbnail})
-                else:
-                    main_image_patterns = [r'"images":\{"orig":\{"url":"([^"]+)"', r'"url":"(https://i\.pinimg\.com/originals/[^"]+)"']
-                    for pattern in main_image_patterns:
-                        match = re.search(pattern, html)
-                        if match:
-                            img_url = match.group(1).replace("\\u0026","&").replace("\\/","/")
-                            media_items.append({"type":"image","url":img_url})
-                            break
-                title_patterns = [r'"title":"([^"]{1,200})', r'"description":"([^"]{1,200})']
-                title = "Pinterest Post"
-                for pattern in title_patterns:
-                    m = re.search(pattern, html)
-                    if m:
-                        title = m.group(1).strip()
-                        if title and title != "Pinterest":
-                            break
-                if not media_items:
-                    raise Exception("No media found")
-                return jsonify({
-                    "platform":"pinterest",
-                    "title": title,
-                    "media": media_items,
-                    "thumbnail": media_items[0].get("thumbnail") or media_items[0]["url"],
-                    "available_qualities": all_qualities,
-                    "ux_tip": "📌 Pinterest • All qualities available with conversion",
-                })
+                payload, status = future.result()
             except Exception as e:
-                return jsonify({"error": f"Pinterest preview failed: {str(e)}"}), 500
-
-    except Exception as ex:
-        return jsonify({"error": f"Preview failed: {str(ex)}"}), 500
+                payload, status = {"error": f"Preview failed: {e}"}, 500
+            for i in positions[canonical]:
+                yield {"index": i, "url": urls[i], "canonical_url": canonical, "status": status, "data": payload}
+
+def _parse_batch_urls(data):
+    urls = data.get("urls") or []
+    if isinstance(urls, str):
+        urls = urls.splitlines()
+    if data.get("text"):
+        urls = list(urls) + data["text"].splitlines()
+    return [u.strip() for u in urls if isinstance(u, str) and u.strip()]
+
+@preview_bp.route("/api/preview/batch", methods=["POST"])
+def preview_batch():
+    """Preview many URLs at once.
+
+    Body: ``{"urls": [...]}`` (or ``"text"`` with one URL per line).
+    Default response is NDJSON, one line per URL as soon as it resolves.
+    With ``"mode": "socket"`` the results are emitted as ``preview_result``
+    events to the ``batch_id`` room instead (pass your own ``batch_id`` and
+    join it first to avoid missing early results).
+    """
+    data = request.get_json() or {}
+    urls = _parse_batch_urls(data)
+    if not urls:
+        return jsonify({"error": "No URLs provided"}), 400
+    if len(urls) > PREVIEW_BATCH_MAX_URLS:
+        return jsonify({"error": f"Too many URLs (max {PREVIEW_BATCH_MAX_URLS})"}), 400
+
+    if data.get("mode") == "socket":
+        from app import socketio
+        batch_id = data.get("batch_id") or str(uuid.uuid4())
+
+        def run():
+            for result in iter_batch_previews(urls):
+                socketio.emit("preview_result", dict(result, batch_id=batch_id), room=batch_id)
+            socketio.emit("preview_batch_done", {"batch_id": batch_id, "count": len(urls)}, room=batch_id)
+
+        socketio.start_background_task(run)
+        return jsonify({"batch_id": batch_id, "count": len(urls)}), 202
+
+    def generate():
+        for result in iter_batch_previews(urls):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
@@ -0,0 +1,235 @@
+# app/tracing.py
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TRACE_MAX_JOBS = int(os.environ.get("TRACE_MAX_JOBS", "500"))
+TRACE_MAX_SPANS = int(os.environ.get("TRACE_MAX_SPANS", "512"))
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "thread", "attrs", "error")
+
+    def __init__(self, trace, span_id, parent_id, name, start, attrs):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.end = None
+        self.thread = threading.get_ident()
+        self.attrs = attrs
+        self.error = None
+
+    def as_dict(self):
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "duration": (self.end - self.start) if self.end else None,
+            "thread": self.thread,
+            "attrs": dict(self.attrs),
+            "error": self.error,
+        }
+
+
+class _Trace:
+    def __init__(self, download_id):
+        self.trace_id = os.urandom(16).hex()
+        self.download_id = download_id
+        self.spans = []
+        self.open = []
+        self.dropped = 0
+        self._next = 0
+
+    def new_id(self):
+        self._next += 1
+        return f"{self._next:016x}"
+
+
+class Tracer:
+    """Per-job span timelines kept in memory for the last TRACE_MAX_JOBS jobs.
+
+    A span's parent is the innermost span this thread has open for the same
+    job, else the job's oldest open span, so work fanned out to pool threads
+    still hangs off the job. ``annotate``/``incr`` land on the span the
+    calling thread has open, or the job's newest open span.
+    """
+
+    def __init__(self, max_jobs=TRACE_MAX_JOBS, max_spans=TRACE_MAX_SPANS):
+        self.max_jobs = max_jobs
+        self.max_spans = max_spans
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _trace(self, download_id, create=True):
+        trace = self._traces.get(download_id)
+        if trace is None and create:
+            trace = self._traces[download_id] = _Trace(download_id)
+            while len(self._traces) > self.max_jobs:
+                self._traces.popitem(last=False)
+        return trace
+
+    def begin(self, download_id):
+        """Start a fresh timeline for ``download_id`` (a re-run replaces the previous one)."""
+        with self._lock:
+            self._traces.pop(download_id, None)
+            self._trace(download_id)
+
+    def _current(self, trace):
+        for entry in reversed(self._stack()):
+            if entry[0] is trace:
+                return entry[1]
+        return None
+
+    def start(self, download_id, name, start=None, **attrs):
+        if not download_id:
+            return None
+        with self._lock:
+            trace = self._trace(download_id)
+            if len(trace.spans) >= self.max_spans:
+                trace.dropped += 1
+                return None
+            parent = self._current(trace) or (trace.open[0] if trace.open else None)
+            span = Span(trace, trace.new_id(), parent.span_id if parent else None, name, start or time.time(), attrs)
+            trace.spans.append(span)
+            trace.open.append(span)
+        self._stack().append((trace, span))
+        return span
+
+    def finish(self, span, error=None):
+        if span is None:
+            return
+        span.end = time.time()
+        if error is not None:
+            span.error = str(error) or type(error).__name__
+        stack = self._stack()
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i][1] is span:
+                del stack[i]
+                break
+        with self._lock:
+            if span in span.trace.open:
+                span.trace.open.remove(span)
+
+    @contextmanager
+    def span(self, download_id, name, start=None, **attrs):
+        span = self.start(download_id, name, start, **attrs)
+        try:
+            yield span
+        except BaseException as e:
+            self.finish(span, e)
+            raise
+        else:
+            self.finish(span)
+
+    def record(self, download_id, name, start, end, **attrs):
+        """Add an already-finished span (e.g. time spent queued)."""
+        span = self.start(download_id, name, start, **attrs)
+        self.finish(span)
+        if span is not None:
+            span.end = end
+
+    def _target(self, download_id):
+        with self._lock:
+            trace = self._trace(download_id, create=False)
+            if trace is None:
+                return None
+            return self._current(trace) or (trace.open[-1] if trace.open else None)
+
+    def annotate(self, download_id, **attrs):
+        span = self._target(download_id) if download_id else None
+        if span is not None:
+            span.attrs.update(attrs)
+
+    def incr(self, download_id, key, amount=1):
+        span = self._target(download_id) if download_id else None
+        if span is not None:
+            with self._lock:
+                span.attrs[key] = span.attrs.get(key, 0) + amount
+
+    def get(self, download_id):
+        with self._lock:
+            trace = self._traces.get(download_id)
+            if trace is None:
+                return None
+            return {
+                "download_id": download_id,
+                "trace_id": trace.trace_id,
+                "dropped_spans": trace.dropped,
+                "spans": [s.as_dict() for s in trace.spans],
+            }
+
+    def chrome_trace(self, download_id):
+        """Trace Event Format, loadable in chrome://tracing and Perfetto."""
+        trace = self.get(download_id)
+        if trace is None:
+            return None
+        now = time.time()
+        events = []
+        for span in trace["spans"]:
+            args = dict(span["attrs"])
+            if span["error"]:
+                args["error"] = span["error"]
+            events.append({
+                "name": span["name"],
+                "cat": "download",
+                "ph": "X",
+                "ts": int(span["start"] * 1e6),
+                "dur": int(((span["end"] or now) - span["start"]) * 1e6),
+                "pid": 1,
+                "tid": span["thread"],
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"download_id": download_id}}
+
+    def otlp(self, download_id):
+        """OTLP/JSON ``ExportTraceServiceRequest`` body."""
+        trace = self.get(download_id)
+        if trace is None:
+            return None
+        now = time.time()
+        spans = []
+        for span in trace["spans"]:
+            attrs = [{"key": "download_id", "value": {"stringValue": download_id}}]
+            for key, value in span["attrs"].items():
+                if isinstance(value, bool):
+                    attrs.append({"key": key, "value": {"boolValue": value}})
+                elif isinstance(value, int):
+                    attrs.append({"key": key, "value": {"intValue": str(value)}})
+                elif isinstance(value, float):
+                    attrs.append({"key": key, "value": {"doubleValue": value}})
+                else:
+                    attrs.append({"key": key, "value": {"stringValue": str(value)}})
+            spans.append({
+                "traceId": trace["trace_id"],
+                "spanId": span["span_id"],
+                "parentSpanId": span["parent_id"] or "",
+                "name": span["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(int(span["start"] * 1e9)),
+                "endTimeUnixNano": str(int((span["end"] or now) * 1e9)),
+                "attributes": attrs,
+                "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+            })
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "downloader-backend"}}]},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+        }]}
+
+
+tracer = Tracer()
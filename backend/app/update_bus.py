@@ -0,0 +1,107 @@
+# app/update_bus.py
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .config import UPDATE_BUS_MAX_JOBS, download_sessions
+
+TERMINAL = ("completed", "error", "cancelled")
+
+
+class JobUpdate:
+    """One encoded snapshot of a job: what SSE events and long-poll responses send."""
+
+    __slots__ = ("version", "body", "etag", "terminal")
+
+    def __init__(self, version, body, etag, terminal):
+        self.version = version
+        self.body = body
+        self.etag = etag
+        self.terminal = terminal
+
+
+class _Slot:
+    __slots__ = ("download_id", "version", "session", "encoded", "cond")
+
+    def __init__(self, download_id):
+        self.download_id = download_id
+        self.version = 0
+        self.session = None
+        self.encoded = None
+        self.cond = threading.Condition(threading.Lock())
+
+
+class UpdateBus:
+    """Latest session per job plus a version counter, for HTTP followers (SSE, long-poll).
+
+    ``emit_status`` publishes here; readers always get the *current* snapshot,
+    so a slow follower skips intermediate progress instead of queueing it, and
+    each version is JSON-encoded once however many followers read it. Only the
+    UPDATE_BUS_MAX_JOBS most recently updated jobs are kept.
+    """
+
+    def __init__(self, max_jobs=UPDATE_BUS_MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._slots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _slot(self, download_id, session=None):
+        """The job's slot; with ``session`` a missing slot is created holding it, never empty."""
+        with self._lock:
+            slot = self._slots.get(download_id)
+            if slot is not None:
+                self._slots.move_to_end(download_id)
+            elif session is not None:
+                slot = self._slots[download_id] = _Slot(download_id)
+                slot.session = session
+                while len(self._slots) > self.max_jobs:
+                    self._slots.popitem(last=False)
+            return slot
+
+    def publish(self, download_id, session):
+        slot = self._slot(download_id, session)
+        with slot.cond:
+            slot.version += 1
+            slot.session = session
+            slot.cond.notify_all()
+
+    def current(self, download_id):
+        """The job's latest ``JobUpdate``, or None for an unknown job."""
+        slot = self._slot(download_id)
+        if slot is None:
+            session = download_sessions.get(download_id)
+            if session is None:
+                return None
+            self.publish(download_id, session)
+            slot = self._slot(download_id, session)
+        with slot.cond:
+            return self._encode(slot)
+
+    def wait(self, download_id, version, timeout):
+        """Block until the job moves past ``version`` (or ``timeout``); returns its latest ``JobUpdate``."""
+        slot = self._slot(download_id)
+        if slot is None:  # evicted meanwhile
+            return self.current(download_id)
+        with slot.cond:
+            slot.cond.wait_for(lambda: slot.version != version, timeout)
+            return self._encode(slot)
+
+    @staticmethod
+    def _encode(slot):
+        encoded = slot.encoded
+        if encoded is None or encoded.version != slot.version:
+            session = slot.session
+            # the record caches its own JSON per write, shared with every other reader of this version
+            body = f'{{"download_id": {json.dumps(slot.download_id)}, "session": {session.encode()}}}'
+            # content-derived, so an ETag from one cluster node is still valid on another
+            etag = hashlib.blake2b(body.encode("utf-8"), digest_size=12).hexdigest()
+            encoded = slot.encoded = JobUpdate(slot.version, body, etag, session.get("status") in TERMINAL)
+        return encoded
+
+    def stats(self):
+        with self._lock:
+            return {"jobs": len(self._slots)}
+
+
+update_bus = UpdateBus()
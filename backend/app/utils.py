@@ -5,12 +5,20 @@ import time
 import uuid
 import shutil
 import logging
+import threading
 import subprocess
 from datetime import datetime
-from urllib.parse import unquote
+from urllib.parse import unquote, urlsplit
 from flask import Response, send_file, request
 from flask import jsonify
-from .config import DOWNLOADS_DIR, download_sessions, download_cancel_flags, QUALITY_MAP
+from .config import DOWNLOADS_DIR, download_sessions, download_cancel_flags, QUALITY_MAP, JOB_QUEUE, SOCKETIO_MESSAGE_QUEUE
+from .cancellation import CancelToken, DownloadCancelled, abort_response
+from .bandwidth import bandwidth
+from .metrics import timed_submit, track_transfer, track_ffmpeg, active_sockets
+from .tracing import tracer
+from .job_queue import publisher
+from .cluster import cluster
+from .update_bus import update_bus
 from app import socketio
 
 logger = logging.getLogger(__name__)
@@ -31,6 +39,33 @@ def sanitize_filename(filename):
     cleaned = re.sub(r'[<>:"/\\|?*]', "_", cleaned)
     return (cleaned[:120] or "file").strip()
 
+def client_id():
+    """Who a request counts as for per-client limits: explicit socket sid, else the caller's IP."""
+    data = request.get_json(silent=True) or {}
+    return request.headers.get("X-Client-Id") or data.get("sid") or request.remote_addr
+
+def detect_platform(url):
+    from .platforms import match_platform
+    return match_platform(url)
+
+def canonicalize_url(url):
+    """Collapse the many spellings of the same post/video into one cache key."""
+    url = (url or "").strip()
+    platform = detect_platform(url)
+    if platform == "youtube":
+        m = re.search(r"(?:v=|youtu\.be/|/shorts/|/embed/|/live/)([0-9A-Za-z_-]{11})", url)
+        if m:
+            return f"https://www.youtube.com/watch?v={m.group(1)}"
+    elif platform == "instagram":
+        m = re.search(r"/(?:p|reel|reels|tv)/([A-Za-z0-9_-]+)", url)
+        if m:
+            return f"https://www.instagram.com/p/{m.group(1)}/"
+    elif platform == "pinterest":
+        parts = urlsplit(url if "://" in url else "https://" + url)
+        path = parts.path if parts.path.endswith("/") else parts.path + "/"
+        return f"https://{parts.netloc.lower()}{path}"
+    return url
+
 def find_ffmpeg():
     possible_paths = [
         "ffmpeg", "ffmpeg.exe",
@@ -45,10 +80,83 @@ def find_ffmpeg():
             return p
     return None
 
-def emit_status(download_id):
+def emit_status(download_id, broadcast=True):
+    """Send the session to its room; ``broadcast=False`` when a worker already emitted it through the message queue."""
+    session = download_sessions.get(download_id)
+    if session and publisher.active:
+        # worker process: the web process owns batches and, without a message queue, the sockets
+        payload = session.payload()
+        publisher.publish(download_id, payload)
+        if SOCKETIO_MESSAGE_QUEUE:
+            socketio.emit("download_update", {"download_id": download_id, "session": payload}, room=download_id)
+    elif session:
+        payload = session.payload()
+        update_bus.publish(download_id, session)
+        if broadcast:
+            socketio.emit("download_update", {"download_id": download_id, "session": payload}, room=download_id)
+        cluster.publish(download_id, payload)
+        if session.get("parent_id"):
+            from .batch_jobs import refresh_batch
+            refresh_batch(session["parent_id"])
+
+def cancel_token(download_id):
+    """The job's CancelToken (a never-cancelled one for anonymous work)."""
+    return download_cancel_flags.token(download_id) if download_id else CancelToken()
+
+def fail_session(download_id, error):
+    """End the session with its error, reported as ``cancelled`` when the job was cancelled.
+
+    The record keeps its platform, client and batch link; only progress details go.
+    """
+    if isinstance(error, DownloadCancelled) or download_cancel_flags.get(download_id):
+        update = {"status": "cancelled", "message": "Download cancelled"}
+    else:
+        update = {"status": "error", "message": str(error)}
+    session = download_sessions.get(download_id)
+    if session is None:
+        download_sessions[download_id] = update
+    else:
+        for key in ("speed", "eta", "ffmpeg_speed"):
+            session.pop(key, None)
+        session.update(update)
+    emit_status(download_id)
+
+def submit_download(download_id, fn, *args, pool=None):
+    """Queue ``fn`` on the shared executor; cancelling before it starts drops it from the queue.
+
+    With JOB_QUEUE set (and no explicit ``pool``) the job goes to the worker
+    processes instead; the returned future resolves when a worker finishes it.
+    """
+    if JOB_QUEUE and pool is None:
+        from .job_queue import dispatcher, fn_path
+        if dispatcher.enabled and fn_path(fn):
+            return dispatcher.submit(download_id, fn, args)
+    from .config import executor
+    token = cancel_token(download_id)
+    future = (pool or executor).submit(timed_submit(download_id, fn), *args)
+
+    def drop():
+        if future.cancel():
+            session = download_sessions.get(download_id)
+            if session is not None:
+                session.update({"status": "cancelled", "message": "Download cancelled"})
+                emit_status(download_id)
+            download_cancel_flags.release(download_id)
+
+    handle = token.register(drop)
+    future.add_done_callback(lambda f: token.unregister(handle))
+    return future
+
+_bytes_lock = threading.Lock()
+
+def add_session_bytes(download_id, downloaded=0, total=0):
+    """Accumulate byte counters across all (possibly parallel) streams of one job."""
     session = download_sessions.get(download_id)
-    if session:
-        socketio.emit("download_update", {"download_id": download_id, "session": session}, room=download_id)
+    if not session:
+        return
+    with _bytes_lock:
+        session["downloaded_bytes"] = session.get("downloaded_bytes", 0) + downloaded
+        session["total_bytes"] = session.get("total_bytes", 0) + total
 
 def smooth_emit_progress(download_id, target_progress, message=None, step=2, delay=0.05):
     """Gradually moves progress to target and emits via socket to reduce spikes."""
@@ -58,16 +166,140 @@ def smooth_emit_progress(download_id, target_progress, message=None, step=2, del
     target = int(target_progress)
     if target <= current:
         return
+    token = cancel_token(download_id)
     for p in range(current, target + 1, step):
-        if download_cancel_flags.get(download_id):
+        if token.cancelled:
             return
         download_sessions[download_id]["progress"] = min(p, 100)
         if message:
             download_sessions[download_id]["message"] = message
         emit_status(download_id)
-        time.sleep(delay)
+        token.wait(delay)
+
+# ------------ FFmpeg runner ------------
+# an ffmpeg that reports no progress for this long is considered stuck
+FFMPEG_STALL_TIMEOUT = 120
+
+def probe_media(path):
+    """``(duration_seconds or None, has_video)`` from ffmpeg's input banner."""
+    ffmpeg_path = find_ffmpeg()
+    try:
+        result = subprocess.run([ffmpeg_path, "-hide_banner", "-i", path], capture_output=True, text=True, timeout=30)
+    except Exception:
+        return None, True
+    m = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    duration = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3)) if m else None
+    return duration, "Video:" in result.stderr
+
+def _progress_time(fields):
+    # out_time_us is the real field; older builds only print out_time_ms (also microseconds)
+    for key in ("out_time_us", "out_time_ms"):
+        value = fields.get(key, "")
+        if value.isdigit():
+            return int(value) / 1_000_000
+    return None
+
+@track_ffmpeg
+def run_ffmpeg(args, download_id=None, duration=None, start_progress=None, end_progress=None, message="Processing", stdin_source=None, cleanup=(), operation="ffmpeg"):
+    """Run ffmpeg with ``-progress pipe:1`` and turn its reports into session progress, speed and ETA.
+
+    ``args`` is everything after the global options (inputs and outputs).
+    ``stdin_source`` is an iterable of bytes fed to ``pipe:0``. The process is
+    killed as soon as the job is cancelled or it stops reporting for
+    FFMPEG_STALL_TIMEOUT seconds; ``cleanup`` paths are removed on failure.
+    ``operation`` labels the run in the ffmpeg duration metrics.
+    """
+    ffmpeg_path = find_ffmpeg()
+    if not ffmpeg_path:
+        raise Exception("FFmpeg not found")
+    cmd = [ffmpeg_path, "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1", "-y", *args]
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if stdin_source is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stderr_lines = []
+    state = {"last_report": time.time(), "feed_error": None}
+    report_progress = bool(download_id and duration and end_progress is not None)
+
+    def read_progress():
+        fields = {}
+        for raw in proc.stdout:
+            key, _, value = raw.decode(errors="replace").strip().partition("=")
+            fields[key] = value
+            if key != "progress":
+                continue
+            state["last_report"] = time.time()
+            out_time = _progress_time(fields)
+            if report_progress and out_time is not None and download_id in download_sessions:
+                fraction = min(out_time / duration, 1.0)
+                speed = fields.get("speed", "").rstrip("x").strip()
+                speed = float(speed) if re.match(r"^\d+(\.\d+)?$", speed) else None
+                download_sessions[download_id].update({
+                    "progress": start_progress + int(fraction * (end_progress - start_progress)),
+                    "message": f"{message}... {int(fraction * 100)}%",
+                    "ffmpeg_speed": speed,
+                    "eta": int((duration - out_time) / speed) if speed else None,
+                })
+                emit_status(download_id)
+            fields = {}
+
+    def read_stderr():
+        for raw in proc.stderr:
+            stderr_lines.append(raw.decode(errors="replace"))
+            del stderr_lines[:-50]
+
+    def feed_stdin():
+        try:
+            for data in stdin_source:
+                proc.stdin.write(data)
+                state["last_report"] = time.time()
+        except BrokenPipeError:
+            pass  # ffmpeg gave up early; its stderr says why
+        except Exception as e:
+            state["feed_error"] = e
+            proc.kill()
+        finally:
+            try:
+                proc.stdin.close()
+            except Exception:
+                pass
+
+    threads = [threading.Thread(target=read_progress, daemon=True), threading.Thread(target=read_stderr, daemon=True)]
+    if stdin_source is not None:
+        threads.append(threading.Thread(target=feed_stdin, daemon=True))
+    for t in threads:
+        t.start()
+
+    token = cancel_token(download_id)
+    try:
+        with token.on_cancel(proc.kill):
+            while True:
+                try:
+                    returncode = proc.wait(timeout=0.1)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+                if time.time() - state["last_report"] > FFMPEG_STALL_TIMEOUT:
+                    raise Exception(f"FFmpeg stalled for {FFMPEG_STALL_TIMEOUT}s")
+        token.raise_if_cancelled()
+        for t in threads:
+            t.join(timeout=5)
+        if state["feed_error"]:
+            raise state["feed_error"]
+        if returncode != 0:
+            raise Exception(f"FFmpeg failed: {''.join(stderr_lines).strip()}")
+    except BaseException:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        for path in cleanup:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
 
-def resize_with_ffmpeg(input_path, output_path, quality):
+def resize_with_ffmpeg(input_path, output_path, quality, download_id=None, start_progress=None, end_progress=None):
     ffmpeg_path = find_ffmpeg()
     if not ffmpeg_path:
         raise Exception("FFmpeg not found")
@@ -78,31 +310,26 @@ def resize_with_ffmpeg(input_path, output_path, quality):
     target = QUALITY_MAP[quality]
     width, height = target['width'], target['height']
 
-    # probe to check if video (simplified)
-    try:
-        probe_cmd = [ffmpeg_path, "-i", input_path, "-hide_banner"]
-        probe_result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=10)
-        is_video = 'Video:' in probe_result.stderr
-    except Exception:
-        is_video = True
+    duration, is_video = probe_media(input_path)
 
     if is_video:
-        cmd = [
-            ffmpeg_path, "-i", input_path,
+        args = [
+            "-i", input_path,
             "-vf", f"scale={width}:{height}:force_original_aspect_ratio=decrease",
             "-c:v", "libx264", "-preset", "medium", "-crf", "23",
-            "-c:a", "copy", "-y", output_path
+            "-c:a", "copy", output_path
         ]
     else:
-        cmd = [
-            ffmpeg_path, "-i", input_path,
+        args = [
+            "-i", input_path,
             "-vf", f"scale={width}:{height}:force_original_aspect_ratio=decrease",
-            "-q:v", "2", "-y", output_path
+            "-q:v", "2", output_path
         ]
 
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-    if result.returncode != 0:
-        raise Exception(f"Resize failed: {result.stderr}")
+    try:
+        run_ffmpeg(args, download_id, duration, start_progress, end_progress, f"Converting to {quality}", cleanup=[output_path], operation="resize")
+    except Exception as e:
+        raise Exception(f"Resize failed: {e}")
     return True
 
 # ------------ Socket handlers registration ------------
@@ -111,18 +338,31 @@ def register_socket_handlers(app):
 
     @socketio.on("connect")
     def on_connect():
+        active_sockets.inc()
         emit("connection_response", {"message": "Connected"})
 
+    @socketio.on("disconnect")
+    def on_disconnect(*args):
+        active_sockets.dec()
+
     @socketio.on("join")
     def on_join_room(data):
         room = data.get("download_id")
         if room:
             join_room(room)
-            emit_status(room)
+            if room in download_sessions:
+                emit_status(room)
+            else:
+                # started on another cluster node: its later updates arrive through the message queue
+                session = cluster.lookup(room)
+                if session:
+                    emit("download_update", {"download_id": room, "session": dict(session)})
 
     @socketio.on("cancel_download")
     def on_cancel(data):
         did = data.get("download_id")
+        if did not in download_sessions:
+            cluster.request_cancel(did)
         download_cancel_flags[did] = True
         if did in download_sessions:
             download_sessions[did]["status"] = "cancelling"
@@ -170,58 +410,237 @@ def serve_file_with_ranges(platform, filename):
 # ------------------------------------------------------------------
 # Download stream helper (used by all platforms)
 # ------------------------------------------------------------------
-import requests
-
-def download_stream_fast(url, filepath, download_id=None, start_progress=0, end_progress=100, max_retries=3):
+@track_transfer
+def download_stream_fast(url, filepath, download_id=None, start_progress=0, end_progress=100, max_retries=3, session=None):
     """
     Stream-downloads media file with retry and socket progress emission.
-    Used by all platform modules.
+    Used by all platform modules. Pass ``end_progress=None`` to only count bytes
+    (callers running several fetches at once report progress themselves), and
+    ``session`` to reuse pooled connections.
     """
-    from .config import download_sessions, download_cancel_flags
-    from app import socketio
-    import time
+    import requests
+    from .config import WRITE_FSYNC
+    from .file_writer import PreallocatedWriter, response_reader
 
-    CHUNK_SIZE = 1024 * 1024  # 1MB chunks
     attempt = 0
-    last_emit = 0
     headers = {"User-Agent": "Mozilla/5.0", "Referer": "https://www.google.com/"}
 
+    token = cancel_token(download_id)
     while attempt < max_retries:
+        downloaded = 0
+        total_size = 0
         try:
-            with requests.get(url, headers=headers, stream=True, timeout=30) as r:
+            token.raise_if_cancelled()
+            with (session or requests).get(url, headers=headers, stream=True, timeout=30) as r, token.on_cancel(lambda: abort_response(r)):
                 r.raise_for_status()
-                total_size = int(r.headers.get("content-length", 0))
-                downloaded = 0
-                last_percent = 0
-
-                with open(filepath, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
-                        if download_cancel_flags.get(download_id):
-                            raise Exception("Download cancelled by user.")
-                        if not chunk:
-                            continue
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if total_size > 0:
-                            percent = int((downloaded / total_size) * (end_progress - start_progress)) + start_progress
-                            if percent >= last_percent + 1:
-                                download_sessions[download_id]["progress"] = min(percent, end_progress)
-                                download_sessions[download_id]["message"] = f"Downloading... {percent}%"
-                                socketio.emit("download_update", {
-                                    "download_id": download_id,
-                                    "session": download_sessions[download_id]
-                                }, room=download_id)
-                                last_percent = percent
-                                last_emit = time.time()
+                # content-length counts the encoded bytes; a decoded body's size is unknown
+                encoded = (r.headers.get("Content-Encoding") or "identity").lower() != "identity"
+                total_size = 0 if encoded else int(r.headers.get("content-length", 0))
+                add_session_bytes(download_id, total=total_size)
+                state = download_sessions.get(download_id)
+                span = (end_progress - start_progress) if end_progress is not None else 0
+                last_percent = start_progress
+
+                def on_data(n):
+                    nonlocal downloaded, last_percent
+                    bandwidth.consume(download_id, n, token)
+                    downloaded += n
+                    add_session_bytes(download_id, n)
+                    if total_size and span and state is not None:
+                        percent = downloaded * span // total_size + start_progress
+                        if percent > last_percent:
+                            state["progress"] = min(percent, end_progress)
+                            state["message"] = f"Downloading... {percent}%"
+                            emit_status(download_id)
+                            last_percent = percent
+
+                reader = response_reader(r)
+                with PreallocatedWriter(filepath, total_size, fsync=WRITE_FSYNC) as writer:
+                    writer.fill_from(reader, on_data)
+                if total_size and downloaded != total_size:
+                    raise Exception(f"connection closed at byte {downloaded} of {total_size}")
             # success
-            download_sessions[download_id]["progress"] = end_progress
-            socketio.emit("download_update", {
-                "download_id": download_id,
-                "session": download_sessions[download_id]
-            }, room=download_id)
+            if end_progress is not None:
+                download_sessions[download_id]["progress"] = end_progress
+                emit_status(download_id)
             return
         except Exception as e:
+            # this attempt's bytes are rewritten from scratch on retry
+            add_session_bytes(download_id, -downloaded, -total_size)
+            if token.cancelled:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                raise DownloadCancelled()
             attempt += 1
+            tracer.incr(download_id, "retries")
             if attempt >= max_retries:
                 raise Exception(f"Failed to download {url}: {e}")
-            time.sleep(1.5 * attempt)  # exponential backoff
+            token.wait(1.5 * attempt)  # exponential backoff, cut short by cancel
+
+
+# ------------ Segmented (ranged) downloads ------------
+class ProgressMeter:
+    """Byte counter shared by the parallel readers of one job; emits progress, speed and ETA."""
+
+    def __init__(self, download_id, total, start_progress=0, end_progress=100):
+        self.download_id = download_id
+        self.total = total
+        self.start_progress = start_progress
+        self.end_progress = end_progress
+        self.done = 0
+        self.started = time.time()
+        self._last_percent = -1
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+        add_session_bytes(download_id, total=total)
+
+    def add(self, n):
+        add_session_bytes(self.download_id, n)
+        session = download_sessions.get(self.download_id)
+        with self._lock:
+            self.done += n
+            if session is None or not self.total:
+                return
+            percent = self.start_progress + int(self.done / self.total * (self.end_progress - self.start_progress))
+            now = time.time()
+            if percent == self._last_percent and now - self._last_emit < 1:
+                return
+            speed = self.done / max(now - self.started, 1e-6)
+            session.update({
+                "progress": min(percent, self.end_progress),
+                "message": f"Downloading... {int(self.done * 100 / self.total)}%",
+                "speed": int(speed),
+                "eta": int((self.total - self.done) / speed) if speed else None,
+            })
+            self._last_percent, self._last_emit = percent, now
+        emit_status(self.download_id)
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+def iter_ranges(url, start, stop, download_id=None, meter=None, chunk_size=None, max_retries=3, session=None, token=None):
+    """Yield bytes ``[start, stop)`` of ``url`` in order, one ranged request per chunk.
+
+    A failed request resumes from the last byte received instead of starting over.
+    ``token`` replaces the job's cancel token (to stop one part of a job).
+    """
+    import requests
+    from .config import RANGE_CHUNK_SIZE
+    chunk_size = chunk_size or RANGE_CHUNK_SIZE
+    headers = {"User-Agent": "Mozilla/5.0", "Referer": "https://www.google.com/"}
+    token = token or cancel_token(download_id)
+    offset = start
+    while offset < stop:
+        end = min(offset + chunk_size, stop) - 1
+        attempt = 0
+        while offset <= end:
+            try:
+                token.raise_if_cancelled()
+                request = (session or requests).get(url, headers=dict(headers, Range=f"bytes={offset}-{end}"), stream=True, timeout=30)
+                with request as r, token.on_cancel(lambda: abort_response(r)):
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise RangeNotSupported(f"{url} ignored the Range header")
+                    for data in r.iter_content(chunk_size=256 * 1024):
+                        data = data[:end + 1 - offset]
+                        if not data:
+                            continue
+                        bandwidth.consume(download_id, len(data), token)
+                        offset += len(data)
+                        if meter:
+                            meter.add(len(data))
+                        yield data
+                if offset <= end:
+                    raise Exception(f"connection closed at byte {offset}")
+            except Exception as e:
+                if token.cancelled:
+                    raise DownloadCancelled()
+                if isinstance(e, RangeNotSupported):
+                    raise
+                attempt += 1
+                tracer.incr(download_id, "retries")
+                if attempt >= max_retries:
+                    raise Exception(f"Failed to download {url}: {e}")
+                token.wait(1.5 * attempt)
+
+
+@track_transfer
+def download_stream_ranged(url, filepath, total_size, download_id=None, start_progress=0, end_progress=100, parts=None, session=None):
+    """Fetch ``url`` as ``parts`` byte ranges in parallel, each written in place into a preallocated file.
+
+    Falls back to ``download_stream_fast`` when the size is unknown or the server
+    does not honour ranges.
+    """
+    from .config import RANGE_PARTS
+    from .file_writer import preallocate
+    from concurrent.futures import ThreadPoolExecutor
+    if not total_size:
+        return download_stream_fast(url, filepath, download_id, start_progress, end_progress, session=session)
+
+    parts = max(1, min(parts or RANGE_PARTS, total_size // (1024 * 1024) or 1))
+    meter = ProgressMeter(download_id, total_size, start_progress, end_progress)
+    bounds = [(total_size * i // parts, total_size * (i + 1) // parts) for i in range(parts)]
+    fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        preallocate(fd, total_size)
+    finally:
+        os.close(fd)
+
+    # stops every part at once: fired by the job's cancel or by the first part to fail
+    halt = CancelToken()
+    failures = []
+
+    def fetch(start, stop):
+        fd = os.open(filepath, os.O_WRONLY)
+        try:
+            offset = start
+            for data in iter_ranges(url, start, stop, download_id, meter, session=session, token=halt):
+                os.pwrite(fd, data, offset)
+                offset += len(data)
+        except Exception as e:
+            if not isinstance(e, DownloadCancelled):
+                failures.append(e)
+            halt.cancel()
+        finally:
+            os.close(fd)
+
+    try:
+        with cancel_token(download_id).on_cancel(halt.cancel):
+            if parts == 1:
+                fetch(*bounds[0])
+            else:
+                with ThreadPoolExecutor(max_workers=parts) as pool:
+                    for a, b in bounds:
+                        pool.submit(fetch, a, b)
+        if failures:
+            raise failures[0]
+        halt.raise_if_cancelled()
+    except RangeNotSupported as e:
+        add_session_bytes(download_id, -meter.done, -total_size)
+        logger.info(f"Ranged fetch unsupported, streaming instead: {e}")
+        return download_stream_fast(url, filepath, download_id, start_progress, end_progress, session=session)
+    except Exception:
+        add_session_bytes(download_id, -meter.done, -total_size)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+    if download_id in download_sessions:
+        download_sessions[download_id]["progress"] = end_progress
+        emit_status(download_id)
+
+
+def transcode_stream(source, output_args, download_id=None, cleanup=(), duration=None, start_progress=None, end_progress=None):
+    """Run one ffmpeg job over ``source`` and write every output in ``output_args``.
+
+    ``source`` is a path/URL, or an iterable of bytes piped into ffmpeg's stdin
+    so encoding overlaps the download. With ``duration`` the encode drives the
+    session's progress; otherwise the caller's byte meter does.
+    """
+    piped = not isinstance(source, str)
+    args = ["-i", "pipe:0" if piped else source, *output_args]
+    run_ffmpeg(
+        args, download_id, duration, start_progress, end_progress, "Encoding audio",
+        stdin_source=source if piped else None, cleanup=cleanup, operation="encode",
+    )
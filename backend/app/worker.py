@@ -0,0 +1,145 @@
+# app/worker.py
+"""Worker process for JOB_QUEUE=sqlite: ``python -m app.worker [--id w0] [--threads 2]``.
+
+Claims jobs from the shared queue and runs them exactly as the in-process
+executor would, publishing session snapshots back to the web process (and
+emitting to sockets directly when SOCKETIO_MESSAGE_QUEUE is set). Every
+second it also checks in with its metrics and takes its share of the node's
+bandwidth limits. Start it from the same directory as the web process so
+both see the same downloads/.
+"""
+import os
+import json
+import time
+import socket
+import argparse
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import socketio
+from .config import (
+    DOWNLOADS_DIR, JOB_QUEUE_PATH, JOB_QUEUE_OWNER, WORKER_THREADS, QUEUE_POLL_INTERVAL, SOCKETIO_MESSAGE_QUEUE,
+    download_sessions, download_cancel_flags,
+)
+from .job_queue import SqliteJobQueue, publisher, resolve_fn
+from .bandwidth import bandwidth
+from .metrics import registry, set_capacity, timed_submit
+from .utils import fail_session
+
+logger = logging.getLogger(__name__)
+
+TERMINAL = ("completed", "error", "cancelled")
+CHECK_IN_INTERVAL = 1.0
+
+
+class Worker:
+    def __init__(self, queue, worker_id, threads=WORKER_THREADS, parent_pid=None):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.threads = threads
+        self.parent_pid = parent_pid
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._limits = None
+
+    def run(self):
+        set_capacity(self.threads)
+        pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix=f"worker-{self.worker_id}")
+        slots = threading.Semaphore(self.threads)
+        threading.Thread(target=self._watch, name="worker-watch", daemon=True).start()
+        logger.info(f"Worker {self.worker_id} (pid {os.getpid()}) consuming {self.queue.path} with {self.threads} thread(s)")
+        while not self._stop.is_set():
+            slots.acquire()
+            try:
+                job = self.queue.claim(self.worker_id)
+            except Exception as e:
+                logger.warning(f"Claiming a job failed: {e}")
+                job = None
+            if job is None:
+                slots.release()
+                self._stop.wait(QUEUE_POLL_INTERVAL)
+                continue
+            pool.submit(self._run, *job).add_done_callback(lambda f: slots.release())
+        pool.shutdown(wait=True)
+
+    def _run(self, download_id, path, args, session, enqueued_at):
+        download_cancel_flags.pop(download_id, None)
+        download_sessions[download_id] = session
+        with self._lock:
+            self._running.add(download_id)
+        try:
+            timed_submit(download_id, resolve_fn(path), queued_at=enqueued_at)(*args)
+        except Exception as e:
+            logger.exception(f"Job {download_id} failed")
+            fail_session(download_id, e)
+        finally:
+            with self._lock:
+                self._running.discard(download_id)
+            final = download_sessions.pop(download_id, None) or {}
+            if final.get("status") not in TERMINAL:
+                final = dict(final, status="error", message="Job ended without a result")
+            try:
+                publisher.finish(download_id, final)
+            finally:
+                download_cancel_flags.pop(download_id, None)
+
+    def _watch(self):
+        """Relay cancel requests to running jobs and check in; stop when the spawning web process is gone."""
+        last_check_in = 0.0
+        while not self._stop.wait(QUEUE_POLL_INTERVAL * 4):
+            if self.parent_pid and os.getppid() != self.parent_pid:
+                logger.info(f"Web process {self.parent_pid} exited, stopping worker {self.worker_id}")
+                self._stop.set()
+                return
+            with self._lock:
+                running = list(self._running)
+            try:
+                for download_id in self.queue.cancelled(running):
+                    if not download_cancel_flags.get(download_id):
+                        download_cancel_flags[download_id] = True
+            except Exception as e:
+                logger.warning(f"Checking for cancel requests failed: {e}")
+            if time.monotonic() - last_check_in >= CHECK_IN_INTERVAL:
+                last_check_in = time.monotonic()
+                try:
+                    self.check_in()
+                except Exception as e:
+                    logger.warning(f"Checking in with the job queue failed: {e}")
+
+    def check_in(self):
+        """Heartbeat with this process's metrics, then adopt its share of the node's bandwidth limits."""
+        self.queue.heartbeat(self.worker_id, registry.snapshot())
+        limits = self.queue.setting("bandwidth")
+        if limits is None:
+            return
+        shares = max(len(self.queue.workers()), 1)
+        key = (json.dumps(limits, sort_keys=True), shares)
+        if key != self._limits:
+            bandwidth.apply_share(limits, shares)
+            self._limits = key
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run downloads from the shared job queue.")
+    parser.add_argument("--id", default=f"{socket.gethostname()}-{os.getpid()}", help="worker name recorded on claimed jobs")
+    parser.add_argument("--threads", type=int, default=WORKER_THREADS, help="jobs run at once")
+    parser.add_argument("--queue", default=JOB_QUEUE_PATH, help="SQLite queue file")
+    parser.add_argument("--owner", default=JOB_QUEUE_OWNER, help="node whose jobs to run (see JOB_QUEUE_OWNER)")
+    parser.add_argument("--parent", type=int, default=None, help="exit when this process goes away")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=f"%(levelname)s:{args.id}:%(name)s:%(message)s")
+    os.makedirs(DOWNLOADS_DIR, exist_ok=True)
+    if SOCKETIO_MESSAGE_QUEUE:
+        # write-only client manager: emits reach the web process's sockets through the queue
+        from .cluster import message_queue_options
+        socketio.init_app(None, **message_queue_options(write_only=True))
+    queue = SqliteJobQueue(args.queue, args.owner)
+    publisher.start(queue)
+    Worker(queue, args.id, args.threads, args.parent).run()
+
+
+if __name__ == "__main__":
+    main()
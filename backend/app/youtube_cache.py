@@ -0,0 +1,227 @@
+# app/youtube_cache.py
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+from pytubefix import YouTube, extract
+from pytubefix.cipher import Cipher
+
+from .config import (
+    YOUTUBE_MANIFEST_CACHE_SIZE,
+    YOUTUBE_MANIFEST_SAFETY_MARGIN,
+    YOUTUBE_PLAYER_CACHE_SIZE,
+)
+from .youtube_streams import StreamIndex
+
+logger = logging.getLogger(__name__)
+
+# used when no stream URL carries an ``expire`` parameter
+DEFAULT_MANIFEST_TTL = 3 * 3600
+# deciphered values remembered per player version
+MAX_MEMO_ENTRIES = 4096
+
+
+# ------------ Player (cipher / n-sig) cache ------------
+def player_version(js_url):
+    m = re.search(r"/s/player/([\w-]+)/", js_url or "")
+    return m.group(1) if m else js_url
+
+
+class _PlayerFunctions:
+    """One live deciphering engine per player version, with memoized sig/n-sig results."""
+
+    def __init__(self, js, js_url):
+        self.js = js
+        self.js_url = js_url
+        self._cipher = None
+        self._lock = threading.Lock()
+        self._sig = OrderedDict()
+        self._nsig = OrderedDict()
+
+    def _engine(self):
+        if self._cipher is None:
+            started = time.time()
+            self._cipher = Cipher(js=self.js, js_url=self.js_url)
+            logger.info(f"Built YouTube player functions for {player_version(self.js_url)} in {time.time() - started:.2f}s")
+        return self._cipher
+
+    def _call(self, memo, key, fn_name):
+        with self._lock:
+            if key in memo:
+                memo.move_to_end(key)
+                return memo[key]
+            value = getattr(self._engine(), fn_name)(key)
+            memo[key] = value
+            if len(memo) > MAX_MEMO_ENTRIES:
+                memo.popitem(last=False)
+            return value
+
+    def sig(self, ciphered_signature):
+        return self._call(self._sig, ciphered_signature, "get_sig")
+
+    def nsig(self, n):
+        return self._call(self._nsig, n, "get_nsig")
+
+    def close(self):
+        with self._lock:
+            if self._cipher:
+                for runner in (self._cipher.runner_sig, self._cipher.runner_nsig):
+                    try:
+                        runner.close()
+                    except Exception:
+                        pass
+                self._cipher = None
+
+
+class _KeepAliveRunner:
+    # pytubefix closes the cipher's node runners after every manifest; ours are shared
+    @staticmethod
+    def close():
+        pass
+
+
+class CachedCipher:
+    """Drop-in for pytubefix's ``Cipher`` that reuses the player functions for the same player version."""
+
+    runner_sig = _KeepAliveRunner
+    runner_nsig = _KeepAliveRunner
+
+    def __init__(self, js, js_url):
+        self.js_url = js_url
+        self._player = _get_player(js, js_url)
+
+    def get_sig(self, ciphered_signature):
+        return self._player.sig(ciphered_signature)
+
+    def get_nsig(self, n):
+        return self._player.nsig(n)
+
+
+_players = OrderedDict()
+_players_lock = threading.Lock()
+
+
+def _get_player(js, js_url):
+    version = player_version(js_url)
+    with _players_lock:
+        player = _players.get(version)
+        if player is None:
+            player = _PlayerFunctions(js, js_url)
+            _players[version] = player
+            while len(_players) > YOUTUBE_PLAYER_CACHE_SIZE:
+                _, old = _players.popitem(last=False)
+                old.close()
+        else:
+            _players.move_to_end(version)
+        return player
+
+
+def forget_player(js_url):
+    """Drop a player version, e.g. when its functions stop producing valid signatures."""
+    with _players_lock:
+        player = _players.pop(player_version(js_url), None)
+    if player:
+        player.close()
+
+
+_original_apply_signature = extract.apply_signature
+
+
+def _apply_signature(stream_manifest, vid_info, js, url_js):
+    try:
+        return _original_apply_signature(stream_manifest, vid_info, js, url_js)
+    except Exception:
+        # a stale engine must not survive pytubefix's "refetch base.js and retry" path
+        forget_player(url_js)
+        raise
+
+
+def install():
+    """Route pytubefix's signature deciphering through the player cache (idempotent)."""
+    if extract.Cipher is not CachedCipher:
+        extract.Cipher = CachedCipher
+        extract.apply_signature = _apply_signature
+
+
+# ------------ Stream manifest cache ------------
+def manifest_expiry(streams):
+    """Earliest ``expire`` timestamp across the signed stream URLs."""
+    expiries = []
+    for s in streams:
+        try:
+            expire = parse_qs(urlparse(s.url).query).get("expire")
+            if expire:
+                expiries.append(int(expire[0]))
+        except Exception:
+            continue
+    return min(expiries) if expiries else time.time() + DEFAULT_MANIFEST_TTL
+
+
+class _Entry:
+    __slots__ = ("yt", "index", "expires_at")
+
+    def __init__(self, yt, index, expires_at):
+        self.yt = yt
+        self.index = index
+        self.expires_at = expires_at
+
+
+_manifests = OrderedDict()
+_manifests_lock = threading.Lock()
+_inflight = {}
+
+
+def get_youtube(url):
+    """Return a ``YouTube`` whose streams are resolved, reusing the manifest until its URLs expire.
+
+    Concurrent requests for the same video share one upstream fetch.
+    """
+    video_id = extract.video_id(url)
+    while True:
+        with _manifests_lock:
+            entry = _manifests.get(video_id)
+            if entry and entry.expires_at - YOUTUBE_MANIFEST_SAFETY_MARGIN > time.time():
+                _manifests.move_to_end(video_id)
+                return entry.yt
+            event = _inflight.get(video_id)
+            if event is None:
+                event = _inflight[video_id] = threading.Event()
+                break
+        # another request is fetching this video; re-check the cache (or retry ourselves if it failed)
+        event.wait()
+
+    try:
+        yt = YouTube(url)
+        streams = yt.fmt_streams
+        # title/length are read by every caller, resolve them once while we own the fetch
+        _ = (yt.title, yt.length)
+        expires_at = manifest_expiry(streams)
+        with _manifests_lock:
+            _manifests[video_id] = _Entry(yt, StreamIndex(streams), expires_at)
+            while len(_manifests) > YOUTUBE_MANIFEST_CACHE_SIZE:
+                _manifests.popitem(last=False)
+        return yt
+    finally:
+        with _manifests_lock:
+            _inflight.pop(video_id, None)
+        event.set()
+
+
+def stream_index(yt):
+    """The ``StreamIndex`` built when ``yt`` was fetched (built on the spot for uncached objects)."""
+    with _manifests_lock:
+        entry = _manifests.get(yt.video_id)
+    if entry and entry.yt is yt:
+        return entry.index
+    return StreamIndex(yt.fmt_streams)
+
+
+def invalidate(url):
+    with _manifests_lock:
+        _manifests.pop(extract.video_id(url), None)
+
+
+install()
@@ -0,0 +1,121 @@
+# app/youtube_streams.py
+import re
+
+
+def _res(stream):
+    m = re.match(r"(\d+)p", stream.resolution or "")
+    return int(m.group(1)) if m else 0
+
+
+def _abr(stream):
+    m = re.match(r"(\d+)", stream.abr or "")
+    return int(m.group(1)) if m else 0
+
+
+def stream_size(stream):
+    # contentLength from the manifest; never triggers pytubefix's HEAD request
+    return getattr(stream, "_filesize", 0) or None
+
+
+def _video_rank(stream):
+    return (getattr(stream, "fps", 0) or 0, getattr(stream, "bitrate", 0) or 0)
+
+
+def _audio_rank(stream):
+    return (bool(getattr(stream, "is_default_audio_track", True)), _abr(stream))
+
+
+class StreamIndex:
+    """One pass over a video's streams, answering every selection the download paths need.
+
+    - ``progressive``: {height: best progressive mp4}
+    - ``video``: {(height, codec): best video-only stream}
+    - ``audio``: {(codec, kbps): best audio-only stream}
+    """
+
+    def __init__(self, streams):
+        self.progressive = {}
+        self.video = {}
+        self.audio = {}
+        for s in streams:
+            if s.is_progressive:
+                if s.subtype != "mp4":
+                    continue
+                h = _res(s)
+                cur = self.progressive.get(h)
+                if cur is None or _video_rank(s) > _video_rank(cur):
+                    self.progressive[h] = s
+            elif s.includes_video_track:
+                key = (_res(s), s.video_codec)
+                cur = self.video.get(key)
+                if cur is None or _video_rank(s) > _video_rank(cur):
+                    self.video[key] = s
+            elif s.includes_audio_track:
+                key = (s.audio_codec, _abr(s))
+                cur = self.audio.get(key)
+                if cur is None or _audio_rank(s) > _audio_rank(cur):
+                    self.audio[key] = s
+
+        self._best_audio = max(self.audio.values(), key=_audio_rank, default=None)
+        self._video_mp4 = {}
+        for (h, _), s in self.video.items():
+            if s.subtype != "mp4":
+                continue
+            cur = self._video_mp4.get(h)
+            if cur is None or _video_rank(s) > _video_rank(cur):
+                self._video_mp4[h] = s
+
+    @staticmethod
+    def _height(quality):
+        m = re.match(r"(\d+)p", quality or "")
+        return int(m.group(1)) if m else None
+
+    def best_progressive(self, quality=None):
+        """Progressive mp4 at ``quality``, or the highest one when ``quality`` is None."""
+        if quality is None:
+            return self.progressive[max(self.progressive)] if self.progressive else None
+        return self.progressive.get(self._height(quality))
+
+    def best_video(self, quality=None):
+        """Video-only mp4 at ``quality``, or the highest one when ``quality`` is None."""
+        if quality is None:
+            return self._video_mp4[max(self._video_mp4)] if self._video_mp4 else None
+        return self._video_mp4.get(self._height(quality))
+
+    def best_audio(self):
+        return self._best_audio
+
+    def select(self, quality=None):
+        """Return ``(video_stream, audio_stream)``; audio is None for progressive picks.
+
+        Mirrors the old selection: progressive at the requested quality, then
+        video-only at that quality (falling back to the highest) plus best audio.
+        """
+        stream = self.best_progressive(quality) if quality else None
+        if stream:
+            return stream, None
+        video = (self.best_video(quality) if quality else None) or self.best_video()
+        return video, self.best_audio()
+
+    def best_overall(self):
+        """Best single-file stream if there is one, else best video + best audio (preview/metadata)."""
+        stream = self.best_progressive()
+        if stream:
+            return stream, None
+        return self.best_video(), self.best_audio()
+
+    def resolutions(self):
+        heights = set(self.progressive) | set(self._video_mp4)
+        return [f"{h}p" for h in sorted(heights, reverse=True) if h]
+
+    def sizes(self):
+        """Expected bytes per resolution (progressive file, or video + best audio); None when unknown."""
+        audio_size = stream_size(self._best_audio) if self._best_audio else 0
+        out = {}
+        for q in self.resolutions():
+            video, audio = self.select(q)
+            size = stream_size(video)
+            if size and audio:
+                size = size + audio_size if audio_size else None
+            out[q] = size
+        return out
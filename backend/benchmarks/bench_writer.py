@@ -0,0 +1,109 @@
+# benchmarks/bench_writer.py
+"""Chunk-loop microbenchmark: legacy iter_content/f.write vs PreallocatedWriter.
+
+Serves an in-memory body from a local HTTP stand-in running in a separate
+process (so its CPU is not counted) and downloads it repeatedly with both
+loops, reporting throughput and client CPU seconds per GB.
+
+    cd backend && python -m benchmarks.bench_writer --size-mb 512 --runs 3
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from app.utils import download_stream_fast
+
+
+def _serve(port_queue, size):
+    body = memoryview(os.urandom(1024 * 1024) * (size // (1024 * 1024) or 1))[:size]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            for i in range(0, len(body), 1024 * 1024):
+                self.wfile.write(body[i:i + 1024 * 1024])
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def legacy_loop(url, path):
+    """The pre-writer chunk loop: default-buffered file, one bytes object per chunk."""
+    with requests.get(url, stream=True, timeout=30) as r, open(path, "wb") as f:
+        total = int(r.headers.get("content-length", 0))
+        downloaded, last_percent = 0, 0
+        for chunk in r.iter_content(chunk_size=1024 * 1024):
+            if not chunk:
+                continue
+            f.write(chunk)
+            downloaded += len(chunk)
+            percent = int(downloaded / total * 100)
+            if percent >= last_percent + 1:
+                last_percent = percent
+                time.time()
+
+
+def writer_loop(url, path):
+    download_stream_fast(url, path, end_progress=None)
+
+
+def measure(fn, url, path, size, runs):
+    best = None
+    for _ in range(runs):
+        cpu = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.perf_counter()
+        fn(url, path)
+        wall = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        used = (after.ru_utime - cpu.ru_utime) + (after.ru_stime - cpu.ru_stime)
+        if os.path.getsize(path) != size:
+            raise SystemExit(f"{fn.__name__}: wrote {os.path.getsize(path)} of {size} bytes")
+        os.remove(path)
+        if best is None or wall < best[0]:
+            best = (wall, used)
+    wall, used = best
+    gb = size / 1024 ** 3
+    return {"MB/s": size / wall / 1024 ** 2, "cpu_s_per_GB": used / gb}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(ports, size), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{ports.get(timeout=30)}/blob"
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_writer_"), "blob.bin")
+    try:
+        for fn in (legacy_loop, writer_loop):
+            result = measure(fn, url, path, size, args.runs)
+            print(f"{fn.__name__:<12} {result['MB/s']:8.1f} MB/s  {result['cpu_s_per_GB']:6.2f} CPU s/GB")
+    finally:
+        server.terminate()
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
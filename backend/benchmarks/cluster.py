@@ -0,0 +1,157 @@
+# benchmarks/cluster.py
+"""Two-node cluster on one host, checked end to end against the fake origin.
+
+Starts the fake origin and two backend nodes sharing SQLite stand-ins for
+Redis (job state and the Socket.IO message queue), each with its own
+downloads/ (CLUSTER_SHARED_STORAGE=0). Jobs are submitted to both nodes
+alternately and followed over Socket.IO on the *other* node; finished files
+are then fetched through the other node too. Reports how the hash ring
+spread the jobs and fails on any job that did not complete or file that
+could not be served.
+
+    cd backend && python -m benchmarks.cluster --jobs 20
+"""
+import os
+import sys
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import requests
+
+TERMINAL = ("completed", "error", "cancelled")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_node(origin, port):
+    """Body of a node process: the app with upstream traffic sent to the fake origin."""
+    import logging
+    from benchmarks.offline import offline
+    from app import create_app, socketio
+    app = create_app()
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    with offline(origin):
+        socketio.run(app, host="127.0.0.1", port=port, allow_unsafe_werkzeug=True, log_output=False)
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/api/health", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise Exception(f"{url} did not start")
+
+
+class Follower:
+    """Socket.IO client on one node collecting ``download_update`` events per job."""
+
+    def __init__(self, url):
+        import socketio
+        self.sessions = {}
+        self.done = threading.Condition()
+        self.client = socketio.Client()
+        self.client.on("download_update", self._update)
+        self.client.connect(url, transports=["polling"])
+
+    def _update(self, data):
+        with self.done:
+            self.sessions[data["download_id"]] = data["session"]
+            self.done.notify_all()
+
+    def follow(self, download_id):
+        self.client.emit("join", {"download_id": download_id})
+
+    def wait(self, ids, timeout):
+        deadline = time.monotonic() + timeout
+        with self.done:
+            while any((self.sessions.get(i) or {}).get("status") not in TERMINAL for i in ids):
+                if not self.done.wait(max(0.0, deadline - time.monotonic())):
+                    break
+        return {i: self.sessions.get(i) or {} for i in ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    from benchmarks.fake_origin import spawn
+    origin_url, origin_process = spawn()
+    workdir = tempfile.mkdtemp(prefix="bench_cluster_")
+    ports = {"a": free_port(), "b": free_port()}
+    nodes = {name: f"http://127.0.0.1:{port}" for name, port in ports.items()}
+    shared = os.path.join(workdir, "shared")
+    env = dict(
+        os.environ, PYTHONPATH=BACKEND_DIR,
+        CLUSTER_NODES=",".join(f"{name}={url}" for name, url in nodes.items()),
+        CLUSTER_STATE_URL=f"sqlite:///{shared}/state.sqlite3",
+        SOCKETIO_MESSAGE_QUEUE=f"sqlite:///{shared}/state.sqlite3",
+        CLUSTER_SHARED_STORAGE="0",
+    )
+    processes = []
+    try:
+        for name, port in ports.items():
+            node_dir = os.path.join(workdir, name)
+            os.makedirs(node_dir)
+            processes.append(subprocess.Popen(
+                [sys.executable, "-c", f"from benchmarks.cluster import serve_node; serve_node({origin_url!r}, {port})"],
+                cwd=node_dir, env=dict(env, CLUSTER_NODE_ID=name),
+            ))
+        for url in nodes.values():
+            wait_ready(url)
+
+        followers = {name: Follower(url) for name, url in nodes.items()}
+        owners, ids = Counter(), []
+        for n in range(args.jobs):
+            entry, other = ("a", "b") if n % 2 == 0 else ("b", "a")
+            r = requests.post(f"{nodes[entry]}/api/download", json={"url": f"https://www.pinterest.com/pin/{700000 + n}/", "quality": "360p"}, timeout=30)
+            r.raise_for_status()
+            download_id = r.json()["download_id"]
+            owners[r.headers.get("X-Cluster-Node", entry)] += 1
+            followers[other].follow(download_id)
+            ids.append((download_id, other))
+
+        failures = 0
+        for name, follower in followers.items():
+            mine = [i for i, node in ids if node == name]
+            for download_id, session in follower.wait(mine, args.timeout).items():
+                if session.get("status") != "completed":
+                    failures += 1
+                    print(f"job {download_id} via {name}: {session.get('status')} {session.get('message')}")
+                    continue
+                r = requests.get(nodes[name] + session["download_url"], timeout=30)
+                if r.status_code != 200 or not r.content:
+                    failures += 1
+                    print(f"file {session['download_url']} via {name}: HTTP {r.status_code}")
+        print(f"{args.jobs} jobs, owners {dict(owners)}, {failures} failure(s)")
+        for follower in followers.values():
+            follower.client.disconnect()
+        sys.exit(1 if failures else 0)
+    finally:
+        for process in processes:
+            process.terminate()
+        origin_process.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+# benchmarks/fake_origin.py
+"""Local stand-in for the CDNs and platform pages the downloaders talk to.
+
+Requests arrive as ``/<original host>/<original path>`` (see ``offline.py``,
+which rewrites outgoing URLs) and are answered from generated fixtures:
+
+* media (``.mp4``, ``.jpg``, ``.m4a``, ``/videoplayback``) with ``Range``
+  support, sized by a ``clen``/``size`` query parameter or the default;
+* canned YouTube player JSON, Instagram GraphQL/embed pages and Pinterest pin
+  pages and board resources pointing back at the media above.
+
+``Behaviour`` adds per-request latency, a per-connection throughput cap,
+mid-stream disconnects and 429s; every knob can be overridden per request
+with a query parameter of the same name.
+
+    cd backend && python -m benchmarks.fake_origin --port 8901 --latency 0.05 --rate 5000000
+"""
+import re
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+import multiprocessing
+from dataclasses import dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+DEFAULT_MEDIA_SIZE = 4 * 1024 * 1024
+IMAGE_SIZE = 256 * 1024
+WRITE_CHUNK = 64 * 1024
+PATTERN = bytes(range(256)) * 4096  # 1 MB
+
+
+@dataclass
+class Behaviour:
+    latency: float = 0.0        # seconds before the response starts
+    rate: int = 0               # bytes/second per connection, 0 = unlimited
+    drop_rate: float = 0.0      # chance a media response is cut off mid-stream
+    rate_limit: float = 0.0     # chance any request gets a 429
+    ranges: bool = True         # honour Range on media
+    media_size: int = DEFAULT_MEDIA_SIZE
+
+    def override(self, query):
+        values = {}
+        for f in fields(self):
+            if f.name in query:
+                raw = query[f.name][0]
+                values[f.name] = raw.lower() in ("1", "true", "yes") if f.type in (bool, "bool") else type(getattr(self, f.name))(raw)
+        return Behaviour(**{**self.__dict__, **values})
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.rate_limited = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def snapshot(self):
+        with self._lock:
+            return {"requests": self.requests, "bytes_sent": self.bytes_sent, "dropped": self.dropped, "rate_limited": self.rate_limited}
+
+
+def media_bytes(start, end):
+    """Deterministic fixture content for byte range ``[start, end]`` (same bytes on every request)."""
+    out = bytearray()
+    pos = start
+    while pos <= end:
+        offset = pos % len(PATTERN)
+        piece = PATTERN[offset:offset + (end + 1 - pos)]
+        out += piece
+        pos += len(piece)
+    return bytes(out)
+
+
+# ------------ Canned platform responses ------------
+def youtube_player(video_id, size):
+    """Innertube ``player`` response with one progressive and two adaptive, unciphered streams."""
+    expire = int(time.time()) + 6 * 3600
+
+    def fmt(itag, mime, quality, label, bitrate, extra):
+        clen = size if "video" in mime else size // 8
+        url = f"https://rr1---sn-bench.googlevideo.com/videoplayback?id={video_id}&itag={itag}&expire={expire}&clen={clen}"
+        return dict({
+            "itag": itag, "url": url, "mimeType": mime, "bitrate": bitrate, "contentLength": str(clen),
+            "quality": quality, "qualityLabel": label, "approxDurationMs": "60000", "lastModified": "1",
+        }, **extra)
+
+    return {
+        "playabilityStatus": {"status": "OK"},
+        "playerConfig": {"mediaCommonConfig": {"mediaUstreamerRequestConfig": {"videoPlaybackUstreamerConfig": ""}}},
+        "videoDetails": {
+            "videoId": video_id, "title": f"Bench video {video_id}", "lengthSeconds": "60", "author": "bench",
+            "channelId": "UCbench", "shortDescription": "", "viewCount": "1", "thumbnail": {"thumbnails": []},
+        },
+        "streamingData": {
+            "expiresInSeconds": "21540",
+            "formats": [
+                fmt(18, 'video/mp4; codecs="avc1.42001E, mp4a.40.2"', "medium", "360p", 500000,
+                    {"width": 640, "height": 360, "fps": 30, "audioQuality": "AUDIO_QUALITY_LOW", "audioSampleRate": "44100", "audioChannels": 2}),
+            ],
+            "adaptiveFormats": [
+                fmt(136, 'video/mp4; codecs="avc1.4d401f"', "hd720", "720p", 1500000, {"width": 1280, "height": 720, "fps": 30}),
+                fmt(140, 'audio/mp4; codecs="mp4a.40.2"', "tiny", None, 130000,
+                    {"audioQuality": "AUDIO_QUALITY_MEDIUM", "audioSampleRate": "44100", "audioChannels": 2}),
+            ],
+        },
+    }
+
+
+def instagram_embed(shortcode):
+    video = f"https://scontent.cdninstagram.com/v/t50/{shortcode}.mp4"
+    return f'<html><body><script>window.__additionalData = {{"shortcode_media":{{"video_url":"{video}"}}}};</script></body></html>'
+
+
+def pinterest_pin(pin_id, video):
+    if video:
+        media = f'"video_url":"https://v1.pinimg.com/videos/mc/720p/{pin_id}.mp4"'
+    else:
+        media = f'"images":{{"orig":{{"url":"https://i.pinimg.com/originals/{pin_id}.jpg"}}}}'
+    return f'<html><head><meta property="og:title" content="Bench pin {pin_id}"></head><body><script>{{"title":"Bench pin {pin_id}",{media}}}</script></body></html>'
+
+
+def pinterest_board_page(slug, bookmark, page_size, pages):
+    page = int(bookmark or 0)
+    pins = []
+    for i in range(page_size):
+        pin_id = f"{zlib.crc32(slug.encode()) % 10 ** 6}{page:03d}{i:03d}"
+        pins.append({"id": pin_id, "type": "pin", "images": {"orig": {"url": f"https://i.pinimg.com/originals/{pin_id}.jpg"}}})
+    next_bookmark = str(page + 1) if page + 1 < pages else "-end-"
+    return {"resource_response": {"data": pins, "bookmark": next_bookmark}}
+
+
+# ------------ Server ------------
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._dispatch(head=True)
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self._dispatch()
+
+    def _dispatch(self, head=False):
+        origin = self.server.origin
+        if self.path == "/_stats":
+            return self._json(origin.stats.snapshot())
+        parts = urlsplit(self.path)
+        host, _, path = parts.path.lstrip("/").partition("/")
+        path = "/" + path
+        query = parse_qs(parts.query)
+        behaviour = origin.behaviour.override(query)
+        origin.stats.add(requests=1)
+        if behaviour.latency:
+            time.sleep(behaviour.latency)
+        if behaviour.rate_limit and random.random() < behaviour.rate_limit:
+            origin.stats.add(rate_limited=1)
+            return self._send(429, b'{"message":"Please wait a few minutes"}', "application/json", {"Retry-After": "1"})
+
+        if re.search(r"\.(mp4|jpg|m4a)$", path) or path.startswith("/videoplayback"):
+            size = int((query.get("clen") or query.get("size") or [0])[0]) or (IMAGE_SIZE if path.endswith(".jpg") else behaviour.media_size)
+            content_type = "image/jpeg" if path.endswith(".jpg") else "video/mp4"
+            return self._media(size, content_type, behaviour, head)
+        if "youtube" in host and path.startswith("/youtubei/v1/player"):
+            video_id = (query.get("videoId") or ["bench0000000"])[0]
+            return self._json(youtube_player(video_id, behaviour.media_size))
+        if "instagram" in host:
+            m = re.match(r"/(?:p|reel)/([\w-]+)/embed", path)
+            if m:
+                return self._send(200, instagram_embed(m.group(1)).encode(), "text/html")
+            # GraphQL and API calls fail so the app falls back to the embed page, as it does for logged-out scraping
+            return self._send(404, b'{"status":"fail"}', "application/json")
+        if "pinterest" in host:
+            m = re.match(r"/pin/(\d+)", path)
+            if m:
+                video = int(m.group(1)) % 2 == 0 if "video" not in query else query["video"][0] == "1"
+                return self._send(200, pinterest_pin(m.group(1), video).encode(), "text/html")
+            if path.startswith("/resource/BoardResource/"):
+                return self._json({"resource_response": {"data": {"id": "board", "pin_count": origin.board_pages * 25}}})
+            if path.startswith("/resource/BoardFeedResource/"):
+                data = json.loads((query.get("data") or ["{}"])[0])
+                options = data.get("options", {})
+                bookmark = (options.get("bookmarks") or [None])[0]
+                return self._json(pinterest_board_page(options.get("board_url", ""), bookmark, options.get("page_size", 25), origin.board_pages))
+        return self._send(404, b"not found", "text/plain")
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.origin.stats.add(bytes_sent=len(body))
+
+    def _json(self, data):
+        self._send(200, json.dumps(data).encode(), "application/json")
+
+    def _media(self, size, content_type, behaviour, head):
+        start, end, partial = 0, size - 1, False
+        m = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if m and behaviour.ranges:
+            start = int(m.group(1) or 0)
+            end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            partial = True
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(206 if partial else 200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Accept-Ranges", "bytes" if behaviour.ranges else "none")
+        self.send_header("Content-Length", str(end - start + 1))
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head:
+            return
+        cut = None
+        if behaviour.drop_rate and random.random() < behaviour.drop_rate:
+            cut = start + random.randint(0, end - start)
+        pos, began = start, time.monotonic()
+        try:
+            while pos <= end:
+                stop = min(pos + WRITE_CHUNK, end + 1)
+                if cut is not None and stop > cut:
+                    self.wfile.write(media_bytes(pos, cut - 1) if cut > pos else b"")
+                    self.server.origin.stats.add(dropped=1)
+                    self.close_connection = True
+                    return
+                self.wfile.write(media_bytes(pos, stop - 1))
+                self.server.origin.stats.add(bytes_sent=stop - pos)
+                pos = stop
+                if behaviour.rate:
+                    ahead = (pos - start) / behaviour.rate - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class FakeOrigin:
+    """Threaded HTTP server on 127.0.0.1 serving the fixtures above."""
+
+    def __init__(self, behaviour=None, port=0, board_pages=2):
+        self.behaviour = behaviour or Behaviour()
+        self.stats = Stats()
+        self.board_pages = board_pages
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.origin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-origin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _serve_forever(behaviour, board_pages, urls):
+    origin = FakeOrigin(behaviour, board_pages=board_pages).start()
+    urls.put(origin.url)
+    origin._thread.join()
+
+
+def spawn(behaviour=None, board_pages=2):
+    """Run a ``FakeOrigin`` in a child process so its CPU stays out of the caller's numbers.
+
+    Returns ``(url, process)``; counters are served at ``<url>/_stats``.
+    """
+    urls = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve_forever, args=(behaviour or Behaviour(), board_pages, urls), daemon=True)
+    process.start()
+    return urls.get(timeout=30), process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake origin standalone.")
+    parser.add_argument("--port", type=int, default=8901)
+    for f in fields(Behaviour):
+        parser.add_argument(f"--{f.name.replace('_', '-')}", type=int if f.type in (int, "int") else float if f.type in (float, "float") else str, default=None)
+    args = parser.parse_args()
+    overrides = {f.name: getattr(args, f.name) for f in fields(Behaviour) if getattr(args, f.name) is not None}
+    if "ranges" in overrides:
+        overrides["ranges"] = str(overrides["ranges"]).lower() in ("1", "true", "yes")
+    origin = FakeOrigin(Behaviour(**overrides), port=args.port).start()
+    print(f"Fake origin on {origin.url} (requests look like {origin.url}/www.pinterest.com/pin/123/)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        origin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/import_budget.py
+"""Startup import budget: time ``import app.routes`` with ``python -X importtime``.
+
+Each run is a fresh interpreter in an empty working directory. Exits non-zero
+when the median cumulative import time exceeds the budget, when a platform
+library (pytubefix, instaloader) or platform module is imported at startup,
+or when importing creates directories or starts threads.
+
+    cd backend && python -m benchmarks.import_budget --budget-ms 1000 --runs 5
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported on first use through app.platforms, never at startup
+LAZY_MODULES = ("pytubefix", "instaloader", "app.platforms.youtube", "app.platforms.instagram",
+                "app.platforms.pinterest", "app.youtube_cache", "app.instaloader_pool", "app.range_proxy")
+
+PROBE = """
+import os, sys, json, threading
+import {target}
+print(json.dumps({{
+    "lazy_loaded": [m for m in {lazy!r} if m in sys.modules],
+    "created": sorted(os.listdir(".")),
+    "threads": [t.name for t in threading.enumerate() if t is not threading.main_thread()],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """``{module: (self_us, cumulative_us)}`` and the total of the top-level imports, in ms."""
+    modules = {}
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative_us)
+    return modules, total_us / 1000
+
+
+def measure(target):
+    workdir = tempfile.mkdtemp(prefix="import_budget_")
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, PYTHONDONTWRITEBYTECODE="1")
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE.format(target=target, lazy=LAZY_MODULES)],
+            cwd=workdir, env=env, capture_output=True, text=True, timeout=120,
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"import {target} failed:\n{proc.stderr[-2000:]}")
+    modules, total_ms = parse_importtime(proc.stderr)
+    return total_ms, modules, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="app.routes", help="module whose import is measured")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", "1000")))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list (by self time)")
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(max(1, args.runs)):
+        total_ms, modules, probe = measure(args.target)
+        totals.append(total_ms)
+    median = statistics.median(totals)
+
+    print(f"import {args.target}: median {median:.1f} ms over {len(totals)} runs (budget {args.budget_ms:.0f} ms)")
+    for name, (self_us, cumulative_us) in sorted(modules.items(), key=lambda kv: -kv[1][0])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms self  {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"median import time {median:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    if probe["lazy_loaded"]:
+        failures.append(f"imported at startup instead of on first use: {', '.join(probe['lazy_loaded'])}")
+    if probe["created"]:
+        failures.append(f"import created files/directories: {', '.join(probe['created'])}")
+    if probe["threads"]:
+        failures.append(f"import started threads: {', '.join(probe['threads'])}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
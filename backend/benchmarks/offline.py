@@ -0,0 +1,60 @@
+# benchmarks/offline.py
+"""Point the app's upstream traffic at a ``FakeOrigin`` for the duration of a block.
+
+Every ``requests`` call to a platform or CDN host is rewritten to
+``<origin>/<host>/<path>``; pytubefix's Innertube lookup is replaced by the
+origin's canned player JSON (no base.js, no signature work), so the YouTube
+adapter and the shared pipeline run unchanged.
+"""
+import re
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+UPSTREAM_HOSTS = re.compile(r"(^|\.)(youtube\.com|youtu\.be|googlevideo\.com|ytimg\.com|instagram\.com|cdninstagram\.com|fbcdn\.net|pinterest\.[a-z.]+|pinimg\.com)$")
+
+
+def rewrite(url, origin):
+    parts = urlsplit(url)
+    if not parts.hostname or not UPSTREAM_HOSTS.search(parts.hostname):
+        return url
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{origin}/{parts.hostname}{parts.path or '/'}{query}"
+
+
+def _bench_youtube(origin):
+    from pytubefix import YouTube, extract
+
+    class BenchYouTube(YouTube):
+        """``YouTube`` fed from the origin's canned player response with an unciphered client."""
+
+        def __init__(self, url, *args, **kwargs):
+            super().__init__(url, client="ANDROID_VR")
+            r = requests.get(f"https://www.youtube.com/youtubei/v1/player?videoId={extract.video_id(url)}", timeout=15)
+            r.raise_for_status()
+            self.vid_info = r.json()
+
+    return BenchYouTube
+
+
+@contextmanager
+def offline(origin):
+    """Route upstream HTTP for every platform module to ``origin`` (a ``FakeOrigin`` URL)."""
+    from app import youtube_cache
+
+    original_send = HTTPAdapter.send
+    original_youtube = youtube_cache.YouTube
+
+    def send(self, request, *args, **kwargs):
+        request.url = rewrite(request.url, origin)
+        return original_send(self, request, *args, **kwargs)
+
+    HTTPAdapter.send = send
+    youtube_cache.YouTube = _bench_youtube(origin)
+    try:
+        yield origin
+    finally:
+        HTTPAdapter.send = original_send
+        youtube_cache.YouTube = original_youtube
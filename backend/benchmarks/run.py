@@ -0,0 +1,229 @@
+# benchmarks/run.py
+"""End-to-end load test of the download, proxy and ZIP paths against the fake origin.
+
+Runs in a scratch working directory (so ``downloads/`` is throwaway), drives
+the Flask app in-process and reports, per scenario: jobs/sec, p50/p99
+latency, failures, peak RSS and app CPU seconds per GB moved from the origin.
+
+    cd backend && python -m benchmarks.run --scenario pinterest --scenario proxy-video --jobs 50
+    cd backend && python -m benchmarks.run --latency 0.05 --rate 10000000 --drop-rate 0.1 --rate-limit 0.02 --json out.json
+
+YouTube at qualities without a progressive stream, resizing and audio
+companions need ffmpeg on PATH. ``--workers N`` runs jobs in N worker
+processes (JOB_QUEUE=sqlite); CPU s/GB then only counts the web process.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import requests
+
+from benchmarks.fake_origin import Behaviour, spawn
+from benchmarks.offline import offline
+
+SCENARIOS = ["youtube", "instagram", "pinterest", "pinterest-board", "proxy-video", "proxy-image", "zip"]
+TERMINAL = ("completed", "error", "cancelled")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except OSError:
+        return 0.0
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Bench:
+    def __init__(self, app, origin_url, quality):
+        self.app = app
+        self.origin_url = origin_url
+        self.quality = quality
+        self._local = threading.local()
+        self._seq = 0
+        self._seq_lock = threading.Lock()
+
+    def client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def unique(self):
+        with self._seq_lock:
+            self._seq += 1
+            return self._seq
+
+    def origin_bytes(self):
+        return requests.get(f"{self.origin_url}/_stats", timeout=5).json()["bytes_sent"]
+
+    # ------------ job scenarios ------------
+    def job_url(self, scenario):
+        n = self.unique()
+        if scenario == "youtube":
+            return f"https://www.youtube.com/watch?v=bench{n:06d}", "youtube"
+        if scenario == "instagram":
+            return f"https://www.instagram.com/p/Bench{n:06d}/", "instagram"
+        if scenario == "pinterest":
+            return f"https://www.pinterest.com/pin/{900000 + n}/", "pinterest"
+        return f"https://www.pinterest.com/benchuser/board-{n}/", "pinterest"
+
+    def run_job(self, scenario):
+        from app.config import download_sessions
+        url, platform = self.job_url(scenario)
+        started = time.monotonic()
+        r = self.client().post("/api/download", json={"url": url, "platform": platform, "quality": self.quality})
+        download_id = r.get_json()["download_id"]
+        while True:
+            status = (download_sessions.get(download_id) or {}).get("status")
+            if status in TERMINAL:
+                return time.monotonic() - started, status == "completed"
+            time.sleep(0.01)
+
+    # ------------ request scenarios ------------
+    def run_proxy(self, kind):
+        n = self.unique()
+        if kind == "proxy-video":
+            path = f"/api/proxy-video?url=https://v1.pinimg.com/videos/mc/720p/{n}.mp4"
+        else:
+            path = f"/api/proxy-image?url=https://i.pinimg.com/originals/{n}.jpg"
+        started = time.monotonic()
+        r = self.client().get(path, buffered=False)
+        for _ in r.response:
+            pass
+        r.close()
+        return time.monotonic() - started, r.status_code == 200
+
+    def run_zip(self, _):
+        from app.config import download_sessions
+        base = 800000 + self.unique() * 100
+        urls = [f"https://www.pinterest.com/pin/{base + i}/" for i in range(5)]
+        started = time.monotonic()
+        batch_id = self.client().post("/api/download/batch", json={"urls": urls, "zip": True, "quality": self.quality}).get_json()["batch_id"]
+        while (download_sessions.get(batch_id) or {}).get("status") not in TERMINAL:
+            time.sleep(0.01)
+        r = self.client().get(f"/api/download/batch/{batch_id}/zip", buffered=False)
+        size = sum(len(chunk) for chunk in r.response)
+        r.close()
+        files = download_sessions[batch_id].get("items") or []
+        names = [f"pinterest_{base + i}{ext}" for i in range(5) for ext in (".mp4", ".jpg")]
+        query = "&".join(f"files[]={name}" for name in names)
+        r2 = self.client().get(f"/api/download-zip?platform=pinterest&{query}")
+        return time.monotonic() - started, r.status_code == 200 and size > 0 and r2.status_code == 200 and len(files) == 5
+
+    def scenario(self, name, jobs, concurrency):
+        if name in ("proxy-video", "proxy-image"):
+            task = self.run_proxy
+        elif name == "zip":
+            task = self.run_zip
+        else:
+            task = self.run_job
+        bytes_before = self.origin_bytes()
+        cpu_before = cpu_seconds()
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda _: task(name), range(jobs)))
+        wall = time.monotonic() - started
+        cpu = cpu_seconds() - cpu_before
+        moved = self.origin_bytes() - bytes_before
+        latencies = [latency for latency, _ in results]
+        return {
+            "scenario": name,
+            "jobs": jobs,
+            "failed": sum(1 for _, ok in results if not ok),
+            "jobs_per_sec": jobs / wall if wall else 0.0,
+            "p50_s": percentile(latencies, 50),
+            "p99_s": percentile(latencies, 99),
+            "gb_moved": moved / 1024 ** 3,
+            "cpu_s_per_gb": cpu / (moved / 1024 ** 3) if moved else 0.0,
+            "rss_mb": rss_mb(),
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="repeatable; default: all")
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8, help="simultaneous client requests / submitted jobs")
+    parser.add_argument("--quality", default="360p")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate", type=int, default=0, help="origin bytes/second per connection")
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="chance of a 429 per origin request")
+    parser.add_argument("--media-mb", type=float, default=4)
+    parser.add_argument("--board-pages", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=0, help="worker processes consuming a JOB_QUEUE=sqlite queue (0 = in-process executor)")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    behaviour = Behaviour(
+        latency=args.latency, rate=args.rate, drop_rate=args.drop_rate,
+        rate_limit=args.rate_limit, media_size=int(args.media_mb * 1024 * 1024),
+    )
+    origin_url, origin_process = spawn(behaviour, args.board_pages)
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = tempfile.mkdtemp(prefix="bench_run_")
+    os.chdir(workdir)  # config.DOWNLOADS_DIR is relative to the working directory
+    workers = []
+    if args.workers:
+        os.environ.update(JOB_QUEUE="sqlite", WORKER_PROCESSES="0")
+        env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+        workers = [
+            subprocess.Popen([sys.executable, "-m", "benchmarks.worker", origin_url, "--id", f"bench{i}", "--parent", str(os.getpid())], env=env)
+            for i in range(args.workers)
+        ]
+    import logging
+    from app import create_app
+    app = create_app()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    results = []
+    try:
+        with offline(origin_url):
+            bench = Bench(app, origin_url, args.quality)
+            for name in args.scenario or SCENARIOS:
+                result = bench.scenario(name, args.jobs, args.concurrency)
+                results.append(result)
+                print(
+                    f"{name:<16} {result['jobs_per_sec']:7.2f} jobs/s  p50 {result['p50_s']:6.3f}s  p99 {result['p99_s']:6.3f}s  "
+                    f"failed {result['failed']:3d}  {result['cpu_s_per_gb']:6.2f} CPU s/GB  rss {result['rss_mb']:6.1f} MB",
+                    flush=True,
+                )
+    finally:
+        origin_process.terminate()
+        for worker in workers:
+            worker.terminate()
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+# benchmarks/worker.py
+"""``python -m app.worker`` with upstream traffic routed to a fake origin (see ``run.py --workers``).
+
+    python -m benchmarks.worker http://127.0.0.1:8901 --id bench0
+"""
+import sys
+
+from benchmarks.offline import offline
+
+
+def main():
+    origin = sys.argv.pop(1)
+    from app.worker import main as worker_main
+    with offline(origin):
+        worker_main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# app.config puts downloads/ (and the job queue) under the working directory at import time
+_WORKDIR = tempfile.mkdtemp(prefix="downloader_tests_")
+os.chdir(_WORKDIR)
+
+
+@pytest.fixture
+def sessions():
+    """The shared session registry and cancel flags, emptied after the test."""
+    from app.config import download_sessions, download_cancel_flags
+    yield download_sessions
+    for download_id in list(download_sessions):
+        download_sessions.pop(download_id, None)
+    for download_id in list(dict.keys(download_cancel_flags)):
+        download_cancel_flags.pop(download_id, None)
+
+
+@pytest.fixture(scope="session")
+def flask_app():
+    """The app with Socket.IO bound, so code that emits can run."""
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def origin():
+    """A fake CDN/platform origin (benchmarks.fake_origin) receiving all upstream HTTP."""
+    from benchmarks.fake_origin import FakeOrigin, Behaviour
+    from benchmarks.offline import offline
+    with FakeOrigin(Behaviour(media_size=64 * 1024), board_pages=2) as fake, offline(fake.url):
+        yield fake
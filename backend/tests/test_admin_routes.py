@@ -0,0 +1,113 @@
+# tests/test_admin_routes.py
+import threading
+import time
+
+import pytest
+
+from app.bandwidth import BandwidthManager, FairBucket
+from app.cancellation import CancelToken, DownloadCancelled
+from app.routes import admin_routes
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+def test_admin_is_closed_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "")
+    response = client.get("/api/admin/bandwidth", headers={"X-Admin-Token": ""})
+    assert response.status_code == 403
+    assert "disabled" in response.get_json()["error"]
+
+
+def test_admin_rejects_a_wrong_or_missing_token(client, monkeypatch):
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/api/admin/bandwidth").status_code == 403
+    assert client.get("/api/admin/bandwidth", headers={"X-Admin-Token": "s3cre"}).status_code == 403
+    assert client.post("/api/admin/profile", json={"seconds": 1}, headers={"X-Admin-Token": "nope"}).status_code == 403
+
+
+def test_admin_sets_limits_with_the_right_token(client, monkeypatch):
+    manager = BandwidthManager()
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(admin_routes, "bandwidth", manager)
+    headers = {"X-Admin-Token": "s3cret"}
+
+    response = client.post("/api/admin/bandwidth", json={"global": 1000, "platforms": {"youtube": 500}}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["limits"]["global"] == 1000
+    assert manager.limits()["platforms"] == {"youtube": 500}
+
+    response = client.post("/api/admin/bandwidth", json={"global": "fast"}, headers=headers)
+    assert response.status_code == 400
+
+
+def test_unlimited_bucket_never_blocks():
+    bucket = FairBucket(0)
+    started = time.monotonic()
+    bucket.acquire("a", 10 ** 9)
+    assert time.monotonic() - started < 0.1
+    assert bucket.stats()["granted_bytes"] == 10 ** 9
+
+
+def test_bucket_holds_flows_to_its_rate():
+    bucket = FairBucket(100_000)
+    started = time.monotonic()
+    for _ in range(10):
+        bucket.acquire("a", 10_000)
+    # 50 KB of burst, then 50 KB at 100 KB/s
+    assert 0.35 < time.monotonic() - started < 1.5
+
+
+def test_bucket_shares_rate_by_weight():
+    bucket = FairBucket(200_000)
+    bucket.tokens = 0
+    granted = {"heavy": 0, "light": 0}
+    stop = threading.Event()
+
+    def flow(name, weight):
+        while not stop.is_set():
+            bucket.acquire(name, 2_000, weight)
+            granted[name] += 2_000
+
+    threads = [threading.Thread(target=flow, args=("heavy", 3.0)), threading.Thread(target=flow, args=("light", 1.0))]
+    for thread in threads:
+        thread.start()
+    time.sleep(1.0)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    ratio = granted["heavy"] / max(granted["light"], 1)
+    assert 2.0 < ratio < 4.5
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    bucket = FairBucket(1_000)
+    bucket.tokens = -10_000
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    with pytest.raises(DownloadCancelled):
+        bucket.acquire("a", 1_000, token=token)
+    assert bucket.stats()["waiting"] == 0
+
+
+def test_lowering_the_rate_to_unlimited_releases_waiters():
+    bucket = FairBucket(1_000)
+    bucket.tokens = -100_000
+    done = threading.Event()
+    threading.Thread(target=lambda: (bucket.acquire("a", 1_000), done.set())).start()
+    time.sleep(0.1)
+    assert not done.is_set()
+    bucket.set_rate(0)
+    assert done.wait(2)
+
+
+def test_client_overrides_apply_to_existing_buckets():
+    manager = BandwidthManager(client_rate=1_000)
+    manager.throttle("job", 1, client="sid-1")
+    manager.set_limits(clients={"sid-1": 5_000})
+    assert manager.stats()["clients"]["sid-1"]["rate"] == 5_000
+    manager.set_limits(clients={"sid-1": None})
+    assert manager.stats()["clients"]["sid-1"]["rate"] == 1_000
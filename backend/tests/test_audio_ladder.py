@@ -0,0 +1,62 @@
+# tests/test_audio_ladder.py
+import os
+
+import pytest
+
+from app import audio_ladder
+from app.audio_ladder import build_ladder, cached_variants, normalize_bitrates
+from app.output_cache import AudioVariantCache
+
+
+def test_normalize_bitrates():
+    assert normalize_bitrates() == ["192k"]
+    assert normalize_bitrates("128K") == ["128k"]
+    assert normalize_bitrates(["320k", "128k", "320k"]) == ["320k", "128k"]
+    with pytest.raises(Exception, match="Unsupported audio bitrate: 96k"):
+        normalize_bitrates(["128k", "96k"])
+
+
+@pytest.fixture
+def encodes(tmp_path, monkeypatch):
+    """Swap ffmpeg for a recorder that writes each requested output."""
+    runs = []
+
+    def transcode(source, args, download_id=None, cleanup=(), **kwargs):
+        runs.append((source, args))
+        for tmp in cleanup:
+            with open(tmp, "wb") as f:
+                f.write(b"audio")
+
+    monkeypatch.setattr(audio_ladder, "transcode_stream", transcode)
+    monkeypatch.setattr(audio_ladder, "audio_cache", AudioVariantCache(str(tmp_path / "variants.json")))
+    return runs
+
+
+def test_missing_variants_come_out_of_one_encode(encodes):
+    files = build_ladder("song.m4a", "youtube", "ladder00001", "Song", ["320k", "128k"])
+    assert files == {"320k": "Song_320k.mp3", "128k": "Song_128k.mp3"}
+    assert len(encodes) == 1
+    source, args = encodes[0]
+    assert source == "song.m4a"
+    assert [args[i + 1] for i, arg in enumerate(args) if arg == "-b:a"] == ["320k", "128k"]
+    folder = audio_ladder.get_download_path("youtube")
+    assert all(os.path.exists(os.path.join(folder, name)) for name in files.values())
+    assert cached_variants("youtube", "ladder00001", ["128k", "320k"]) == {"128k": "Song_128k.mp3", "320k": "Song_320k.mp3"}
+
+
+def test_cached_variants_are_not_encoded_again(encodes):
+    build_ladder("song.m4a", "youtube", "ladder00002", "Tune", ["192k"])
+    files = build_ladder("song.m4a", "youtube", "ladder00002", "Tune", ["256k", "192k"])
+    assert files == {"256k": "Tune_256k.mp3", "192k": "Tune_192k.mp3"}
+    assert len(encodes) == 2
+    assert "192k" not in encodes[1][1]  # the second run only encodes the new bitrate
+    assert build_ladder("song.m4a", "youtube", "ladder00002", "Tune", ["192k", "256k"]) == {"192k": "Tune_192k.mp3", "256k": "Tune_256k.mp3"}
+    assert len(encodes) == 2
+    assert cached_variants("youtube", "ladder00002", ["192k", "320k"]) is None
+
+
+def test_other_codecs_use_their_own_muxer(encodes):
+    files = build_ladder("song.m4a", "youtube", "ladder00003", "Song", ["128k"], codec="aac")
+    assert files == {"128k": "Song_128k.m4a"}
+    args = encodes[0][1]
+    assert args[args.index("-c:a") + 1] == "aac" and args[args.index("-f") + 1] == "ipod"
@@ -0,0 +1,146 @@
+# tests/test_batch_jobs.py
+import io
+import zipfile
+
+from app import batch_jobs
+from app.batch_jobs import plan_batch, iter_zip, start_batch, run_batch, _new_parent, _attach_child
+
+
+def test_plan_batch_dedupes_and_orders_smallest_first():
+    items = [
+        {"url": "https://www.youtube.com/watch?v=abcdefghijk"},
+        {"url": "https://www.pinterest.com/pin/123/"},
+        {"url": "https://youtu.be/abcdefghijk"},
+        {"url": "https://youtu.be/abcdefghijk", "quality": "360p"},
+    ]
+    jobs, positions = plan_batch(items, "1080p")
+    assert len(jobs) == 3
+    assert jobs[0]["platform"] == "pinterest"
+    # both spellings of the same video at the same quality share one job
+    assert positions[0] == positions[2] != positions[3]
+    assert [jobs[p]["quality"] for p in positions] == ["1080p", "1080p", "1080p", "360p"]
+
+
+def test_iter_zip_streams_a_valid_archive(tmp_path):
+    files = []
+    for n, size in enumerate((0, 1000, 3 * 1024 * 1024 + 7)):
+        path = tmp_path / f"f{n}.bin"
+        path.write_bytes(bytes([n]) * size)
+        files.append((f"dir/f{n}.bin", str(path)))
+    data = b"".join(iter_zip(files, chunk_size=64 * 1024))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == [name for name, _ in files]
+        assert len(zf.read("dir/f2.bin")) == 3 * 1024 * 1024 + 7
+
+
+def _wait_for(predicate, timeout=5):
+    import time
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_batch_runs_children_and_aggregates(flask_app, sessions):
+    def worker(download_id, url, platform, quality):
+        sessions[download_id].update({"status": "completed", "progress": 100, "downloaded_bytes": 10, "total_bytes": 10})
+
+    batch_id = start_batch([{"url": f"https://www.pinterest.com/pin/{n}/"} for n in range(3)], worker, fan_out=2)
+    assert _wait_for(lambda: sessions[batch_id]["status"] == "completed")
+    parent = sessions[batch_id]
+    assert (parent["completed"], parent["failed"], parent["downloaded_bytes"]) == (3, 0, 30)
+    assert len(parent["items"]) == 3
+
+
+class _Source:
+    def __init__(self, jobs):
+        self.jobs = iter(jobs)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.jobs)
+
+    def close(self):
+        self.closed = True
+
+
+def test_submit_failure_ends_the_batch_and_releases_everything(flask_app, sessions, monkeypatch):
+    from app.config import download_cancel_flags
+
+    def broken_submit(*args, **kwargs):
+        raise RuntimeError("queue is locked")
+
+    monkeypatch.setattr(batch_jobs, "submit_download", broken_submit)
+    batch_id = "batch-broken"
+    _new_parent(batch_id, False, total=2)
+    jobs = [{"url": f"https://www.pinterest.com/pin/{n}/", "platform": "pinterest", "quality": "1080p", "canonical_url": str(n)} for n in range(2)]
+    for job in jobs:
+        _attach_child(batch_id, job)
+    source = _Source(jobs)
+    token = download_cancel_flags.token(batch_id)
+
+    run_batch(batch_id, source, lambda *a: None, fan_out=2)
+
+    parent = sessions[batch_id]
+    assert parent["status"] == "error" and "queue is locked" in parent["message"]
+    assert all(sessions[c]["status"] == "error" for c in parent["children"])
+    assert source.closed
+    assert not token._callbacks
+    assert dict.get(download_cancel_flags, batch_id) is None
+
+
+def test_cancelled_batch_cancels_queued_children(flask_app, sessions):
+    from app.config import download_cancel_flags
+    batch_id = "batch-cancelled"
+    _new_parent(batch_id, False, total=1)
+    job = {"url": "https://www.pinterest.com/pin/1/", "platform": "pinterest", "quality": "1080p", "canonical_url": "1"}
+    _attach_child(batch_id, job)
+    download_cancel_flags[batch_id] = True
+    run_batch(batch_id, iter([]), lambda *a: None, fan_out=1)
+    assert sessions[batch_id]["status"] == "cancelled"
+    assert sessions[job["download_id"]]["status"] == "cancelled"
+
+
+def test_finish_failure_still_marks_error(flask_app, sessions, monkeypatch):
+    batch_id = "batch-refresh"
+    _new_parent(batch_id, False, total=0)
+    calls = []
+
+    def refresh(batch_id, force=False):
+        calls.append(batch_id)
+        if len(calls) > 1:
+            raise RuntimeError("emit failed")
+
+    monkeypatch.setattr(batch_jobs, "refresh_batch", refresh)
+    run_batch(batch_id, iter([]), lambda *a: None, fan_out=1)
+    assert sessions[batch_id]["status"] == "error"
+
+
+def test_stream_batch_pulls_lazily_and_skips_cached_items(flask_app, sessions):
+    pulled, ran, finished = [], [], []
+
+    def source():
+        for n in range(4):
+            pulled.append(n)
+            cached = {"files": [f"pin{n}.jpg"]} if n == 1 else None
+            yield {"url": f"https://www.pinterest.com/pin/{n}/", "platform": "pinterest", "quality": "original",
+                   "canonical_url": str(n), "cached": cached}
+
+    def worker(download_id, url, platform, quality):
+        # nothing past the next free slot has been listed yet
+        assert len(pulled) <= len(ran) + 2
+        ran.append(url)
+        sessions[download_id].update({"status": "completed", "progress": 100})
+
+    batch_id = batch_jobs.start_stream_batch(source(), worker, fan_out=1, on_done=finished.append)
+    assert _wait_for(lambda: sessions[batch_id]["status"] == "completed")
+    parent = sessions[batch_id]
+    assert len(ran) == 3 and "https://www.pinterest.com/pin/1/" not in ran
+    assert (parent["total"], parent["completed"], parent["enumerating"]) == (4, 4, False)
+    assert finished == [parent]
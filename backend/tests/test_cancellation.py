@@ -0,0 +1,88 @@
+# tests/test_cancellation.py
+import time
+import threading
+
+import pytest
+
+from app.cancellation import CancelToken, CancelFlags, DownloadCancelled
+
+
+def test_cancel_runs_callbacks_once():
+    token, calls = CancelToken(), []
+    handle = token.register(lambda: calls.append("a"))
+    token.register(lambda: calls.append("b"))
+    token.unregister(handle)
+    token.cancel()
+    token.cancel()
+    assert calls == ["b"]
+    assert token.cancelled
+    with pytest.raises(DownloadCancelled):
+        token.raise_if_cancelled()
+
+
+def test_register_after_cancel_runs_immediately():
+    token, calls = CancelToken(), []
+    token.cancel()
+    assert token.register(lambda: calls.append(1)) is None
+    assert calls == [1]
+
+
+def test_failing_callback_does_not_stop_the_others():
+    token, calls = CancelToken(), []
+    token.register(lambda: 1 / 0)
+    token.register(lambda: calls.append(1))
+    token.cancel()
+    assert calls == [1]
+
+
+def test_wait_wakes_on_cancel():
+    token = CancelToken()
+    assert token.wait(0.01) is False
+    threading.Timer(0.05, token.cancel).start()
+    t0 = time.monotonic()
+    assert token.wait(2) is True
+    assert time.monotonic() - t0 < 1
+
+
+def test_on_cancel_unregisters_on_exit():
+    token, calls = CancelToken(), []
+    with token.on_cancel(lambda: calls.append(1)):
+        pass
+    token.cancel()
+    assert calls == []
+
+
+def test_flags_keep_dict_membership():
+    flags = CancelFlags()
+    token = flags.token("job")
+    assert "job" in flags
+    assert flags.get("job") is False and not flags.is_cancelled("job")
+    assert flags.get("other") is None and "other" not in flags
+    flags["job"] = True
+    assert token.cancelled and flags.get("job") and flags.is_cancelled("job") and flags["job"]
+
+
+def test_setting_a_flag_before_the_token_exists_cancels_it():
+    flags = CancelFlags()
+    flags["job"] = True
+    assert flags.token("job").cancelled
+
+
+def test_pop_starts_over_with_a_fresh_token():
+    flags = CancelFlags()
+    flags["job"] = True
+    assert flags.pop("job") is True
+    assert flags.pop("job", None) is None
+    with pytest.raises(KeyError):
+        flags.pop("job")
+    assert not flags.token("job").cancelled
+
+
+def test_release_keeps_only_cancelled_tokens():
+    flags = CancelFlags()
+    flags.token("done")
+    flags["cancelled"] = True
+    flags.release("done")
+    flags.release("cancelled")
+    assert "done" not in flags
+    assert "cancelled" in flags and flags.get("cancelled")
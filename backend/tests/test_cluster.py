@@ -0,0 +1,105 @@
+# tests/test_cluster.py
+from collections import Counter
+
+import pytest
+
+from app import cluster as cluster_module
+from app.cluster import Cluster, HashRing, RedisStateStore, SqliteStateStore, sqlite_path, state_store
+
+
+def test_hash_ring_spreads_keys_and_is_stable():
+    ring = HashRing(["a", "b", "c"])
+    keys = [f"https://example.com/{n}" for n in range(3000)]
+    owners = {key: ring.node_for(key) for key in keys}
+    counts = Counter(owners.values())
+    assert set(counts) == {"a", "b", "c"}
+    assert min(counts.values()) > 600
+    assert all(HashRing(["c", "a", "b"]).node_for(key) == owner for key, owner in owners.items())
+
+
+def test_adding_a_node_moves_only_its_share():
+    keys = [f"https://example.com/{n}" for n in range(3000)]
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+    moved = [key for key in keys if before.node_for(key) != after.node_for(key)]
+    assert all(after.node_for(key) == "d" for key in moved)
+    assert len(moved) < len(keys) * 0.4
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing([]).node_for("anything") is None
+
+
+def test_state_store_urls(tmp_path):
+    assert sqlite_path("sqlite:////abs/state.sqlite3") == "/abs/state.sqlite3"
+    assert sqlite_path("sqlite:///rel/state.sqlite3") == "rel/state.sqlite3"
+    assert isinstance(state_store(f"sqlite:///{tmp_path}/state.sqlite3"), SqliteStateStore)
+    with pytest.raises(Exception, match="Unsupported"):
+        state_store("memcached://localhost")
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def store(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        return SqliteStateStore(str(tmp_path / "state.sqlite3"), ttl=60)
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, url, **kw: fakeredis.FakeRedis(server=server)))
+    return RedisStateStore("redis://fake", ttl=60)
+
+
+def test_store_publishes_and_reads_sessions(store):
+    assert store.get("job") is None
+    store.publish([("job", {"status": "downloading", "progress": 10}, False), ("other", {"status": "queued"}, False)])
+    store.publish([("job", {"status": "completed", "progress": 100}, True)])
+    assert store.get("job") == {"status": "completed", "progress": 100}
+    assert store.get("other") == {"status": "queued"}
+    store.prune()
+    assert store.get("job") is not None
+
+
+def test_store_cancel_log_is_read_from_a_cursor(store):
+    store.request_cancel("old")
+    cursor = store.cancel_cursor()
+    assert store.cancels_since(cursor) == ([], cursor)
+
+    for n in range(5):
+        store.request_cancel(f"job-{n}")
+    ids, cursor = store.cancels_since(cursor, limit=3)
+    assert ids == ["job-0", "job-1", "job-2"]
+    ids, cursor = store.cancels_since(cursor, limit=3)
+    assert ids == ["job-3", "job-4"]
+    assert store.cancels_since(cursor) == ([], cursor)
+
+
+def test_sqlite_store_prunes_old_cancels(tmp_path):
+    store = SqliteStateStore(str(tmp_path / "state.sqlite3"), ttl=-1)
+    store.publish([("job", {"status": "completed"}, True)])
+    store.request_cancel("job")
+    store.prune()
+    assert store.get("job") is None
+    assert store.cancels_since(0) == ([], 0)
+
+
+def test_cluster_relays_cancels_to_running_jobs_only(tmp_path, sessions, monkeypatch):
+    from app.config import download_cancel_flags
+    monkeypatch.setattr(cluster_module, "CANCEL_BATCH", 2)
+    node = Cluster({"a": "http://a", "b": "http://b"}, "a", f"sqlite:///{tmp_path}/state.sqlite3")
+    node.store = state_store(node.state_url)
+    node.store.request_cancel("before-start")
+    node._cancel_cursor = node.store.cancel_cursor()
+
+    sessions["running"] = {"status": "downloading"}
+    sessions["before-start"] = {"status": "downloading"}
+    sessions["finished"] = {"status": "completed"}
+    for download_id in ("elsewhere", "finished", "running"):
+        node.store.request_cancel(download_id)
+
+    node.relay_cancels()
+
+    assert download_cancel_flags.get("running")
+    assert not download_cancel_flags.get("before-start")
+    assert not download_cancel_flags.get("finished")
+    assert "elsewhere" not in download_cancel_flags
+    assert node.store.cancels_since(node._cancel_cursor) == ([], node._cancel_cursor)
@@ -0,0 +1,71 @@
+# tests/test_fake_origin.py
+import pytest
+import requests
+
+from app import youtube_cache
+from benchmarks.fake_origin import Behaviour, FakeOrigin, media_bytes
+from benchmarks.offline import offline, rewrite
+
+
+@pytest.fixture(scope="module")
+def fake():
+    with FakeOrigin(Behaviour(media_size=10_000), board_pages=2) as fake:
+        yield fake
+
+
+def test_media_bytes_are_deterministic():
+    assert media_bytes(0, 3) == bytes([0, 1, 2, 3])
+    assert media_bytes(1024 * 1024 - 1, 1024 * 1024) == bytes([255, 0])  # wraps around the pattern
+    assert media_bytes(5, 4) == b""
+
+
+def test_media_honours_ranges(fake):
+    url = f"{fake.url}/cdn.example/v.mp4"
+    full = requests.get(url)
+    assert full.status_code == 200 and full.content == media_bytes(0, 9999)
+    part = requests.get(url, headers={"Range": "bytes=100-"})
+    assert part.status_code == 206 and part.headers["Content-Range"] == "bytes 100-9999/10000"
+    assert part.content == media_bytes(100, 9999)
+    assert requests.get(url, headers={"Range": "bytes=10000-"}).status_code == 416
+    head = requests.head(f"{url}?size=5")
+    assert head.headers["Content-Length"] == "5" and not head.content
+
+
+def test_behaviour_can_be_overridden_per_request(fake):
+    url = f"{fake.url}/cdn.example/v.mp4"
+    plain = requests.get(f"{url}?ranges=0", headers={"Range": "bytes=100-"})
+    assert plain.status_code == 200 and plain.headers["Accept-Ranges"] == "none"
+    assert requests.get(f"{url}?rate_limit=1").status_code == 429
+    with pytest.raises(requests.exceptions.RequestException):
+        requests.get(f"{url}?size=1000000&drop_rate=1").content
+    stats = requests.get(f"{fake.url}/_stats").json()
+    assert stats["rate_limited"] >= 1 and stats["dropped"] >= 1
+    assert requests.get(f"{fake.url}/cdn.example/page.html").status_code == 404
+
+
+def test_platform_fixtures_point_back_at_the_media(fake):
+    player = requests.get(f"{fake.url}/www.youtube.com/youtubei/v1/player?videoId=abcdefghijk").json()
+    urls = [f["url"] for f in player["streamingData"]["formats"] + player["streamingData"]["adaptiveFormats"]]
+    assert all("googlevideo.com/videoplayback?id=abcdefghijk" in url for url in urls)
+    first = requests.get(f"{fake.url}/www.pinterest.com/resource/BoardFeedResource/get/",
+                         params={"data": '{"options": {"board_url": "/a/b/", "page_size": 3}}'}).json()
+    assert len(first["resource_response"]["data"]) == 3 and first["resource_response"]["bookmark"] == "1"
+    last = requests.get(f"{fake.url}/www.pinterest.com/resource/BoardFeedResource/get/",
+                        params={"data": '{"options": {"board_url": "/a/b/", "bookmarks": ["1"]}}'}).json()
+    assert last["resource_response"]["bookmark"] == "-end-"
+    assert "video_url" in requests.get(f"{fake.url}/www.pinterest.com/pin/2/").text
+
+
+def test_rewrite_only_touches_upstream_hosts():
+    origin = "http://127.0.0.1:1"
+    assert rewrite("https://rr1.googlevideo.com/videoplayback?id=x", origin) == f"{origin}/rr1.googlevideo.com/videoplayback?id=x"
+    assert rewrite("https://www.pinterest.co.uk", origin) == f"{origin}/www.pinterest.co.uk/"
+    assert rewrite("https://example.com/a", origin) == "https://example.com/a"
+
+
+def test_offline_routes_requests_and_restores_them(fake):
+    original = youtube_cache.YouTube
+    with offline(fake.url):
+        assert requests.get("https://i.pinimg.com/originals/1.jpg?size=4").content == media_bytes(0, 3)
+        assert youtube_cache.YouTube is not original
+    assert youtube_cache.YouTube is original
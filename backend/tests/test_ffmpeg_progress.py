@@ -0,0 +1,82 @@
+# tests/test_ffmpeg_progress.py
+import os
+import sys
+import threading
+
+import pytest
+
+from app import utils
+from app.cancellation import DownloadCancelled
+from app.config import download_cancel_flags
+from app.utils import _progress_time, run_ffmpeg
+
+# reports 10s of output at 2x, then writes stdin (or "x") to the last argument;
+# the output name picks a failure mode
+FAKE_FFMPEG = """
+import sys, time
+args = sys.argv[1:]
+out = args[-1]
+data = sys.stdin.buffer.read() if "pipe:0" in args else b"x"
+if "stall" in out:
+    time.sleep(30)
+for i in range(1, 6):
+    print(f"out_time_us={i * 2000000}\\nspeed=2.0x\\nprogress={'end' if i == 5 else 'continue'}", flush=True)
+if "hang" in out:
+    time.sleep(30)
+if "fail" in out:
+    sys.stderr.write("bad thing\\n")
+    sys.exit(1)
+open(out, "wb").write(data)
+"""
+
+
+@pytest.fixture
+def ffmpeg(tmp_path, monkeypatch):
+    script = tmp_path / "ffmpeg"
+    script.write_text(f"#!{sys.executable}\n{FAKE_FFMPEG}")
+    script.chmod(0o755)
+    monkeypatch.setattr(utils, "find_ffmpeg", lambda: str(script))
+    return tmp_path
+
+
+def test_progress_time():
+    assert _progress_time({"out_time_us": "2500000"}) == 2.5
+    assert _progress_time({"out_time_us": "N/A", "out_time_ms": "1000000"}) == 1.0
+    assert _progress_time({"out_time": "00:00:01.000000"}) is None
+
+
+def test_reports_drive_the_session_progress(ffmpeg, flask_app, sessions):
+    sessions["encode"] = {"status": "processing", "progress": 0}
+    out = str(ffmpeg / "out.mp3")
+    run_ffmpeg(["-i", "in.m4a", out], "encode", duration=10, start_progress=20, end_progress=80, message="Encoding audio")
+    session = sessions["encode"]
+    assert (session["progress"], session["message"]) == (80, "Encoding audio... 100%")
+    assert (session["ffmpeg_speed"], session["eta"]) == (2.0, 0)
+    assert os.path.exists(out)
+
+
+def test_stdin_source_is_piped_in(ffmpeg):
+    out = ffmpeg / "piped.mp3"
+    run_ffmpeg(["-i", "pipe:0", str(out)], stdin_source=iter([b"ab", b"cd"]))
+    assert out.read_bytes() == b"abcd"
+
+
+def test_failures_carry_stderr_and_remove_outputs(ffmpeg):
+    out = ffmpeg / "fail.mp3"
+    out.write_bytes(b"partial")
+    with pytest.raises(Exception, match="FFmpeg failed: bad thing"):
+        run_ffmpeg(["-i", "in.m4a", str(out)], cleanup=[str(out)])
+    assert not out.exists()
+
+
+def test_silent_processes_are_killed(ffmpeg, monkeypatch):
+    monkeypatch.setattr(utils, "FFMPEG_STALL_TIMEOUT", 0.3)
+    with pytest.raises(Exception, match="FFmpeg stalled"):
+        run_ffmpeg(["-i", "in.m4a", str(ffmpeg / "stall.mp3")])
+
+
+def test_cancelling_the_job_kills_ffmpeg(ffmpeg, sessions):
+    timer = threading.Timer(0.3, download_cancel_flags.__setitem__, ("cancelled", True))
+    timer.start()
+    with pytest.raises(DownloadCancelled):
+        run_ffmpeg(["-i", "in.m4a", str(ffmpeg / "hang.mp3")], "cancelled")
@@ -0,0 +1,121 @@
+# tests/test_file_writer.py
+import errno
+import gzip
+import io
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from app import file_writer
+from app.file_writer import ALIGNMENT, PreallocatedWriter, preallocate, response_reader
+from app.utils import download_stream_fast
+
+DATA = os.urandom(3 * ALIGNMENT + 100)
+
+
+class Trickle(io.BytesIO):
+    """A socket-like reader that returns at most ``step`` bytes per read."""
+
+    def __init__(self, data, step=1000):
+        super().__init__(data)
+        self.step = step
+
+    def readinto(self, buffer):
+        return super().readinto(memoryview(buffer)[:self.step])
+
+
+def test_fill_from_copies_the_whole_stream(tmp_path):
+    path = tmp_path / "out.bin"
+    seen = []
+    with PreallocatedWriter(str(path), size=len(DATA), buffer_size=ALIGNMENT + 1) as writer:
+        assert len(writer._buffer) == ALIGNMENT  # rounded down to the alignment
+        assert writer.fill_from(Trickle(DATA), on_data=seen.append) == len(DATA)
+    assert path.read_bytes() == DATA
+    assert sum(seen) == len(DATA) and max(seen) == 1000
+
+
+def test_write_spans_buffer_boundaries(tmp_path):
+    path = tmp_path / "out.bin"
+    with PreallocatedWriter(str(path), buffer_size=ALIGNMENT) as writer:
+        for start in range(0, len(DATA), 3000):
+            writer.write(DATA[start:start + 3000])
+    assert path.read_bytes() == DATA
+    assert writer.written == len(DATA)
+
+
+def test_short_bodies_trim_the_preallocation(tmp_path):
+    path = tmp_path / "out.bin"
+    with PreallocatedWriter(str(path), size=len(DATA) * 2) as writer:
+        assert os.path.getsize(path) == len(DATA) * 2
+        writer.write(DATA)
+    assert os.path.getsize(path) == len(DATA)
+
+
+def test_failed_writes_are_not_trimmed(tmp_path):
+    path = tmp_path / "out.bin"
+    with pytest.raises(ValueError):
+        with PreallocatedWriter(str(path), size=len(DATA) * 2) as writer:
+            writer.write(DATA)
+            raise ValueError("connection lost")
+    assert os.path.getsize(path) == len(DATA) * 2
+    writer.close()  # closing twice is harmless
+
+
+def _unsupported(fd, offset, size):
+    raise OSError(errno.EOPNOTSUPP, "not supported")
+
+
+def test_preallocate_falls_back_to_truncate(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_writer.os, "posix_fallocate", _unsupported, raising=False)
+    path = tmp_path / "sparse.bin"
+    with open(path, "wb") as f:
+        preallocate(f.fileno(), 5000)
+        preallocate(f.fileno(), 0)
+    assert os.path.getsize(path) == 5000
+
+
+def test_preallocate_reports_a_full_disk(tmp_path, monkeypatch):
+    def full(fd, offset, size):
+        raise OSError(errno.ENOSPC, "no space left")
+
+    monkeypatch.setattr(file_writer.os, "posix_fallocate", full, raising=False)
+    with pytest.raises(OSError):
+        PreallocatedWriter(str(tmp_path / "out.bin"), size=5000)
+
+
+def test_response_reader_skips_decoding_only_for_identity_bodies():
+    fp = io.BytesIO(b"body")
+    raw = SimpleNamespace(_fp=fp)
+    assert response_reader(SimpleNamespace(headers={}, raw=raw)) is fp
+    plain = SimpleNamespace()
+    assert response_reader(SimpleNamespace(headers={}, raw=plain)) is plain
+
+
+class _Gzipped(BaseHTTPRequestHandler):
+    body = os.urandom(4000) * 3
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        data = gzip.compress(self.body)
+        self.send_response(200)
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def test_encoded_bodies_are_saved_decoded(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Gzipped)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        path = tmp_path / "page.bin"
+        download_stream_fast(f"http://127.0.0.1:{server.server_port}/page", str(path), end_progress=None)
+        assert path.read_bytes() == _Gzipped.body
+    finally:
+        server.shutdown()
+        server.server_close()
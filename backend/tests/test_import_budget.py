@@ -0,0 +1,33 @@
+# tests/test_import_budget.py
+import os
+import sys
+import json
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CREATE_APP_PROBE = """
+import sys, json
+from app import create_app
+create_app()
+print(json.dumps([m for m in ("pytubefix", "instaloader") if m in sys.modules]))
+"""
+
+
+def test_startup_import_stays_within_budget():
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.import_budget", "--runs", "3", "--top", "0"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=300,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr[-2000:]
+    assert "FAIL" not in proc.stdout
+
+
+def test_create_app_leaves_platform_libraries_unloaded(tmp_path):
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-c", CREATE_APP_PROBE],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,168 @@
+# tests/test_instaloader_pool.py
+import time
+import threading
+from datetime import datetime, timezone
+
+import pytest
+from instaloader.exceptions import ConnectionException, TooManyRequestsException
+
+from app import instaloader_pool as pool_module
+from app.instaloader_pool import InstaloaderPool
+from app.platforms import instagram
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = InstaloaderPool(size=2, backoff=60, lease_timeout=0.2)
+    monkeypatch.setattr(instagram, "instaloader_pool", pool)
+    return pool
+
+
+def leased(pool):
+    return sum(c["leased"] for c in pool.stats())
+
+
+def test_leases_are_exclusive_and_time_out(pool):
+    with pool.lease() as a, pool.lease() as b:
+        assert a is not b
+        assert leased(pool) == 2
+        with pytest.raises(Exception, match="No Instagram context available"):
+            with pool.lease():
+                pass
+    assert leased(pool) == 0
+
+
+def test_rate_limited_context_backs_off(pool):
+    with pytest.raises(TooManyRequestsException):
+        with pool.lease() as first:
+            raise TooManyRequestsException("429")
+    with pool.lease() as other:
+        assert other is not first
+    with pool.lease():
+        # the other context is busy and this one is backing off
+        with pytest.raises(Exception, match="No Instagram context available"):
+            with pool.lease():
+                pass
+
+
+def test_rate_controller_raises_instead_of_sleeping():
+    controller = pool_module._FailFastRateController(None)
+    with pytest.raises(TooManyRequestsException, match="other"):
+        controller.handle_429("other")
+
+
+def test_backoff_doubles_per_strike_and_resets_on_success(pool):
+    ctx = pool._contexts[0]
+    for strikes, expected in ((1, 60), (2, 120), (3, 240)):
+        pool._release(ctx, TooManyRequestsException("429"))
+        assert ctx.strikes == strikes
+        assert ctx.backoff_until - time.time() == pytest.approx(expected, abs=1)
+    ctx.strikes = 20
+    pool._release(ctx, TooManyRequestsException("429"))
+    assert ctx.backoff_until - time.time() == pytest.approx(pool_module.MAX_BACKOFF_SECONDS, abs=1)
+    pool._release(ctx)
+    assert ctx.strikes == 0
+
+
+def test_all_contexts_backing_off_fails_fast(pool):
+    for ctx in pool._contexts:
+        ctx.backoff_until = time.time() + 30
+    started = time.monotonic()
+    with pytest.raises(TooManyRequestsException, match="All Instagram contexts"):
+        with pool.lease():
+            pass
+    assert time.monotonic() - started < 0.1
+
+
+def test_context_is_rebuilt_after_repeated_connection_failures(pool):
+    with pool.lease() as first:
+        pass
+    for _ in range(pool_module.MAX_CONSECUTIVE_FAILURES):
+        ctx = next(c for c in pool._contexts if c.loader is first)
+        pool._release(ctx, ConnectionException("reset"))
+    for c in pool._contexts:
+        if c is not ctx:
+            c.leased = True
+    with pool.lease() as again:
+        assert again is not first
+    assert ctx.failures == 0
+
+
+def test_get_post_moves_to_another_context_when_rate_limited(pool, monkeypatch):
+    calls = []
+
+    def from_shortcode(context, shortcode):
+        calls.append(context)
+        if len(calls) == 1:
+            raise TooManyRequestsException("429")
+        return shortcode
+
+    monkeypatch.setattr(pool_module.instaloader.Post, "from_shortcode", staticmethod(from_shortcode))
+    assert pool.get_post("abc") == "abc"
+    assert len(calls) == 2 and calls[0] is not calls[1]
+    assert sum(1 for c in pool.stats() if c["backoff_remaining"] > 0) == 1
+
+
+def test_pinned_lease_waits_for_its_context(pool):
+    with pool.lease() as loader:
+        pass
+    got = []
+
+    def lease_again():
+        with pool.lease(loader) as again:
+            got.append(again)
+
+    with pool.lease(loader) as again:
+        assert again is loader
+        t = threading.Thread(target=lease_again)
+        t.start()
+        t.join(0.05)
+        assert not got  # still ours, although the other context is free
+    t.join(1)
+    assert got == [loader]
+
+
+def test_pinned_lease_fails_once_the_context_is_rebuilt(pool):
+    with pool.lease() as loader:
+        pass
+    for ctx in pool._contexts:
+        if ctx.loader is loader:
+            ctx.build()
+    with pytest.raises(Exception, match="was reset"):
+        with pool.lease(loader):
+            pass
+
+
+class _Post:
+    def __init__(self, n, pinned=False):
+        self.shortcode = f"post{n}"
+        self.date_utc = datetime.fromtimestamp(1_700_000_000 + n, tz=timezone.utc)
+        self.is_pinned = pinned
+
+
+def test_profile_sync_holds_no_lease_between_posts(pool, monkeypatch):
+    from app.output_cache import sync_index
+    posts = [_Post(5, pinned=True), _Post(9), _Post(8), _Post(7), _Post(4)]
+
+    class Profile:
+        @staticmethod
+        def from_username(context, username):
+            return Profile()
+
+        def get_posts(self):
+            return iter(posts)
+
+    monkeypatch.setattr(instagram.instaloader, "Profile", Profile)
+    sync_index.clear("instagram:someone")
+    sync_index.update("instagram:someone", timestamp=1_700_000_006)
+    sync = instagram.ProfileSync("someone")
+    seen = []
+    for job in sync:
+        assert leased(pool) == 0
+        seen.append(job["url"].rstrip("/").rsplit("/", 1)[1])
+    # the pinned post is older than the mark but does not end the scan; post4 does
+    assert seen == ["post9", "post8", "post7"]
+    assert sync.reached_mark and sync.newest[0] == "post9"
+    sync.commit({"failed": 0})
+    assert sync_index.get("instagram:someone")["shortcode"] == "post9"
+    sync_index.clear("instagram:someone")
@@ -0,0 +1,190 @@
+# tests/test_job_queue.py
+import json
+
+import pytest
+
+from app import job_queue, worker as worker_module
+from app.bandwidth import BandwidthManager
+from app.job_queue import SqliteJobQueue, fn_path, resolve_fn
+from app.metrics import Counter, Gauge, Histogram, Registry
+from app.worker import Worker
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+@pytest.fixture
+def queue(path):
+    return SqliteJobQueue(path, owner="node-a")
+
+
+def test_jobs_are_claimed_oldest_first(queue):
+    queue.put("first", "app.utils:fail_session", ["first"], {"status": "queued"})
+    queue.put("second", "app.utils:fail_session", ["second"], None)
+    download_id, fn, args, session, _ = queue.claim("w0")
+    assert (download_id, fn, args, session) == ("first", "app.utils:fail_session", ["first"], {"status": "queued"})
+    assert queue.claim("w0")[0] == "second"
+    assert queue.claim("w0") is None
+    assert queue.stats() == {"running": 2}
+    assert sorted(queue.orphans("w0")) == ["first", "second"]
+
+
+def test_cancel_drops_queued_jobs_and_flags_running_ones(queue):
+    queue.put("queued", "m:f", [], None)
+    queue.put("running", "m:f", [], None)
+    queue.claim("w0")  # takes "queued", the older one
+    queue.put("later", "m:f", [], None)
+    assert queue.cancel("later") is True
+    assert queue.cancel("queued") is False
+    assert sorted(queue.cancelled(["queued", "running", "later"])) == ["later", "queued"]
+    assert queue.claim("w0")[0] == "running"
+    assert queue.claim("w0") is None
+
+
+def test_updates_are_read_in_order_and_pruned(queue):
+    queue.put("job", "m:f", [], None)
+    queue.publish([("job", {"progress": 10}, False)])
+    queue.publish([("job", {"progress": 100, "status": "completed"}, True)])
+    rows = queue.updates_since(0)
+    assert [json.loads(r[2])["progress"] for r in rows] == [10, 100]
+    assert [r[3] for r in rows] == [0, 1]
+    assert queue.stats() == {"done": 1}
+    assert queue.updates_since(rows[0][0]) == rows[1:]
+    queue.prune(queue.last_seq())
+    assert queue.updates_since(0) == []
+
+
+def test_nodes_sharing_a_file_only_touch_their_own_rows(path):
+    a = SqliteJobQueue(path, owner="node-a")
+    b = SqliteJobQueue(path, owner="node-b")
+    a.put("a-job", "m:f", [], None)
+    b.put("b-job", "m:f", [], None)
+    b.publish([("b-job", {"progress": 5}, False)])
+    b.heartbeat("w0", {})
+
+    a.reset()  # node-a restarting
+
+    assert a.claim("w0") is None
+    assert a.updates_since(0) == [] and a.last_seq() == 0
+    assert len(b.updates_since(0)) == 1
+    assert b.workers() == {"w0": {}}
+    assert a.cancel("b-job") is False and b.cancelled(["b-job"]) == []
+    assert b.claim("w0")[0] == "b-job"
+
+
+def test_settings_and_worker_heartbeats(queue, monkeypatch):
+    assert queue.setting("bandwidth") is None
+    queue.set_setting("bandwidth", {"global": 100})
+    assert queue.setting("bandwidth") == {"global": 100}
+    queue.heartbeat("w0", {"m": []})
+    queue.heartbeat("w1", {})
+    assert queue.workers() == {"w0": {"m": []}, "w1": {}}
+    monkeypatch.setattr(job_queue, "WORKER_STALE_SECONDS", -1)
+    assert queue.workers() == {}
+
+
+def test_fn_path_round_trips_module_functions():
+    assert fn_path(resolve_fn) == "app.job_queue:resolve_fn"
+    assert resolve_fn("app.job_queue:SqliteJobQueue.claim") is SqliteJobQueue.claim
+    assert fn_path(lambda: None) is None
+
+
+def test_workers_split_the_node_limits_between_them(queue, monkeypatch):
+    web = BandwidthManager(global_rate=1000, platform_rates={"youtube": 600}, client_rate=50)
+    web.set_limits(clients={"sid-1": 80})
+    queue.set_setting("bandwidth", web.limits())
+    own = BandwidthManager()
+    monkeypatch.setattr(worker_module, "bandwidth", own)
+    queue.heartbeat("w1", {})
+
+    Worker(queue, "w0").check_in()
+
+    assert set(queue.workers()) == {"w0", "w1"}
+    assert own.limits() == {"global": 500, "platforms": {"youtube": 300}, "client_default": 50, "clients": {"sid-1": 80}}
+
+    web.set_limits(clients={"sid-1": None})
+    queue.set_setting("bandwidth", web.limits())
+    Worker(queue, "w0").check_in()
+    assert own.limits()["clients"] == {}
+
+
+def _registry():
+    registry = Registry()
+    jobs = registry.register(Counter("jobs_total", "Jobs.", ("state",)))
+    seconds = registry.register(Histogram("job_seconds", "Latency.", (), buckets=(1, 10)))
+    sessions = registry.register(Gauge("sessions", "Sessions.", collect=lambda: {(): 3}, node_wide=True))
+    return registry, jobs, seconds, sessions
+
+
+def test_worker_metrics_are_added_into_the_web_process(queue):
+    web, web_jobs, web_seconds, _ = _registry()
+    worker, worker_jobs, worker_seconds, _ = _registry()
+    web_jobs.inc(state="completed")
+    web_seconds.observe(0.5)
+    worker_jobs.inc(2, state="completed")
+    worker_jobs.inc(state="error")
+    worker_seconds.observe(5)
+
+    queue.heartbeat("w0", worker.snapshot())
+    text = web.render(list(queue.workers().values()))
+
+    assert 'jobs_total{state="completed"} 3' in text
+    assert 'jobs_total{state="error"} 1' in text
+    assert 'job_seconds_bucket{le="1"} 1' in text
+    assert 'job_seconds_bucket{le="10"} 2' in text
+    assert "job_seconds_count 2" in text
+    assert "sessions 3" in text  # node-wide: the worker's value is not added
+    assert "sessions" not in worker.snapshot()
+
+
+def test_dispatcher_start_clears_only_its_node(path):
+    other = SqliteJobQueue(path, owner="node-b")
+    other.put("b-job", "m:f", [], None)
+    mine = SqliteJobQueue(path, owner="node-a")
+    mine.put("stale", "m:f", [], None)
+    dispatcher = job_queue.QueueDispatcher(mine, processes=0)
+    try:
+        dispatcher.start()
+        assert mine.setting("bandwidth") is not None
+        assert mine.claim("w0") is None
+        assert other.claim("w0")[0] == "b-job"
+    finally:
+        dispatcher.stop()
+
+
+class FlakySink:
+    def __init__(self, failures):
+        self.failures = failures
+        self.published = []
+
+    def publish(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise Exception("database is locked")
+        self.published.append(batch)
+
+
+def test_failed_publishes_are_kept_for_the_next_flush():
+    publisher = job_queue.SessionPublisher(interval=0)
+    publisher.sink = FlakySink(failures=1)
+    publisher.publish("a", {"progress": 10})
+    with pytest.raises(Exception, match="locked"):
+        publisher.flush()
+    publisher.publish("b", {"progress": 1})
+    publisher.flush()
+    assert sorted(publisher.sink.published[0]) == [("a", {"progress": 10}, False), ("b", {"progress": 1}, False)]
+
+
+def test_final_snapshots_survive_a_failing_sink():
+    publisher = job_queue.SessionPublisher(interval=0)
+    publisher.sink = FlakySink(failures=2)
+    publisher.finish("job", {"status": "completed"})
+    assert publisher.sink.published == [[("job", {"status": "completed"}, True)]]
+
+    publisher.sink = FlakySink(failures=job_queue.FINISH_RETRIES)
+    publisher.finish("job", {"status": "error"})
+    assert publisher.sink.published == []
+    publisher.flush()  # the background loop's next pass
+    assert publisher.sink.published == [[("job", {"status": "error"}, True)]]
@@ -0,0 +1,126 @@
+# tests/test_job_state.py
+import json
+import threading
+import time
+
+import pytest
+
+from app.job_state import JobState, SessionRegistry
+
+
+def test_job_state_reads_and_writes_like_a_dict():
+    state = JobState({"status": "queued", "progress": 0, "children": ["a"]})
+    state["progress"] = 50
+    state.update({"custom": 1})
+    assert dict(state) == {"status": "queued", "progress": 50, "children": ["a"], "custom": 1}
+    assert "custom" in state and "filename" not in state
+    assert state.get("filename", "none") == "none"
+    del state["custom"]
+    del state["progress"]
+    assert dict(state) == {"status": "queued", "children": ["a"]}
+    with pytest.raises(KeyError):
+        state["progress"]
+    with pytest.raises(KeyError):
+        del state["missing"]
+
+
+def test_payload_and_encoding_are_cached_per_version():
+    state = JobState({"status": "downloading", "progress": 10})
+    payload = state.payload()
+    assert state.payload() is payload
+    assert state.encode() is state.encode()
+    version = state.version
+    state["progress"] = 20
+    assert state.version != version
+    assert state.payload() is not payload
+    assert json.loads(state.encode())["progress"] == 20
+
+
+def test_replace_keeps_the_batch_link():
+    state = JobState({"status": "queued", "parent_id": "batch", "skipped": True})
+    state.replace({"status": "completed"})
+    assert dict(state) == {"status": "completed", "parent_id": "batch"}
+
+
+def test_versions_are_never_reused():
+    a, b = JobState(), JobState()
+    versions = []
+    for n in range(3):
+        a["progress"] = n
+        versions.append(a.version)
+        b["progress"] = n
+        versions.append(b.version)
+    del a["progress"]
+    versions.append(a.version)
+    b.replace({})
+    versions.append(b.version)
+    assert len(set(versions)) == len(versions)
+
+
+def test_concurrent_writers_leave_a_current_payload():
+    state = JobState({"progress": 0})
+
+    def write(n):
+        for i in range(2000):
+            state[f"k{n}"] = i
+            state.payload()
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert state.payload() == {"progress": 0, "k0": 1999, "k1": 1999, "k2": 1999, "k3": 1999}
+    assert json.loads(state.encode())["k3"] == 1999
+
+
+def test_assigning_over_a_known_job_updates_it_in_place():
+    registry = SessionRegistry(max_terminal=10, ttl=60)
+    registry["job"] = {"status": "queued"}
+    record = registry["job"]
+    registry["job"] = {"status": "downloading", "progress": 5}
+    assert registry["job"] is record
+    assert record["progress"] == 5
+    other = registry.setdefault("other", {"status": "queued"})
+    assert registry["other"] is other and other["status"] == "queued"
+
+
+def test_finished_jobs_are_evicted_least_recently_read_first():
+    evicted = []
+    registry = SessionRegistry(max_terminal=2, ttl=60, on_evict=evicted.append)
+    for name in ("a", "b"):
+        registry[name] = {"status": "completed"}
+    registry.get("a")  # "b" is now the least recently read
+    registry["running"] = {"status": "downloading"}
+    registry["c"] = {"status": "error"}
+    assert evicted == ["b"]
+    assert set(registry) == {"a", "c", "running"}
+    assert registry.stats() == {"sessions": 3, "finished": 2, "evicted": 1}
+
+
+def test_batches_are_evicted_with_their_children():
+    evicted = []
+    registry = SessionRegistry(max_terminal=0, ttl=60, on_evict=evicted.append)
+    registry["child"] = {"status": "completed", "parent_id": "batch"}
+    assert "child" in registry  # children wait for their batch
+    registry["batch"] = {"status": "queued", "children": ["child"]}
+    registry["batch"]["status"] = "completed"
+    assert evicted == ["batch", "child"]
+    assert not registry
+
+
+def test_unread_finished_jobs_expire_after_the_ttl():
+    registry = SessionRegistry(max_terminal=100, ttl=0.05)
+    registry["old"] = {"status": "completed"}
+    registry["new"] = {"status": "downloading"}
+    time.sleep(0.1)
+    assert registry.sweep() == 1
+    assert set(registry) == {"new"}
+
+
+def test_popped_records_no_longer_report_to_the_registry():
+    registry = SessionRegistry(max_terminal=0, ttl=60)
+    registry["job"] = {"status": "downloading"}
+    record = registry.pop("job")
+    record["status"] = "completed"
+    assert registry.stats()["evicted"] == 0
@@ -0,0 +1,95 @@
+# tests/test_metrics.py
+import threading
+
+from app import metrics
+from app.metrics import Counter, Gauge, Histogram, timed_submit, track_transfer
+
+
+def test_counter_exposition_escapes_labels():
+    counter = Counter("jobs_total", "Jobs finished.", ("platform", "state"))
+    counter.inc(platform="you\"tube", state="completed")
+    counter.inc(2, platform="you\"tube", state="completed")
+    counter.inc(state="error")
+    assert counter.render() == [
+        "# HELP jobs_total Jobs finished.",
+        "# TYPE jobs_total counter",
+        'jobs_total{platform="unknown",state="error"} 1',
+        'jobs_total{platform="you\\"tube",state="completed"} 3',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("wait_seconds", "Wait.", ("platform",), buckets=(10, 1))
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value, platform="pinterest")
+    lines = histogram.render()[2:]
+    assert lines == [
+        'wait_seconds_bucket{platform="pinterest",le="1"} 2',
+        'wait_seconds_bucket{platform="pinterest",le="10"} 3',
+        'wait_seconds_bucket{platform="pinterest",le="+Inf"} 4',
+        'wait_seconds_sum{platform="pinterest"} 56.5',
+        'wait_seconds_count{platform="pinterest"} 4',
+    ]
+
+
+def test_gauges_collect_at_scrape_time():
+    values = {("running",): 1}
+    gauge = Gauge("executor_jobs", "Occupancy.", ("state",), collect=lambda: values)
+    assert gauge.render()[-1] == 'executor_jobs{state="running"} 1'
+    values = {("running",): 2}
+    assert gauge.render()[-1] == 'executor_jobs{state="running"} 2'
+
+    def broken():
+        raise OSError("gone")
+
+    assert Gauge("disk", "Disk.", collect=broken).render() == ["# HELP disk Disk.", "# TYPE disk gauge"]
+
+
+def test_timed_submit_records_occupancy_and_queue_wait():
+    inside = threading.Event()
+    release = threading.Event()
+
+    def job():
+        inside.set()
+        release.wait(5)
+        return "done"
+
+    def waits():
+        return metrics.queue_wait_seconds._values.get(("unknown",), [None, 0, 0])[2]
+
+    before = waits()
+    task = timed_submit("job", job)
+    thread = threading.Thread(target=task)
+    thread.start()
+    inside.wait(5)
+    assert metrics._executor_occupancy()[("running",)] == 1
+    release.set()
+    thread.join()
+    assert metrics._executor_occupancy()[("running",)] == 0
+    assert waits() == before + 1
+
+
+def test_nested_transfers_are_counted_once(tmp_path):
+    path = tmp_path / "file.mp4"
+
+    @track_transfer
+    def fallback(url, filepath, download_id=None):
+        with open(filepath, "wb") as f:
+            f.write(b"x" * 100)
+
+    @track_transfer
+    def ranged(url, filepath, download_id=None):
+        fallback(url, filepath, download_id)
+
+    before = dict(metrics.download_bytes._values).get(("unknown",), 0)
+    ranged("https://cdn.example/v.mp4", str(path))
+    assert metrics.download_bytes._values[("unknown",)] - before == 100
+
+
+def test_metrics_endpoint(flask_app):
+    response = flask_app.test_client().get("/api/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert "# TYPE downloader_jobs_total counter" in text
+    assert 'downloader_executor_jobs{state="workers"}' in text
@@ -0,0 +1,109 @@
+# tests/test_output_cache.py
+import os
+import time
+
+import pytest
+
+from app.output_cache import AudioVariantCache, OutputCache, SyncIndex, session_files
+from app.platforms import youtube
+from app.utils import get_download_path
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "index.json")
+
+
+def _media(name, platform="youtube"):
+    path = os.path.join(get_download_path(platform), name)
+    with open(path, "wb") as f:
+        f.write(b"x")
+    return path
+
+
+def test_lookup_matches_any_spelling_of_the_url(index_path):
+    cache = OutputCache(index_path)
+    path = _media("cached_video.mp4")
+    cache.record("https://www.youtube.com/watch?v=abcdefghijk", "1080P", "youtube", ["cached_video.mp4", None])
+    entry = cache.lookup("https://youtu.be/abcdefghijk", "1080p")
+    assert entry["files"] == ["cached_video.mp4"]
+    assert cache.lookup("https://youtu.be/abcdefghijk", "720p") is None
+    os.remove(path)
+    assert cache.lookup("https://youtu.be/abcdefghijk", "1080p") is None  # file deleted: a miss
+
+
+def test_nothing_is_recorded_without_files(index_path):
+    cache = OutputCache(index_path)
+    cache.record("https://www.pinterest.com/pin/1/", "original", "pinterest", [None, ""])
+    assert not os.path.exists(index_path)
+
+
+def test_index_reloads_when_another_process_rewrites_it(index_path):
+    ours, theirs = SyncIndex(index_path), SyncIndex(index_path)
+    ours.update("source", cursor="a")
+    assert theirs.get("source")["cursor"] == "a"
+    time.sleep(0.01)
+    theirs.update("source", cursor="b")
+    assert ours.get("source")["cursor"] == "b"
+    ours.clear("source")
+    assert theirs.get("source") == {}
+
+
+def test_unreadable_index_starts_fresh(index_path):
+    with open(index_path, "w") as f:
+        f.write("{not json")
+    index = SyncIndex(index_path)
+    assert index.get("source") == {}
+    index.update("source", timestamp=1)
+    assert SyncIndex(index_path).get("source")["timestamp"] == 1
+
+
+def test_audio_variants_are_misses_once_deleted(index_path):
+    cache = AudioVariantCache(index_path)
+    path = _media("variant_128.m4a")
+    cache.record("youtube", "abcdefghijk", "aac", 128, "variant_128.m4a")
+    assert cache.lookup("youtube", "abcdefghijk", "aac", 128) == "variant_128.m4a"
+    assert cache.lookup("youtube", "abcdefghijk", "opus", 128) is None
+    os.remove(path)
+    assert cache.lookup("youtube", "abcdefghijk", "aac", 128) is None
+
+
+def test_session_files():
+    assert session_files({"filename": "a.mp4"}) == ["a.mp4"]
+    assert session_files({"downloaded_files": ["a.jpg", "b.jpg"], "audio_link": {"filename": "a.mp3"}}) == ["a.jpg", "b.jpg", "a.mp3"]
+    assert session_files({}) == []
+
+
+class _Playlist:
+    pulled = 0
+
+    def __init__(self, url):
+        self.url = url
+
+    def url_generator(self):
+        for n in (1, 2, 1, 3, 4):
+            _Playlist.pulled += 1
+            yield f"https://www.youtube.com/watch?v=video{n:0>6}"
+
+
+def test_collection_is_pulled_lazily_and_deduplicated(index_path, monkeypatch):
+    cache = OutputCache(index_path)
+    _media("video2.mp4")
+    cache.record("https://youtu.be/video000002", "720p", "youtube", ["video2.mp4"])
+    monkeypatch.setattr(youtube, "Playlist", _Playlist)
+    monkeypatch.setattr(youtube, "output_cache", cache)
+    _Playlist.pulled = 0
+
+    jobs = youtube.iter_youtube_collection("https://www.youtube.com/playlist?list=PL1", "720p", limit=3)
+    first = next(jobs)
+    assert _Playlist.pulled == 1 and first["cached"] is None
+    rest = list(jobs)
+    assert [job["canonical_url"] for job in [first] + rest] == [f"https://www.youtube.com/watch?v=video00000{n}" for n in (1, 2, 3)]
+    assert rest[0]["cached"]["files"] == ["video2.mp4"]
+    assert _Playlist.pulled == 4  # stopped at the limit, the last video was never listed
+
+
+def test_collection_urls():
+    assert youtube.is_youtube_collection("https://www.youtube.com/playlist?list=PL1")
+    assert youtube.is_youtube_collection("https://www.youtube.com/@someone")
+    assert not youtube.is_youtube_collection("https://www.youtube.com/watch?v=abcdefghijk")
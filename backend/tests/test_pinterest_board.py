@@ -0,0 +1,106 @@
+# tests/test_pinterest_board.py
+import os
+import sys
+import threading
+import subprocess
+
+from app.output_cache import sync_index
+from app.platforms.pinterest import extract_board, pin_media, download_pinterest_board
+
+BOARD = "https://www.pinterest.com/benchuser/test-board/"
+
+
+def test_extract_board():
+    assert extract_board(BOARD) == ("benchuser", "test-board")
+    assert extract_board("https://www.pinterest.com/pin/123/") is None
+
+
+def test_pin_media_prefers_progressive_video():
+    pin = {"id": "1", "videos": {"video_list": {"V_HLSV4": {"url": "x.m3u8"}, "V_720P": {"url": "https://v/1.mp4"}}}, "images": {"orig": {"url": "https://i/1.png"}}}
+    media = pin_media(pin)
+    assert (media.url, media.filename, media.kind, media.resize) == ("https://v/1.mp4", "pinterest_1.mp4", "video", False)
+    assert pin_media({"id": "2", "images": {"orig": {"url": "https://i/2.png?x=1"}}}).filename == "pinterest_2.png"
+    assert pin_media({"id": "3"}) is None
+
+
+def test_exclusive_rejects_a_second_run():
+    with sync_index.exclusive("pinterest:a/b"):
+        errors = []
+
+        def second():
+            try:
+                with sync_index.exclusive("pinterest:a/b"):
+                    pass
+            except Exception as e:
+                errors.append(str(e))
+
+        t = threading.Thread(target=second)
+        t.start()
+        t.join()
+        assert errors and "already being synced" in errors[0]
+    with sync_index.exclusive("pinterest:a/b"):
+        pass
+
+
+def test_exclusive_is_held_across_processes():
+    code = (
+        "import os, sys; os.chdir(sys.argv[1]); sys.path.insert(0, sys.argv[2])\n"
+        "from app.output_cache import sync_index\n"
+        "try:\n"
+        "    with sync_index.exclusive('pinterest:x/y'): print('got')\n"
+        "except Exception as e: print('busy')\n"
+    )
+    with sync_index.exclusive("pinterest:x/y"):
+        out = subprocess.run([sys.executable, "-c", code, os.getcwd(), os.path.dirname(os.path.dirname(os.path.abspath(__file__)))], capture_output=True, text=True, timeout=60)
+    assert out.stdout.strip() == "busy", out.stderr
+
+
+def test_board_downloads_through_the_pipeline_and_reuses_pins(flask_app, sessions, origin):
+    sessions["board-1"] = {"status": "queued", "platform": "pinterest"}
+    download_pinterest_board("board-1", BOARD)
+    first = sessions["board-1"]
+    assert first["status"] == "completed", first.get("message")
+    assert len(first["downloaded_files"]) == 50
+    assert first["download_url"].startswith("/downloads/pinterest/")
+    assert sync_index.get("pinterest:benchuser/test-board") == {}
+
+    fetched = origin.stats.snapshot()["bytes_sent"]
+    sessions["board-2"] = {"status": "queued", "platform": "pinterest"}
+    download_pinterest_board("board-2", BOARD)
+    assert sessions["board-2"]["downloaded_files"] == first["downloaded_files"]
+    # only the board listing was fetched again, no pin media
+    assert origin.stats.snapshot()["bytes_sent"] - fetched < 64 * 1024
+
+
+def test_second_run_of_a_syncing_board_fails(flask_app, sessions, origin):
+    sessions["board-3"] = {"status": "queued", "platform": "pinterest"}
+    with sync_index.exclusive("pinterest:benchuser/test-board"):
+        download_pinterest_board("board-3", BOARD)
+    assert sessions["board-3"]["status"] == "error"
+    assert "already being synced" in sessions["board-3"]["message"]
+
+
+def test_cancelled_board_ends_cancelled(flask_app, sessions, origin):
+    from app.config import download_cancel_flags
+    sessions["board-4"] = {"status": "queued", "platform": "pinterest"}
+    download_cancel_flags["board-4"] = True
+    download_pinterest_board("board-4", "https://www.pinterest.com/benchuser/other-board/")
+    assert sessions["board-4"]["status"] == "cancelled"
+
+
+def test_resumed_board_still_returns_the_pins_before_the_cursor(flask_app, sessions, origin):
+    board = "https://www.pinterest.com/benchuser/resumed-board/"
+    key = "pinterest:benchuser/resumed-board"
+    sessions["board-5"] = {"status": "queued", "platform": "pinterest"}
+    download_pinterest_board("board-5", board)
+    everything = sessions["board-5"]["downloaded_files"]
+
+    # as left by a run that stopped after the first page
+    first_page = everything[:25]
+    sync_index.update(key, bookmark="1", files=first_page + ["deleted_since.jpg"])
+    sessions["board-6"] = {"status": "queued", "platform": "pinterest"}
+    download_pinterest_board("board-6", board)
+    resumed = sessions["board-6"]
+    assert resumed["downloaded_files"] == everything
+    assert "1 from an earlier run no longer on disk" in resumed["message"]
+    assert sync_index.get(key) == {}
@@ -0,0 +1,124 @@
+# tests/test_pipeline.py
+import os
+
+import pytest
+
+from app import platforms, utils
+from app.platforms import match_platform, load_platform, loaded_platforms
+from app.platforms.base import MediaDescriptor, PlatformAdapter, Resolution
+from app.config import download_cancel_flags
+from app.pipeline import output_name, run_audio, run_download
+from app.utils import get_download_path
+from benchmarks.fake_origin import Behaviour, FakeOrigin, media_bytes
+
+
+@pytest.fixture(scope="module")
+def cdn():
+    with FakeOrigin(Behaviour(media_size=20_000)) as fake:
+        yield fake
+
+
+class FakeAdapter(PlatformAdapter):
+    """Posts are ``fake://<id>``; each media URL in ``posts[id]`` becomes one download."""
+
+    name = "fakeplatform"
+
+    def __init__(self, posts):
+        super().__init__()
+        self.posts = posts
+
+    def media_id(self, url):
+        return url.split("://")[-1] if url.startswith("fake://") else None
+
+    def resolve(self, url, quality=None):
+        media_id = self.media_id(url)
+        media = [MediaDescriptor(u, f"{media_id}_{i}.{'jpg' if '.jpg' in u else 'mp4'}", "image" if ".jpg" in u else "video")
+                 for i, u in enumerate(self.posts[media_id])]
+        return Resolution(media_id, f"Post {media_id}", media, {"author": "someone"})
+
+
+def test_registry_matches_urls_without_importing():
+    assert match_platform("https://youtu.be/abcdefghijk") == "youtube"
+    assert match_platform("https://pin.it/abc") == "pinterest"
+    assert match_platform("https://WWW.INSTAGRAM.COM/p/x/") == "instagram"
+    assert match_platform("https://example.com") is None and match_platform(None) is None
+    assert set(loaded_platforms()) <= set(platforms.platform_names())
+    with pytest.raises(Exception, match="Unsupported platform: vimeo"):
+        load_platform("vimeo")
+
+
+def test_output_name_keeps_the_extension():
+    name = output_name("a/b:" + "x" * 300 + ".mp4")
+    assert name.endswith(".mp4") and "/" not in name and ":" not in name
+
+
+def test_single_item_download(cdn, flask_app, sessions):
+    adapter = FakeAdapter({"one": [f"{cdn.url}/cdn.example/v.mp4"]})
+    sessions["one"] = {"status": "downloading", "progress": 0}
+    run_download(adapter, "one", "fake://one", None)
+    session = sessions["one"]
+    assert session["status"] == "completed" and session["progress"] == 100
+    assert session["downloaded_files"] == ["one_0.mp4"]
+    assert session["download_url"] == "/downloads/fakeplatform/one_0.mp4"
+    with open(os.path.join(get_download_path("fakeplatform"), "one_0.mp4"), "rb") as f:
+        assert f.read() == media_bytes(0, 19_999)
+
+
+def test_carousels_keep_their_order(cdn, flask_app, sessions):
+    urls = [f"{cdn.url}/cdn.example/{n}.jpg?size={size}" for n, size in ((0, 5000), (1, 10), (2, 300))]
+    adapter = FakeAdapter({"many": urls})
+    sessions["many"] = {"status": "downloading", "progress": 0}
+    run_download(adapter, "many", "fake://many", None)
+    assert sessions["many"]["downloaded_files"] == ["many_0.jpg", "many_1.jpg", "many_2.jpg"]
+    assert sessions["many"]["message"] == "Downloaded 3 file(s)"
+
+
+def test_failures_end_the_session(cdn, flask_app, sessions, monkeypatch):
+    monkeypatch.setattr(utils.CancelToken, "wait", lambda self, timeout=None: False)
+    adapter = FakeAdapter({"empty": [], "gone": [f"{cdn.url}/cdn.example/missing.txt"]})
+    sessions["empty"] = {"status": "downloading", "progress": 0}
+    run_download(adapter, "empty", "fake://empty", None)
+    assert sessions["empty"]["status"] == "error"
+    assert "No media found" in sessions["empty"]["message"]
+
+    sessions["gone"] = {"status": "downloading", "progress": 0}
+    run_download(adapter, "gone", "fake://gone", None)
+    assert sessions["gone"]["status"] == "error"
+    assert "Failed to download" in sessions["gone"]["message"]
+
+
+def test_cancelled_jobs_are_not_resolved(flask_app, sessions):
+    class Unreachable(FakeAdapter):
+        def resolve(self, url, quality=None):
+            raise AssertionError("resolved a cancelled job")
+
+    sessions["cancelled"] = {"status": "downloading", "progress": 0}
+    download_cancel_flags["cancelled"] = True
+    run_download(Unreachable({}), "cancelled", "fake://x", None)
+    assert sessions["cancelled"]["status"] == "cancelled"
+
+
+def test_audio_without_bitrates_saves_the_stream(cdn, flask_app, sessions):
+    adapter = FakeAdapter({"song": [f"{cdn.url}/cdn.example/song.mp4?size=1000"]})
+    sessions["song"] = {"status": "downloading", "progress": 0}
+    run_audio(adapter, "song", "fake://song")
+    assert sessions["song"]["downloaded_files"] == ["song_0_audio.mp4"]
+
+    photos = FakeAdapter({"photo": [f"{cdn.url}/cdn.example/p.jpg"]})
+    with pytest.raises(Exception, match="doesn't contain a video"):
+        photos.resolve_audio("fake://photo")
+
+
+def test_preview_and_export(cdn):
+    adapter = FakeAdapter({"post": [f"{cdn.url}/cdn.example/p.jpg"], "empty": []})
+    assert adapter.preview("https://example.com/x") == ({"error": "Invalid Fakeplatform link"}, 400)
+    assert adapter.preview("fake://empty")[1] == 404
+    payload, status = adapter.preview("fake://post")
+    assert status == 200 and payload["author"] == "@someone" and payload["thumbnail"].endswith("p.jpg")
+
+    audio = MediaDescriptor("https://cdn.example/a.m4a", "clip_audio.m4a", "audio")
+    pair = MediaDescriptor("https://cdn.example/v.mp4", "clip.mp4", audio=audio)
+    assert [entry["filename"] for entry in pair.export()] == ["clip_video.mp4", "clip_audio.m4a"]
+    metadata, media_urls = adapter.export("fake://post")
+    assert metadata["platform"] == "fakeplatform" and metadata["post_url"] == "fake://post"
+    assert media_urls == [{"url": f"{cdn.url}/cdn.example/p.jpg", "filename": "post_0.jpg", "type": "image"}]
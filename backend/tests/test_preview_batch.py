@@ -0,0 +1,90 @@
+# tests/test_preview_batch.py
+import time
+import threading
+
+import pytest
+
+from app.metadata_cache import MetadataCache
+from app.routes import preview_routes
+
+
+def test_get_or_load_is_single_flight():
+    cache = MetadataCache(max_entries=4, ttl=60)
+    calls, release = [], threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join(2)
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+
+
+def test_uncacheable_results_are_not_kept():
+    cache = MetadataCache()
+    assert cache.get_or_load("k", lambda: ("err", 500), cacheable=lambda r: r[1] == 200) == ("err", 500)
+    assert cache.get("k") is None
+
+
+def test_loader_error_releases_waiters():
+    cache = MetadataCache()
+    with pytest.raises(ValueError):
+        cache.get_or_load("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert cache.get_or_load("k", lambda: "ok") == "ok"
+
+
+def test_lru_and_ttl():
+    cache = MetadataCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1
+    cache.set("d", 4, ttl=-1)
+    assert cache.get("d") is None
+
+
+@pytest.fixture
+def fake_previews(monkeypatch):
+    """Previews that take 0.2s (Instagram) or return at once, recording when each started."""
+    started = {}
+
+    def cached_preview(url):
+        started[url] = time.monotonic()
+        if "instagram" in url:
+            time.sleep(0.2)
+        return {"url": url}, 200
+
+    monkeypatch.setattr(preview_routes, "cached_preview", cached_preview)
+    monkeypatch.setattr(preview_routes, "platform_slots", {"instagram": threading.BoundedSemaphore(1), "youtube": threading.BoundedSemaphore(2)})
+    return started
+
+
+def test_duplicates_resolve_once_and_fan_out(fake_previews):
+    urls = ["https://youtu.be/abcdefghijk", "https://www.youtube.com/watch?v=abcdefghijk", "https://youtu.be/zzzzzzzzzzz"]
+    results = list(preview_routes.iter_batch_previews(urls))
+    assert sorted(r["index"] for r in results) == [0, 1, 2]
+    assert len(fake_previews) == 2
+
+
+def test_busy_platform_does_not_hold_back_others(fake_previews, monkeypatch):
+    import app.config
+    from concurrent.futures import ThreadPoolExecutor
+    monkeypatch.setattr(app.config, "preview_executor", ThreadPoolExecutor(max_workers=2), raising=False)
+    urls = [f"https://www.instagram.com/p/post{i}/" for i in range(4)] + ["https://youtu.be/abcdefghijk"]
+    t0 = time.monotonic()
+    results = list(preview_routes.iter_batch_previews(urls))
+    assert len(results) == 5
+    # Instagram runs one at a time (~0.8s in total) but YouTube is looked up right away
+    assert fake_previews["https://youtu.be/abcdefghijk"] - t0 < 0.15
+    assert time.monotonic() - t0 >= 0.75
+    assert preview_routes.platform_slots["instagram"].acquire(blocking=False)
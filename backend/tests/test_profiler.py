@@ -0,0 +1,120 @@
+# tests/test_profiler.py
+import os
+import threading
+import time
+
+import pytest
+
+from app import profiler as profiler_module
+from app.profiler import Profiler, ProfilerBusy, Sampler
+from app.routes import admin_routes
+
+
+@pytest.fixture(autouse=True)
+def profiles_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler_module, "PROFILES_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_sampler_stops_at_its_limit():
+    sampler = Sampler("capped", lambda ident: "thread", interval=1, limit=0.2).start()
+    assert _wait_for(lambda: sampler.finished, timeout=2)
+    path = sampler.stop()
+    assert os.path.exists(path)
+
+
+def test_window_is_capped_and_written(monkeypatch):
+    monkeypatch.setattr(profiler_module, "PROFILE_MAX_SECONDS", 0.2)
+    profiler = Profiler(default_mode=None)
+    name = profiler.window(3600, scope="all", interval=1)
+    assert _wait_for(lambda: not profiler.status()["windows"], timeout=2)
+    assert any(name in f for f in profiler.status()["files"])
+
+
+def test_too_many_requests_are_refused(monkeypatch):
+    monkeypatch.setattr(profiler_module, "PROFILE_MAX_ACTIVE", 2)
+    profiler = Profiler(default_mode=None)
+    assert profiler.arm("job-1") == "armed"
+    assert profiler.arm("job-1", "cprofile") == "armed"  # re-arming is not a new request
+    profiler.window(5)
+    with pytest.raises(ProfilerBusy):
+        profiler.arm("job-2")
+    with pytest.raises(ProfilerBusy):
+        profiler.window(5)
+
+
+def test_armed_jobs_expire_and_free_their_slot(monkeypatch):
+    monkeypatch.setattr(profiler_module, "PROFILE_MAX_ACTIVE", 1)
+    monkeypatch.setattr(profiler_module, "PROFILE_MAX_SECONDS", 0.1)
+    profiler = Profiler(default_mode=None)
+    profiler.arm("never-starts")
+    with pytest.raises(ProfilerBusy):
+        profiler.arm("other")
+    time.sleep(0.15)
+    assert profiler.arm("other") == "armed"
+    assert list(profiler.status()["armed_jobs"]) == ["other"]
+
+
+def test_armed_job_is_profiled_and_releases_its_slot(monkeypatch):
+    monkeypatch.setattr(profiler_module, "PROFILE_MAX_ACTIVE", 1)
+    profiler = Profiler(default_mode=None)
+    profiler.arm("job-1", "cprofile")
+    with profiler.watch("job:job-1", "job-1"):
+        sum(range(1000))
+    files = profiler.status()["files"]
+    assert any(f.endswith("job_job-1.prof") for f in files)
+    assert profiler.arm("job-2") == "armed"
+
+
+def test_attaching_to_a_running_job(monkeypatch):
+    profiler = Profiler(default_mode=None)
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        with profiler.watch("job:job-1", "job-1"):
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=job)
+    thread.start()
+    started.wait(5)
+    assert profiler.arm("job-1") == "attached"
+    assert profiler.status()["sampling_jobs"] == ["job-1"]
+    release.set()
+    thread.join(5)
+    assert profiler.status()["sampling_jobs"] == []
+    assert any(f.endswith("job_job-1.folded") for f in profiler.status()["files"])
+
+
+def test_old_profiles_are_pruned(profiles_dir, monkeypatch):
+    monkeypatch.setattr(profiler_module, "PROFILE_MAX_FILES", 3)
+    for n in range(5):
+        path = profiles_dir / f"old_{n}.folded"
+        path.write_text("x 1\n")
+        os.utime(path, (n, n))
+    Sampler("fresh", lambda ident: None).stop()
+    names = sorted(os.listdir(profiles_dir))
+    assert len(names) == 3
+    assert "old_0.folded" not in names and "old_2.folded" not in names
+    assert any(name.endswith("_fresh.folded") for name in names)
+
+
+def test_profile_route_answers_429_when_busy(flask_app, monkeypatch):
+    monkeypatch.setattr(admin_routes, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(admin_routes, "profiler", Profiler(default_mode=None))
+    monkeypatch.setattr(profiler_module, "PROFILE_MAX_ACTIVE", 1)
+    client = flask_app.test_client()
+    headers = {"X-Admin-Token": "s3cret"}
+    assert client.post("/api/admin/profile", json={"download_id": "a"}, headers=headers).status_code == 200
+    response = client.post("/api/admin/profile", json={"seconds": 1}, headers=headers)
+    assert response.status_code == 429
+    assert client.post("/api/admin/profile", json={"seconds": 1, "interval_ms": "often"}, headers=headers).status_code == 400
@@ -0,0 +1,78 @@
+# tests/test_range_proxy.py
+import pytest
+import requests
+
+from app import range_proxy as proxy_module
+from app.range_proxy import BLOCK_SIZE, RangeProxy
+from benchmarks.fake_origin import Behaviour, FakeOrigin, media_bytes
+
+SIZE = 2 * BLOCK_SIZE + 1000
+
+
+@pytest.fixture(scope="module")
+def cdn():
+    with FakeOrigin(Behaviour()) as fake:
+        yield fake
+
+
+@pytest.fixture
+def proxy():
+    proxy = RangeProxy()
+    yield proxy
+    if proxy._server:
+        proxy._server.shutdown()
+        proxy._server.server_close()
+
+
+def test_ranges_are_served_across_blocks(cdn, proxy):
+    with proxy.serve(f"{cdn.url}/cdn.example/a.m4a?size={SIZE}") as url:
+        assert url.startswith("http://127.0.0.1:")
+        head = requests.head(url)
+        assert head.status_code == 200 and int(head.headers["Content-Length"]) == SIZE
+        start, end = BLOCK_SIZE - 10, 2 * BLOCK_SIZE + 9
+        r = requests.get(url, headers={"Range": f"bytes={start}-{end}"})
+        assert r.status_code == 206
+        assert r.headers["Content-Range"] == f"bytes {start}-{end}/{SIZE}"
+        assert r.content == media_bytes(start, end)
+        tail = requests.get(url, headers={"Range": f"bytes={SIZE - 5}-"})
+        assert tail.content == media_bytes(SIZE - 5, SIZE - 1)
+        assert requests.get(url).content == media_bytes(0, SIZE - 1)
+
+
+def test_repeated_reads_come_from_cached_blocks(cdn, proxy):
+    with proxy.serve(f"{cdn.url}/cdn.example/b.m4a?size={SIZE}") as url:
+        requests.get(url, headers={"Range": "bytes=0-99"})
+        before = cdn.stats.snapshot()["requests"]
+        for _ in range(3):
+            assert requests.get(url, headers={"Range": "bytes=100-199"}).content == media_bytes(100, 199)
+        assert cdn.stats.snapshot()["requests"] == before
+
+
+def test_least_recently_read_blocks_are_dropped(cdn, proxy, monkeypatch):
+    monkeypatch.setattr(proxy_module, "MAX_CACHED_BLOCKS", 1)
+    with proxy.serve(f"{cdn.url}/cdn.example/c.m4a?size={SIZE}") as url:
+        requests.get(url, headers={"Range": "bytes=0-9"})
+        requests.get(url, headers={"Range": f"bytes={BLOCK_SIZE}-{BLOCK_SIZE + 9}"})
+        (source,) = proxy._server.sources.values()
+        assert list(source.blocks) == [1]
+
+
+def test_out_of_range_and_unknown_sources(cdn, proxy):
+    with proxy.serve(f"{cdn.url}/cdn.example/d.m4a?size={SIZE}") as url:
+        r = requests.get(url, headers={"Range": f"bytes={SIZE}-"})
+        assert r.status_code == 416 and r.headers["Content-Range"] == f"bytes */{SIZE}"
+        assert requests.get(url + "x").status_code == 404
+    assert requests.get(url).status_code == 404  # released when the block exits
+
+
+def test_origins_without_ranges_are_handed_over_directly(cdn, proxy):
+    source = f"{cdn.url}/cdn.example/e.m4a?size={SIZE}&ranges=0"
+    with proxy.serve(source) as url:
+        assert url == source
+    assert proxy._server is None
+
+
+def test_missing_origin_files_fail_before_ffmpeg_starts(cdn, proxy):
+    with pytest.raises(requests.HTTPError):
+        with proxy.serve(f"{cdn.url}/cdn.example/missing.txt"):
+            pass
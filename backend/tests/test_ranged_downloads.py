@@ -0,0 +1,124 @@
+# tests/test_ranged_downloads.py
+import re
+import time
+
+import pytest
+import requests
+
+from app import utils
+from app.utils import RangeNotSupported, download_stream_ranged, iter_ranges
+from benchmarks.fake_origin import Behaviour, FakeOrigin, media_bytes
+
+SIZE = 3 * 1024 * 1024 + 123
+
+
+@pytest.fixture(scope="module")
+def cdn():
+    with FakeOrigin(Behaviour()) as fake:
+        yield fake
+
+
+class _Response:
+    def __init__(self, status, body):
+        self.status_code = status
+        self.body = body
+        self.raw = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+
+class FlakySession:
+    """Serves ranges of ``media_bytes``, cutting the first response to every range in half."""
+
+    def __init__(self, status=206):
+        self.status = status
+        self.ranges = []
+
+    def get(self, url, headers, **kwargs):
+        start, end = map(int, re.match(r"bytes=(\d+)-(\d+)", headers["Range"]).groups())
+        first = not any(e == end for _, e in self.ranges)
+        self.ranges.append((start, end))
+        if first:
+            end = start + (end - start) // 2
+        return _Response(self.status, media_bytes(start, end))
+
+
+def test_iter_ranges_resumes_from_the_last_byte(monkeypatch):
+    monkeypatch.setattr(utils.CancelToken, "wait", lambda self, timeout=None: False)
+    session = FlakySession()
+    data = b"".join(iter_ranges("https://cdn.example/v.mp4", 100, 1100, chunk_size=400, session=session))
+    assert data == media_bytes(100, 1099)
+    # each chunk's retry starts where the cut-off response stopped
+    assert session.ranges == [(100, 499), (300, 499), (500, 899), (700, 899), (900, 1099), (1000, 1099)]
+
+
+def test_iter_ranges_refuses_servers_ignoring_range():
+    with pytest.raises(RangeNotSupported):
+        next(iter_ranges("https://cdn.example/v.mp4", 0, 100, session=FlakySession(status=200)))
+
+
+def test_iter_ranges_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(utils.CancelToken, "wait", lambda self, timeout=None: False)
+
+    class Broken:
+        def get(self, *args, **kwargs):
+            raise ConnectionError("reset")
+
+    with pytest.raises(Exception, match="Failed to download"):
+        list(iter_ranges("https://cdn.example/v.mp4", 0, 100, max_retries=2, session=Broken()))
+
+
+def test_ranged_download_writes_every_part(cdn, tmp_path, flask_app, sessions):
+    sessions["ranged"] = {"status": "downloading", "progress": 0}
+    path = tmp_path / "out.mp4"
+    download_stream_ranged(f"{cdn.url}/cdn.example/v.mp4?size={SIZE}", str(path), SIZE, "ranged", 10, 60, parts=3)
+    assert path.read_bytes() == media_bytes(0, SIZE - 1)
+    session = sessions["ranged"]
+    assert (session["progress"], session["downloaded_bytes"], session["total_bytes"]) == (60, SIZE, SIZE)
+
+
+def test_ranged_download_falls_back_to_a_plain_stream(cdn, tmp_path, flask_app, sessions):
+    sessions["plain"] = {"status": "downloading", "progress": 0}
+    path = tmp_path / "out.mp4"
+    download_stream_ranged(f"{cdn.url}/cdn.example/v.mp4?size={SIZE}&ranges=0", str(path), SIZE, "plain", 0, 100, parts=4)
+    assert path.read_bytes() == media_bytes(0, SIZE - 1)
+    # the abandoned ranged attempt's bytes are not counted twice
+    assert (sessions["plain"]["downloaded_bytes"], sessions["plain"]["total_bytes"]) == (SIZE, SIZE)
+
+
+def test_failed_ranged_download_removes_the_file(cdn, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.CancelToken, "wait", lambda self, timeout=None: False)
+    path = tmp_path / "out.mp4"
+    with pytest.raises(Exception):
+        download_stream_ranged(f"{cdn.url}/cdn.example/v.mp4?size={SIZE}&drop_rate=1", str(path), SIZE, parts=2)
+    assert not path.exists()
+
+
+def test_a_failed_part_stops_its_siblings(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.CancelToken, "wait", lambda self, timeout=None: self.cancelled)
+    size = 4 * 1024 * 1024
+    last_part = f"bytes={size * 3 // 4}-"
+
+    class FailingLastPart(requests.Session):
+        def get(self, url, headers=None, **kwargs):
+            if headers["Range"].startswith(last_part):
+                raise ConnectionError("reset")
+            return super().get(url, headers=headers, **kwargs)
+
+    # every healthy part would need ~4 s at this rate
+    with FakeOrigin(Behaviour(rate=256 * 1024)) as slow:
+        started = time.monotonic()
+        with pytest.raises(Exception, match="Failed to download"):
+            download_stream_ranged(f"{slow.url}/cdn.example/v.mp4?size={size}", str(tmp_path / "out.mp4"), size, parts=4,
+                                   session=FailingLastPart())
+        assert time.monotonic() - started < 2
@@ -0,0 +1,88 @@
+# tests/test_tracing.py
+import threading
+
+import pytest
+
+from app.routes import job_routes
+from app.tracing import Tracer
+
+
+def _by_name(trace):
+    return {span["name"]: span for span in trace["spans"]}
+
+
+def test_spans_nest_per_thread_and_fan_out_to_the_job():
+    tracer = Tracer()
+    tracer.begin("job")
+    with tracer.span("job", "job", platform="youtube"):
+        with tracer.span("job", "fetch") as fetch:
+            tracer.incr("job", "retries")
+            tracer.incr("job", "retries")
+
+        def worker():
+            with tracer.span("job", "part"):
+                tracer.annotate("job", bytes=10)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        tracer.record("job", "queued", 1.0, 2.0)
+
+    spans = _by_name(tracer.get("job"))
+    root = spans["job"]["span_id"]
+    assert spans["job"]["parent_id"] is None
+    assert spans["fetch"]["parent_id"] == root and spans["fetch"]["attrs"] == {"retries": 2}
+    assert spans["part"]["parent_id"] == root and spans["part"]["attrs"] == {"bytes": 10}
+    assert spans["part"]["thread"] != fetch.thread
+    assert spans["queued"]["duration"] == 1.0
+
+
+def test_failed_spans_keep_the_error():
+    tracer = Tracer()
+    with pytest.raises(ValueError):
+        with tracer.span("job", "merge"):
+            raise ValueError("bad stream")
+    (span,) = tracer.get("job")["spans"]
+    assert span["error"] == "bad stream" and span["end"] is not None
+
+
+def test_limits_and_anonymous_work():
+    tracer = Tracer(max_jobs=2, max_spans=1)
+    assert tracer.start(None, "anonymous") is None
+    tracer.record("a", "one", 1, 2)
+    tracer.record("a", "two", 2, 3)
+    assert tracer.get("a")["dropped_spans"] == 1
+    tracer.record("b", "one", 1, 2)
+    tracer.record("c", "one", 1, 2)
+    assert tracer.get("a") is None and tracer.get("c") is not None
+    tracer.begin("c")  # a re-run starts over
+    assert tracer.get("c")["spans"] == []
+
+
+def test_exports():
+    tracer = Tracer()
+    with tracer.span("job", "job", platform="youtube", parts=4, ok=True):
+        with pytest.raises(OSError):
+            with tracer.span("job", "fetch"):
+                raise OSError("reset")
+    chrome = tracer.chrome_trace("job")
+    assert [event["name"] for event in chrome["traceEvents"]] == ["job", "fetch"]
+    assert chrome["traceEvents"][1]["args"] == {"error": "reset"}
+    spans = tracer.otlp("job")["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    attrs = {a["key"]: a["value"] for a in spans[0]["attributes"]}
+    assert attrs["parts"] == {"intValue": "4"} and attrs["ok"] == {"boolValue": True}
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+    assert spans[1]["status"] == {"code": 2, "message": "reset"}
+    assert tracer.chrome_trace("missing") is None and tracer.otlp("missing") is None
+
+
+def test_trace_endpoint(flask_app, monkeypatch):
+    tracer = Tracer()
+    tracer.record("job", "queued", 1, 2)
+    monkeypatch.setattr(job_routes, "tracer", tracer)
+    client = flask_app.test_client()
+    assert client.get("/api/jobs/job/trace").get_json()["spans"][0]["name"] == "queued"
+    download = client.get("/api/jobs/job/trace?format=chrome&download=1")
+    assert "trace_job_chrome.json" in download.headers["Content-Disposition"]
+    assert client.get("/api/jobs/job/trace?format=xml").status_code == 400
+    assert client.get("/api/jobs/other/trace").status_code == 404
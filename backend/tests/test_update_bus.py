@@ -0,0 +1,125 @@
+# tests/test_update_bus.py
+import json
+import threading
+import time
+
+import pytest
+
+from app.job_state import JobState
+from app.routes import job_routes
+from app.update_bus import UpdateBus, update_bus
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+def _later(delay, fn, *args):
+    timer = threading.Timer(delay, fn, args)
+    timer.start()
+    return timer
+
+
+def test_each_version_is_encoded_once():
+    bus = UpdateBus()
+    session = JobState({"status": "downloading", "progress": 10})
+    bus.publish("job", session)
+    first = bus.current("job")
+    assert bus.current("job") is first
+    assert json.loads(first.body) == {"download_id": "job", "session": {"status": "downloading", "progress": 10}}
+    session["progress"] = 20
+    bus.publish("job", session)
+    second = bus.current("job")
+    assert second.version == first.version + 1 and second.etag != first.etag and not second.terminal
+    session["status"] = "completed"
+    bus.publish("job", session)
+    assert bus.current("job").terminal
+
+
+def test_identical_content_gives_the_same_etag():
+    one, other = UpdateBus(), UpdateBus()
+    one.publish("job", JobState({"status": "queued"}))
+    other.publish("job", JobState({"status": "queued"}))
+    assert one.current("job").etag == other.current("job").etag
+
+
+def test_wait_returns_on_the_next_publish_or_the_timeout():
+    bus = UpdateBus()
+    session = JobState({"status": "downloading", "progress": 0})
+    bus.publish("job", session)
+    version = bus.current("job").version
+    started = time.monotonic()
+    assert bus.wait("job", version, 0.1).version == version
+    assert time.monotonic() - started >= 0.1
+
+    _later(0.05, bus.publish, "job", session)
+    assert bus.wait("job", version, 5).version == version + 1
+
+
+def test_followers_never_see_a_slot_without_its_session():
+    bus = UpdateBus()
+    assert bus._slot("job") is None and bus.current("job") is None
+    errors = []
+
+    def follow():
+        for n in range(500):
+            try:
+                bus.current(f"job{n}")
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+    for n in range(500):
+        bus.publish(f"job{n}", JobState({"status": "queued"}))
+    thread.join()
+    assert not errors
+
+
+def test_only_recent_jobs_are_kept(sessions):
+    bus = UpdateBus(max_jobs=2)
+    for name in ("a", "b", "c"):
+        bus.publish(name, JobState({"status": "queued"}))
+    assert bus.stats() == {"jobs": 2}
+    assert bus.current("a") is None  # evicted and no longer a session
+    sessions["a"] = {"status": "completed"}
+    assert json.loads(bus.current("a").body)["session"]["status"] == "completed"
+
+
+def test_long_poll(client, sessions):
+    sessions["poll"] = {"status": "downloading", "progress": 5}
+    assert client.get("/api/jobs/missing-job").status_code == 404
+    first = client.get("/api/jobs/poll")
+    etag = first.headers["ETag"]
+    assert first.get_json()["session"]["progress"] == 5
+
+    unchanged = client.get("/api/jobs/poll?wait=0.1", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.headers["ETag"] == etag
+
+    def progress():
+        sessions["poll"]["progress"] = 50
+        update_bus.publish("poll", sessions["poll"])
+
+    _later(0.1, progress)
+    changed = client.get("/api/jobs/poll?wait=5", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.get_json()["session"]["progress"] == 50
+
+
+def test_events_stream_until_the_job_finishes(client, sessions, monkeypatch):
+    monkeypatch.setattr(job_routes, "JOB_EVENTS_MIN_INTERVAL", 0.01)
+    sessions["sse"] = {"status": "downloading", "progress": 5}
+
+    def finish():
+        sessions["sse"].update({"status": "completed", "progress": 100})
+        update_bus.publish("sse", sessions["sse"])
+
+    _later(0.1, finish)
+    response = client.get("/api/jobs/sse/events")
+    assert response.mimetype == "text/event-stream"
+    events = [json.loads(line[len("data: "):]) for line in response.get_data(as_text=True).splitlines() if line.startswith("data: ")]
+    assert [e["session"]["status"] for e in events] == ["downloading", "completed"]
+
+    # a reconnect that already saw the final snapshot gets nothing new
+    last = client.get("/api/jobs/sse/events", headers={"Last-Event-ID": update_bus.current("sse").etag})
+    assert "data:" not in last.get_data(as_text=True)
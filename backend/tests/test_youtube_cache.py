@@ -0,0 +1,141 @@
+# tests/test_youtube_cache.py
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app import youtube_cache
+from app.youtube_cache import CachedCipher, forget_player, get_youtube, manifest_expiry, player_version, stream_index
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+class FakeCipher:
+    built = []
+
+    def __init__(self, js, js_url):
+        FakeCipher.built.append(js_url)
+        self.closed = False
+        self.runner_sig = self.runner_nsig = self
+
+    def get_sig(self, value):
+        return f"sig({value})"
+
+    def get_nsig(self, value):
+        return f"nsig({value})"
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def players(monkeypatch):
+    FakeCipher.built = []
+    monkeypatch.setattr(youtube_cache, "Cipher", FakeCipher)
+    monkeypatch.setattr(youtube_cache, "_players", youtube_cache.OrderedDict())
+    return youtube_cache._players
+
+
+def _js_url(version):
+    return f"https://www.youtube.com/s/player/{version}/player_ias.vflset/en_US/base.js"
+
+
+def test_player_version():
+    assert player_version(_js_url("abc123")) == "abc123"
+    assert player_version("https://example.com/other.js") == "https://example.com/other.js"
+
+
+def test_player_functions_are_shared_and_memoized(players):
+    first = CachedCipher("js", _js_url("v1"))
+    second = CachedCipher("js", _js_url("v1"))
+    assert first.get_sig("a") == "sig(a)" and second.get_sig("a") == "sig(a)"
+    assert first.get_nsig("n") == "nsig(n)"
+    assert FakeCipher.built == [_js_url("v1")]
+    assert first._player is second._player
+
+
+def test_old_player_versions_are_closed(players, monkeypatch):
+    monkeypatch.setattr(youtube_cache, "YOUTUBE_PLAYER_CACHE_SIZE", 1)
+    CachedCipher("js", _js_url("v1")).get_sig("a")
+    engine = players["v1"]._cipher
+    CachedCipher("js", _js_url("v2"))
+    assert list(players) == ["v2"] and engine.closed
+    forget_player(_js_url("v2"))
+    assert not players
+
+
+def _stream(url, **kw):
+    defaults = dict(is_progressive=True, subtype="mp4", resolution="360p", includes_video_track=True, fps=30, bitrate=1)
+    return SimpleNamespace(url=url, **dict(defaults, **kw))
+
+
+def test_manifest_expiry_uses_the_earliest_url():
+    streams = [_stream("https://r.googlevideo.com/a?expire=2000"), _stream("https://r.googlevideo.com/b?expire=1000&x=1")]
+    assert manifest_expiry(streams) == 1000
+    assert manifest_expiry([_stream("https://r.googlevideo.com/c")]) > time.time() + 3600
+
+
+class FakeYouTube:
+    created = 0
+    fail = False
+    expire = None
+
+    def __init__(self, url):
+        FakeYouTube.created += 1
+        self.video_id = "abcdefghijk"
+        self.title, self.length = "Title", 10
+        time.sleep(0.05)
+        if FakeYouTube.fail:
+            raise Exception("upstream failed")
+        expire = FakeYouTube.expire or int(time.time()) + 3600
+        self.fmt_streams = [_stream(f"https://r.googlevideo.com/v?expire={expire}")]
+
+
+@pytest.fixture
+def manifests(monkeypatch):
+    FakeYouTube.created, FakeYouTube.fail, FakeYouTube.expire = 0, False, None
+    monkeypatch.setattr(youtube_cache, "YouTube", FakeYouTube)
+    monkeypatch.setattr(youtube_cache, "_manifests", youtube_cache.OrderedDict())
+    return youtube_cache._manifests
+
+
+def _concurrently(fn, n=5):
+    results, errors = [], []
+
+    def run():
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_requests_share_one_fetch(manifests):
+    results, errors = _concurrently(lambda: get_youtube(URL))
+    assert not errors and FakeYouTube.created == 1
+    assert all(yt is results[0] for yt in results)
+    assert stream_index(results[0]).best_progressive("360p") is results[0].fmt_streams[0]
+    assert get_youtube(URL) is results[0]
+
+
+def test_failed_fetch_lets_waiters_retry(manifests):
+    FakeYouTube.fail = True
+    results, errors = _concurrently(lambda: get_youtube(URL), n=3)
+    assert len(errors) == 3 and FakeYouTube.created == 3
+    assert not manifests
+
+
+def test_manifests_are_refetched_before_they_expire(manifests):
+    FakeYouTube.expire = int(time.time()) + 100  # inside the safety margin
+    first = get_youtube(URL)
+    assert get_youtube(URL) is not first
+    assert FakeYouTube.created == 2
+    youtube_cache.invalidate(URL)
+    assert not manifests
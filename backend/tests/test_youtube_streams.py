@@ -0,0 +1,53 @@
+# tests/test_youtube_streams.py
+from types import SimpleNamespace
+
+from app.youtube_streams import StreamIndex, stream_size
+
+
+def progressive(res, fps=30, subtype="mp4", size=None):
+    return SimpleNamespace(is_progressive=True, subtype=subtype, resolution=res, fps=fps, bitrate=1, _filesize=size)
+
+
+def video(res, codec="avc1", subtype="mp4", fps=30, bitrate=1, size=None):
+    return SimpleNamespace(is_progressive=False, includes_video_track=True, subtype=subtype, resolution=res,
+                           video_codec=codec, fps=fps, bitrate=bitrate, _filesize=size)
+
+
+def audio(abr, codec="mp4a", default=True, size=None):
+    return SimpleNamespace(is_progressive=False, includes_video_track=False, includes_audio_track=True, subtype="mp4",
+                           abr=abr, audio_codec=codec, is_default_audio_track=default, _filesize=size)
+
+
+def test_progressive_wins_at_its_quality():
+    best = progressive("360p", fps=60)
+    index = StreamIndex([progressive("360p"), best, progressive("720p", subtype="webm"), video("1080p"), audio("128kbps")])
+    assert index.select("360p") == (best, None)
+    assert index.best_overall() == (best, None)
+
+
+def test_adaptive_pick_falls_back_to_the_highest_mp4_video():
+    high = video("1080p", bitrate=5)
+    webm = video("1440p", codec="vp9", subtype="webm")
+    best_audio = audio("160kbps")
+    index = StreamIndex([video("1080p", bitrate=2), high, webm, video("480p"), audio("128kbps"), best_audio,
+                         audio("256kbps", default=False)])
+    assert index.select("1080p") == (high, best_audio)
+    assert index.select("2160p") == (high, best_audio)  # not available: highest mp4 video
+    assert index.select() == (high, best_audio)
+    assert index.resolutions() == ["1080p", "480p"]
+
+
+def test_sizes_add_the_audio_track():
+    index = StreamIndex([progressive("360p", size=100), video("720p", size=1000), video("480p"), audio("128kbps", size=50)])
+    assert index.sizes() == {"720p": 1050, "480p": None, "360p": 100}
+
+
+def test_streams_without_a_manifest_size_report_none():
+    assert stream_size(video("720p")) is None
+    assert stream_size(video("720p", size=10)) == 10
+
+
+def test_empty_index():
+    index = StreamIndex([])
+    assert index.select("720p") == (None, None)
+    assert index.resolutions() == [] and index.sizes() == {}